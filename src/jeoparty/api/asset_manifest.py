@@ -0,0 +1,94 @@
+import os
+from time import monotonic
+from typing import Dict, Tuple
+
+from jeoparty.api.config import Config
+
+class AssetManifest:
+    """
+    In-memory listing of the files in directories under the static folder, like
+    the asset folders of themes, so assets can be resolved without touching the
+    filesystem on every request. A directory is listed the first time it is used.
+    After that, its modification time is checked at most once per check interval
+    and the listing is rebuilt if it changed, or when it is reloaded explicitly.
+    """
+    def __init__(
+        self,
+        static_folder: str = Config.STATIC_FOLDER,
+        check_interval: float = Config.ASSET_MANIFEST_CHECK_INTERVAL,
+    ):
+        self.static_folder = static_folder
+        self.check_interval = check_interval
+        # Time of last check, modification time and files of each directory
+        self._listings: Dict[str, Tuple[float, float | None, Tuple[str, ...]]] = {}
+
+    def __len__(self):
+        return len(self._listings)
+
+    def _get_mtime(self, directory: str) -> float | None:
+        try:
+            return os.stat(f"{self.static_folder}/{directory}").st_mtime
+        except FileNotFoundError:
+            return None
+
+    def _scan(self, directory: str) -> Tuple[str, ...]:
+        try:
+            with os.scandir(f"{self.static_folder}/{directory}") as entries:
+                names = [entry.name for entry in entries if entry.is_file() and not entry.name.startswith(".")]
+        except FileNotFoundError:
+            return ()
+
+        return tuple(f"{directory}/{name}" for name in sorted(names))
+
+    def list_files(self, directory: str) -> Tuple[str, ...]:
+        """
+        Get the files in the given directory, relative to the static folder,
+        sorted by name. Missing directories have no files.
+        """
+        directory = directory.rstrip("/")
+        now = monotonic()
+
+        listing = self._listings.get(directory)
+        if listing is not None:
+            checked_at, mtime, files = listing
+            if now - checked_at < self.check_interval:
+                return files
+
+            if self._get_mtime(directory) == mtime:
+                self._listings[directory] = (now, mtime, files)
+                return files
+
+        # Get the modification time first, so changes made while scanning are picked up next time
+        mtime = self._get_mtime(directory)
+        files = self._scan(directory)
+        self._listings[directory] = (now, mtime, files)
+
+        return files
+
+    def exists(self, path: str) -> bool:
+        """
+        Check whether a file, relative to the static folder, exists.
+        """
+        directory = os.path.dirname(path)
+        return path in self.list_files(directory)
+
+    def file_or_fallback(self, file: str, fallback: str, condition: bool = True) -> str:
+        if condition and self.exists(file):
+            return file
+
+        return fallback
+
+    def reload(self, directory: str | None = None):
+        """
+        Drop the listing of the given directory and the directories below it,
+        or of all directories if none is given, so they are listed again.
+        """
+        if directory is None:
+            self._listings.clear()
+            return
+
+        directory = directory.rstrip("/")
+        for key in [key for key in self._listings if key == directory or key.startswith(f"{directory}/")]:
+            del self._listings[key]
+
+asset_manifest = AssetManifest()
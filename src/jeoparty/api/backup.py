@@ -0,0 +1,178 @@
+from datetime import datetime
+from glob import glob
+import os
+import sqlite3
+from time import perf_counter, sleep
+from typing import Any, Dict
+
+import gevent
+
+from mhooge_flask.logging import logger
+
+from jeoparty.api.config import Config
+from jeoparty.api.db_executor import DatabaseExecutor
+
+class _TooManyRestarts(Exception):
+    pass
+
+class BackupWorker:
+    """
+    Creates backups of the database with the SQLite online backup API, copying
+    a number of pages at a time with pauses in between, so live games can keep
+    using the database while a backup is made. Backups requested within the
+    coalesce window are merged into one, and a number of older backups are kept
+    as rotating generations named <database>.<n>.bak, where 1 is the newest.
+
+    A stepped backup starts over if the database is written to by another
+    connection between steps. If that happens too many times, the rest of
+    the backup is copied in a single step instead.
+    """
+    def __init__(
+        self,
+        database_path: str,
+        executor: DatabaseExecutor,
+        backup_folder: str = Config.BACKUP_FOLDER,
+        pages_per_step: int = Config.BACKUP_PAGES_PER_STEP,
+        step_sleep: float = Config.BACKUP_STEP_SLEEP,
+        coalesce_window: float = Config.BACKUP_COALESCE_WINDOW,
+        generations: int = Config.BACKUP_GENERATIONS,
+        max_restarts: int = Config.BACKUP_MAX_RESTARTS,
+    ):
+        self.database_path = database_path
+        self.executor = executor
+        self.backup_folder = backup_folder
+        self.pages_per_step = pages_per_step
+        self.step_sleep = step_sleep
+        self.coalesce_window = coalesce_window
+        self.generations = generations
+        self.max_restarts = max_restarts
+
+        self._scheduled: gevent.Greenlet | None = None
+        self._running = False
+        self._pages_total = 0
+        self._pages_remaining = 0
+        self._restarts = 0
+        self._backups_made = 0
+        self._requests_coalesced = 0
+        self._last_started_at: datetime | None = None
+        self._last_finished_at: datetime | None = None
+        self._last_duration: float | None = None
+        self._last_error: str | None = None
+
+    def _get_backup_path(self, generation: int):
+        filename = os.path.basename(self.database_path)
+        return f"{self.backup_folder}/{filename}.{generation}.bak"
+
+    def request(self):
+        """
+        Request a backup. The backup is made in the background once the coalesce
+        window has passed, together with any other requests made in the meantime.
+        """
+        if self._scheduled is not None:
+            self._requests_coalesced += 1
+            return
+
+        self._scheduled = gevent.spawn_later(self.coalesce_window, self._run_scheduled)
+
+    def _run_scheduled(self):
+        self._scheduled = None
+        try:
+            self.backup()
+        except Exception:
+            logger.exception("Error when creating database backup")
+
+    def _on_progress(self, status: int, remaining: int, total: int):
+        if remaining >= self._pages_remaining and self._pages_total:
+            # No progress was made since the last step, so the backup started over
+            self._restarts += 1
+            if self._restarts > self.max_restarts:
+                raise _TooManyRestarts()
+
+        self._pages_remaining = remaining
+        self._pages_total = total
+
+        # The backup only sleeps by itself when the database is busy, so pause between steps here
+        if remaining > 0:
+            sleep(self.step_sleep)
+
+    def _copy_database(self, destination_path: str):
+        source = sqlite3.connect(self.database_path)
+        destination = sqlite3.connect(destination_path)
+        try:
+            try:
+                source.backup(destination, pages=self.pages_per_step, progress=self._on_progress)
+            except _TooManyRestarts:
+                source.backup(destination, pages=-1)
+                self._pages_remaining = 0
+        finally:
+            destination.close()
+            source.close()
+
+    def _rotate(self, new_backup_path: str):
+        for generation in range(self.generations, 0, -1):
+            path = self._get_backup_path(generation)
+            if not os.path.exists(path):
+                continue
+
+            if generation == self.generations:
+                os.remove(path)
+            else:
+                os.replace(path, self._get_backup_path(generation + 1))
+
+        os.replace(new_backup_path, self._get_backup_path(1))
+
+    def backup(self):
+        """
+        Create a backup right away. The calling greenlet waits until it is done.
+        """
+        if self._running:
+            return
+
+        self._running = True
+        self._last_started_at = datetime.now()
+        self._pages_remaining = 0
+        self._pages_total = 0
+        self._restarts = 0
+        time_start = perf_counter()
+
+        os.makedirs(self.backup_folder, exist_ok=True)
+        temp_path = f"{self._get_backup_path(0)}.tmp"
+
+        try:
+            self.executor.run(self._copy_database, temp_path)
+            self._rotate(temp_path)
+            self._last_error = None
+        except Exception as exc:
+            self._last_error = str(exc)
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+            raise
+        finally:
+            self._running = False
+            self._last_duration = perf_counter() - time_start
+            self._last_finished_at = datetime.now()
+
+        self._backups_made += 1
+        logger.info(f"Created database backup of {self._pages_total} pages in {self._last_duration:.2f} seconds")
+
+    def get_status(self) -> Dict[str, Any]:
+        progress = None
+        if self._pages_total:
+            progress = (self._pages_total - self._pages_remaining) / self._pages_total
+
+        return {
+            "running": self._running,
+            "scheduled": self._scheduled is not None,
+            "progress": progress,
+            "pages_total": self._pages_total,
+            "pages_remaining": self._pages_remaining,
+            "restarts": self._restarts,
+            "backups_made": self._backups_made,
+            "requests_coalesced": self._requests_coalesced,
+            "last_started_at": None if self._last_started_at is None else self._last_started_at.isoformat(),
+            "last_finished_at": None if self._last_finished_at is None else self._last_finished_at.isoformat(),
+            "last_duration": self._last_duration,
+            "last_error": self._last_error,
+            "generations": sorted(os.path.basename(path) for path in glob(self._get_backup_path("*"))),
+        }
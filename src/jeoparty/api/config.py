@@ -56,6 +56,77 @@ class Config:
         "maximized": 70,
     }
 
+    # Seconds to wait before socket-driven changes to a game are written to the database
+    WRITE_BEHIND_INTERVAL = 0.5
+
+    # Seconds before the socket namespace of an idle or ended game is evicted
+    NAMESPACE_IDLE_TTL = 60 * 60 * 6
+    NAMESPACE_ENDED_TTL = 60 * 10
+    NAMESPACE_SWEEP_INTERVAL = 60
+
+    # Max number of question pack trees and their approximate memory use (in bytes) kept in memory
+    PACK_CACHE_MAX_ENTRIES = 32
+    PACK_CACHE_MEMORY_BUDGET = 32 * 1024 * 1024
+
+    # Seconds between checks for changes to a directory listed in the asset manifest
+    ASSET_MANIFEST_CHECK_INTERVAL = 5
+
+    # Serialize models on hot paths with generated functions rather than the generic dump()
+    COMPILED_SERIALIZERS = True
+
+    # Seconds the lobby view of a game is cached for, per join code
+    LOBBY_VIEW_TTL = 3
+
+    # Native threads used for blocking database work, 0 runs it on the gevent hub
+    DATABASE_THREADS = 4
+
+    # SQLite pragmas applied to every new database connection, by profile name.
+    # The journal mode is stored in the database file, so each profile sets it explicitly
+    SQLITE_PROFILES = {
+        "default": {
+            "journal_mode": "DELETE",
+            "synchronous": "FULL",
+        },
+        "performance": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "mmap_size": 256 * 1024 * 1024,
+            "cache_size": -64 * 1024,
+            "temp_store": "MEMORY",
+            "busy_timeout": 5000,
+        },
+    }
+    SQLITE_PROFILE = "performance"
+
+    # Database backups are made in steps of pages with a pause (in seconds) in between.
+    # Backups requested within the coalesce window (in seconds) are merged into one
+    BACKUP_FOLDER = f"{RESOURCES_FOLDER}/database/backups"
+    BACKUP_PAGES_PER_STEP = 256
+    BACKUP_STEP_SLEEP = 0.05
+    BACKUP_COALESCE_WINDOW = 30
+    BACKUP_GENERATIONS = 5
+    BACKUP_MAX_RESTARTS = 3
+
+    # Messages to Int-Far are sent in the background. Failed messages are retried with
+    # exponential backoff (in seconds) and given up on after a number of attempts
+    OUTBOX_POLL_INTERVAL = 30
+    OUTBOX_REQUEST_TIMEOUT = 8
+    OUTBOX_BACKOFF_BASE = 2
+    OUTBOX_BACKOFF_MAX = 60 * 10
+    OUTBOX_MAX_ATTEMPTS = 10
+
+    # Media fetched by URL in the question pack editor is streamed through with a max size
+    # (in bytes) and kept in a disk cache for a while (in seconds) within a size budget (in bytes)
+    MEDIA_FETCH_MAX_SIZE = 50 * 1024 * 1024
+    MEDIA_FETCH_TIMEOUT = 10
+    MEDIA_FETCH_CHUNK_SIZE = 64 * 1024
+    MEDIA_CACHE_FOLDER = f"{RESOURCES_FOLDER}/media_cache"
+    MEDIA_CACHE_TTL = 60 * 60 * 24
+    MEDIA_CACHE_BUDGET = 512 * 1024 * 1024
+
+    # Number of packs and games shown per page in dashboard listings
+    DASHBOARD_PAGE_SIZE = 20
+
 def get_question_pack_data_path(pack_id: str, full: bool = True):
     prefix = f"{Config.STATIC_FOLDER}/" if full else ""
     return f"{prefix}data/packs/{pack_id}"
@@ -86,9 +157,3 @@ def get_locale_data():
            locale_data[lang] = json.load(fp)
 
     return locale_data
-
-def file_or_fallback(file: str, fallback: str, condition: bool):
-    if condition and os.path.exists(f"{Config.STATIC_FOLDER}/{file}"):
-        return file
-
-    return fallback
@@ -1,15 +1,31 @@
 from datetime import datetime
 import json
-from typing import List
+from typing import Any, Callable, Dict, List, Tuple
+from uuid import uuid4
 
-from sqlalchemy import select, delete, update, func
-from sqlalchemy.orm import selectinload, Session
+from sqlalchemy import select, delete, insert, update, func, inspect, literal, or_, and_, tuple_, case, event
+from sqlalchemy.orm import selectinload, joinedload, make_transient_to_detached, RelationshipDirection, Session
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.sql import Executable
 
 from mhooge_flask.database import SQLAlchemyDatabase
 
 from jeoparty.api.config import Config
-from jeoparty.api.enums import StageType
+from jeoparty.api.enums import StageType, Language
 from jeoparty.api.orm.models import *
+from jeoparty.api.backup import BackupWorker
+from jeoparty.api.db_executor import DatabaseExecutor
+from jeoparty.api.game_plan import GamePlan, generate_game_plan
+from jeoparty.api.lobby_cache import LobbyViewCache
+from jeoparty.api.outbox import OutboxWorker
+from jeoparty.api.pack_cache import PackTreeCache, PackTreeEntry, build_round_json
+from jeoparty.api.summaries import PackSummary, GameSummary, GameLobbyView, SummaryPage, encode_cursor, decode_cursor
+
+# Models that are part of the cached question pack trees
+_PACK_CONTENT_MODELS = (QuestionPack, QuestionRound, QuestionCategory, Question, Theme, BuzzerSound)
+
+# Position of each table when tables are sorted so parents come before children
+_TABLE_ORDER = {table: index for index, table in enumerate(Base.metadata.sorted_tables)}
 
 def format_value(key, value):
     if key == "extra":
@@ -23,9 +39,270 @@ def row_factory(cursor, row):
     fields = [column[0] for column in cursor.description]
     return {key: format_value(key, value) for key, value in zip(fields, row)}
 
+class UnitOfWork:
+    """
+    Collects models to save, update, and delete and writes them in a single
+    transaction when the unit of work is committed (or its context exits):
+
+    - New saved models, and new models they cascade to, are inserted with one
+      executemany INSERT per model class. Python-side defaults and foreign keys
+      of related models are filled in before the rows are written.
+    - Updated models, and saved models that already exist, can be detached. Only
+      their changed columns are written, with one executemany UPDATE per model class
+      and set of changed columns.
+    - Deleted models are removed with one DELETE ... WHERE <pk> IN (...) per model class.
+    - Executed statements, like bulk UPDATEs that match rows by a WHERE clause,
+      are run as given after the updates. Callbacks registered with `on_commit`
+      can apply their effect to loaded models afterwards.
+
+    The rows are collected on the calling greenlet and written in a private session
+    on the database executor, so SQLite never blocks the gevent hub. Models are not
+    expired on commit. Afterwards, new models are added to the shared session of the
+    database and deleted models are removed from it, unless `isolated` is set.
+
+    If `refresh` is set, only the columns with server-side defaults are loaded again for new models.
+    """
+    def __init__(self, database: "Database", refresh: bool = False, isolated: bool = False):
+        self.database = database
+        self.refresh = refresh
+        self.isolated = isolated
+        self._saves: List[Base] = []
+        self._updates: List[Base] = []
+        self._deletes: Dict[type[Base], List[Base]] = {}
+        self._statements: List[Executable] = []
+        self._callbacks: List[Tuple[Callable[..., Any], Tuple[Any, ...]]] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *args):
+        if exc_type is None:
+            self.commit()
+
+    def save(self, *models: Base):
+        self._saves.extend(models)
+
+    def update(self, *models: Base):
+        self._updates.extend(models)
+
+    def delete(self, *models: Base):
+        for model in models:
+            self._deletes.setdefault(type(model), []).append(model)
+
+    def execute(self, *statements: Executable):
+        self._statements.extend(statements)
+
+    def on_commit(self, callback: Callable[..., Any], *args):
+        self._callbacks.append((callback, args))
+
+    def _get_models_to_save(self) -> List[Base]:
+        # Include the related models that would be added to a session along with the saved models
+        models: Dict[int, Base] = {}
+        for model in self._saves:
+            models.setdefault(id(model), model)
+            state = inspect(model)
+            for related_model, _, _, _ in state.mapper.cascade_iterator("save-update", state):
+                models.setdefault(id(related_model), related_model)
+
+        return list(models.values())
+
+    def _get_insert_rows(self, models: List[Base]):
+        # Fill in defaults first, so the primary keys of all new models are known
+        for model in models:
+            state = inspect(model)
+            for attr in state.mapper.column_attrs:
+                default = attr.columns[0].default
+                if default is None or state.dict.get(attr.key) is not None:
+                    continue
+
+                if default.is_scalar:
+                    setattr(model, attr.key, default.arg)
+                elif default.is_callable:
+                    setattr(model, attr.key, default.arg(None))
+
+        # Rows are grouped in table dependency order, so parents are inserted before children
+        grouped_rows: Dict[Tuple[type[Base], Tuple[str, ...]], List[Dict[str, Any]]] = {}
+        for model in sorted(models, key=lambda model: _TABLE_ORDER[model.__table__]):
+            state = inspect(model)
+            for relationship in state.mapper.relationships:
+                related_model = state.dict.get(relationship.key)
+                if relationship.direction is not RelationshipDirection.MANYTOONE or related_model is None:
+                    continue
+
+                for local_column, remote_column in relationship.local_remote_pairs:
+                    remote_key = inspect(related_model).mapper.get_property_by_column(remote_column).key
+                    setattr(model, state.mapper.get_property_by_column(local_column).key, getattr(related_model, remote_key))
+
+            row = {
+                attr.key: state.dict[attr.key] for attr in state.mapper.column_attrs
+                if state.dict.get(attr.key) is not None
+            }
+            grouped_rows.setdefault((type(model), tuple(sorted(row))), []).append(row)
+
+        return grouped_rows
+
+    def _get_update_rows(self, models: List[Base]):
+        changes = []
+        grouped_rows: Dict[Tuple[type[Base], Tuple[str, ...]], List[Dict[str, Any]]] = {}
+        for model in models:
+            state = inspect(model)
+            primary_keys = {column.key for column in state.mapper.primary_key}
+            changed_columns = {
+                attr.key: attr.value for attr in state.attrs
+                if attr.key in state.mapper.column_attrs and attr.history.has_changes()
+            }
+            if changed_columns == {}:
+                continue
+
+            changes.append((model, changed_columns))
+            row = {key: getattr(model, key) for key in primary_keys}
+            row.update(changed_columns)
+            grouped_rows.setdefault((type(model), tuple(sorted(changed_columns))), []).append(row)
+
+        return changes, grouped_rows
+
+    def _get_delete_statement(self, model_cls: type[Base], models: List[Base]):
+        primary_keys = inspect(model_cls).primary_key
+        if len(primary_keys) == 1:
+            values = [getattr(model, primary_keys[0].key) for model in models]
+            return delete(model_cls).where(primary_keys[0].in_(values))
+
+        values = [tuple(getattr(model, column.key) for column in primary_keys) for model in models]
+        return delete(model_cls).where(tuple_(*primary_keys).in_(values))
+
+    def _get_server_default_values(self, session: Session, models: List[Base]):
+        values = []
+        for model in models:
+            mapper = inspect(model).mapper
+            server_default_keys = [
+                attr.key for attr in mapper.column_attrs
+                if any(column.server_default is not None for column in attr.columns)
+            ]
+            if server_default_keys == []:
+                continue
+
+            statement = select(*[getattr(type(model), key) for key in server_default_keys]).where(
+                *[column == getattr(model, mapper.get_property_by_column(column).key) for column in mapper.primary_key]
+            )
+            values.append((model, dict(zip(server_default_keys, session.execute(statement).one()))))
+
+        return values
+
+    def _write(
+        self,
+        insert_rows: Dict[Tuple[type[Base], Tuple[str, ...]], List[Dict[str, Any]]],
+        update_rows: Dict[Tuple[type[Base], Tuple[str, ...]], List[Dict[str, Any]]],
+        statements: List[Executable],
+        new_models: List[Base],
+    ):
+        with Session(self.database.engine) as session:
+            for (model_cls, _), rows in insert_rows.items():
+                session.execute(insert(model_cls), rows)
+
+            for (model_cls, _), rows in update_rows.items():
+                session.execute(update(model_cls), rows)
+
+            for statement in statements:
+                session.execute(statement)
+
+            session.commit()
+
+            if self.refresh:
+                return self._get_server_default_values(session, new_models)
+
+        return []
+
+    def commit(self):
+        # The rows to write are collected on the calling greenlet, so they
+        # are a consistent snapshot even though the write happens on another thread
+        models_to_save = self._get_models_to_save()
+        new_models = [model for model in models_to_save if inspect(model).key is None]
+        insert_rows = self._get_insert_rows(new_models)
+        changes, update_rows = self._get_update_rows(
+            self._updates + [model for model in models_to_save if inspect(model).key is not None]
+        )
+        statements = self._statements + [
+            self._get_delete_statement(model_cls, models) for model_cls, models in self._deletes.items()
+        ]
+        if insert_rows == {} and update_rows == {} and statements == []:
+            return
+
+        # New models are written by the private session, so they must not be pending in another one
+        for model in new_models:
+            if (session := inspect(model).session) is not None:
+                session.expunge(model)
+
+        server_default_values = self.database.executor.run(self._write, insert_rows, update_rows, statements, new_models)
+
+        for model in new_models:
+            make_transient_to_detached(model)
+
+        for model, values in server_default_values:
+            for key, value in values.items():
+                set_committed_value(model, key, value)
+
+        # Mark the written values as the new committed state of each updated model,
+        # unless the value was changed again while it was being written
+        for model, changed_columns in changes:
+            for key, value in changed_columns.items():
+                if model.__dict__.get(key) == value:
+                    set_committed_value(model, key, value)
+
+        if not self.isolated:
+            with self.database as session:
+                session.add_all(new_models)
+                for models in self._deletes.values():
+                    for model in models:
+                        if model in session:
+                            session.expunge(model)
+
+        for callback, args in self._callbacks:
+            callback(*args)
+
+        self.database._invalidate_pack_cache(*self._saves, *self._updates, *[model for models in self._deletes.values() for model in models])
+
+        self._saves = []
+        self._updates = []
+        self._deletes = {}
+        self._statements = []
+        self._callbacks = []
+
 class Database(SQLAlchemyDatabase):
-    def __init__(self, db_file="database.db"):
-        super().__init__(f"{Config.RESOURCES_FOLDER}/database/{db_file}", "api/orm", True, True)
+    def __init__(self, db_file="database.db", sqlite_profile: str = Config.SQLITE_PROFILE):
+        database_path = f"{Config.RESOURCES_FOLDER}/database/{db_file}"
+        super().__init__(database_path, "api/orm", True, True)
+        self.pack_cache = PackTreeCache()
+        self.lobby_cache = LobbyViewCache()
+        self.executor = DatabaseExecutor()
+        self.backup_worker = BackupWorker(database_path, self.executor)
+        self.outbox_worker = OutboxWorker(self)
+
+        self.sqlite_profile = sqlite_profile
+        self.pragmas = Config.SQLITE_PROFILES[sqlite_profile]
+        event.listen(self.engine, "connect", self._set_pragmas)
+
+        # Make sure connections opened before the listener was added get the pragmas as well
+        self.engine.dispose()
+
+    def _set_pragmas(self, dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma, value in self.pragmas.items():
+            cursor.execute(f"PRAGMA {pragma}={value}")
+
+        cursor.close()
+
+    def get_pragmas(self) -> Dict[str, Any]:
+        """
+        Get the active value of every pragma in the SQLite performance profiles.
+        """
+        pragmas = {}
+        with self.engine.connect() as connection:
+            for profile in Config.SQLITE_PROFILES.values():
+                for pragma in profile:
+                    if pragma not in pragmas:
+                        pragmas[pragma] = connection.exec_driver_sql(f"PRAGMA {pragma}").scalar()
+
+        return pragmas
 
     def get_question_packs_for_user(self, user_id: str, pack_id: str | None = None, include_public: bool = False) -> List[QuestionPack] | QuestionPack:
         with self as session:
@@ -50,6 +327,180 @@ class Database(SQLAlchemyDatabase):
 
             return data if pack_id is None else data[0]
 
+    def _get_page_filters(self, sort_column, id_column, cursor: str | None):
+        if cursor is None:
+            return []
+
+        timestamp, row_id = decode_cursor(cursor)
+        return [tuple_(sort_column, id_column) < tuple_(timestamp, row_id)]
+
+    def _get_next_cursor(self, rows: List[Any], limit: int, get_key) -> str | None:
+        if len(rows) <= limit:
+            return None
+
+        del rows[limit:]
+        return encode_cursor(*get_key(rows[-1]))
+
+    def get_pack_summaries_for_user(
+        self,
+        user_id: str,
+        include_public: bool = False,
+        public: bool | None = None,
+        language: Language | None = None,
+        theme_id: str | None = None,
+        cursor: str | None = None,
+        limit: int = Config.DASHBOARD_PAGE_SIZE,
+    ) -> SummaryPage[PackSummary]:
+        """
+        Get a page of the question packs created by the given user (and public
+        packs by others if `include_public` is set), newest changed first, along
+        with the number of questions in each, without loading the packs themselves.
+        Pass the `next_cursor` of a page as `cursor` to get the page after it.
+        """
+        if include_public:
+            filters = [(QuestionPack.created_by == user_id) | (QuestionPack.public == True)]
+        else:
+            filters = [QuestionPack.created_by == user_id]
+
+        if public is not None:
+            filters.append(QuestionPack.public == public)
+        if language is not None:
+            filters.append(QuestionPack.language == language)
+        if theme_id is not None:
+            filters.append(QuestionPack.theme_id == theme_id)
+
+        filters.extend(self._get_page_filters(QuestionPack.changed_at, QuestionPack.id, cursor))
+
+        # Select the packs of the page first, so questions are only counted for those
+        page = select(QuestionPack.id).where(*filters).order_by(
+            QuestionPack.changed_at.desc(), QuestionPack.id.desc()
+        ).limit(limit + 1).subquery()
+
+        statement = select(
+            QuestionPack.id,
+            QuestionPack.name,
+            QuestionPack.public,
+            QuestionPack.created_at,
+            QuestionPack.changed_at,
+            func.count(Question.id),
+        ).join(
+            page, page.c.id == QuestionPack.id
+        ).outerjoin(
+            QuestionRound, QuestionRound.pack_id == QuestionPack.id
+        ).outerjoin(
+            QuestionCategory, QuestionCategory.round_id == QuestionRound.id
+        ).outerjoin(
+            Question, Question.category_id == QuestionCategory.id
+        ).group_by(
+            QuestionPack.id
+        ).order_by(
+            QuestionPack.changed_at.desc(), QuestionPack.id.desc()
+        )
+
+        items = [PackSummary(*row) for row in self._run_in_session(self._fetch_all, statement)]
+        next_cursor = self._get_next_cursor(items, limit, lambda pack: (pack.changed_at, pack.id))
+
+        return SummaryPage(items, next_cursor)
+
+    def get_game_summaries_for_user(
+        self,
+        user_id: str,
+        stage: StageType | None = None,
+        public: bool | None = None,
+        language: Language | None = None,
+        theme_id: str | None = None,
+        cursor: str | None = None,
+        limit: int = Config.DASHBOARD_PAGE_SIZE,
+    ) -> SummaryPage[GameSummary]:
+        """
+        Get a page of the games created by the given user, newest started first,
+        along with the name of their question pack, the number of contestants, and
+        the number of total and answered questions in the current round of each game.
+        The `public`, `language`, and `theme_id` filters apply to the question pack of each game.
+        Pass the `next_cursor` of a page as `cursor` to get the page after it.
+        """
+        filters = [Game.created_by == user_id]
+        if stage is not None:
+            filters.append(Game.stage == stage)
+
+        pack_filters = []
+        if public is not None:
+            pack_filters.append(QuestionPack.public == public)
+        if language is not None:
+            pack_filters.append(QuestionPack.language == language)
+        if theme_id is not None:
+            pack_filters.append(QuestionPack.theme_id == theme_id)
+
+        filters.extend(self._get_page_filters(Game.started_at, Game.id, cursor))
+
+        # Select the games of the page first, so aggregates are only computed for those
+        page = select(Game.id)
+        if pack_filters:
+            page = page.join(QuestionPack, QuestionPack.id == Game.pack_id)
+
+        page = page.where(*filters, *pack_filters).order_by(
+            Game.started_at.desc(), Game.id.desc()
+        ).limit(limit + 1).subquery()
+
+        round_progress = select(
+            GameQuestion.game_id,
+            func.count().label("total_questions"),
+            func.sum(case((GameQuestion.used == True, 1), else_=0)).label("used_questions"),
+        ).join(
+            Game, Game.id == GameQuestion.game_id
+        ).join(
+            Question, Question.id == GameQuestion.question_id
+        ).join(
+            QuestionCategory, QuestionCategory.id == Question.category_id
+        ).join(
+            QuestionRound, QuestionRound.id == QuestionCategory.round_id
+        ).where(
+            Game.id.in_(select(page.c.id)),
+            QuestionRound.round == Game.round,
+        ).group_by(
+            GameQuestion.game_id
+        ).subquery()
+
+        contestant_counts = select(
+            GameContestant.game_id,
+            func.count().label("contestants"),
+        ).where(
+            GameContestant.game_id.in_(select(page.c.id))
+        ).group_by(
+            GameContestant.game_id
+        ).subquery()
+
+        statement = select(
+            Game.id,
+            Game.title,
+            QuestionPack.name,
+            Game.stage,
+            Game.round,
+            Game.regular_rounds,
+            Game.use_powerups,
+            Game.max_contestants,
+            func.coalesce(contestant_counts.c.contestants, 0),
+            func.coalesce(round_progress.c.total_questions, 0),
+            func.coalesce(round_progress.c.used_questions, 0),
+            Game.started_at,
+            Game.ended_at,
+        ).join(
+            page, page.c.id == Game.id
+        ).join(
+            QuestionPack, QuestionPack.id == Game.pack_id
+        ).outerjoin(
+            round_progress, round_progress.c.game_id == Game.id
+        ).outerjoin(
+            contestant_counts, contestant_counts.c.game_id == Game.id
+        ).order_by(
+            Game.started_at.desc(), Game.id.desc()
+        )
+
+        items = [GameSummary(*row) for row in self._run_in_session(self._fetch_all, statement)]
+        next_cursor = self._get_next_cursor(items, limit, lambda game: (game.started_at, game.id))
+
+        return SummaryPage(items, next_cursor)
+
     def get_themes_for_user(self, user_id: str, theme_id: str | None = None, include_public: bool = False):
         with self as session:
             if include_public:
@@ -71,44 +522,202 @@ class Database(SQLAlchemyDatabase):
 
             return data if theme_id is None else data[0]
 
-    def get_game_from_id(self, game_id: str):
-        with self as session:
-            statement = select(Game).options(
-                selectinload(Game.pack).options(
-                    selectinload(QuestionPack.rounds).selectinload(QuestionRound.categories).selectinload(QuestionCategory.questions),
-                    selectinload(QuestionPack.theme).selectinload(Theme.buzzer_sounds)
+    def _load_pack_tree(self, pack_id: str) -> QuestionPack | None:
+        """
+        Load the full content tree of a question pack into a private session
+        that is closed before returning, so the tree can be cached and shared.
+        """
+        with Session(self.engine) as session:
+            statement = select(QuestionPack).options(
+                selectinload(QuestionPack.creator),
+                selectinload(QuestionPack.rounds).selectinload(QuestionRound.categories).selectinload(QuestionCategory.questions),
+                selectinload(QuestionPack.theme).options(
+                    selectinload(Theme.creator),
+                    selectinload(Theme.buzzer_sounds)
                 )
-            ).options(
-                selectinload(Game.game_questions).selectinload(GameQuestion.question)
-            ).options(
-                selectinload(Game.game_contestants).selectinload(GameContestant.power_ups)
-            ).filter(Game.id == game_id)
+            ).filter(QuestionPack.id == pack_id)
 
-            return session.execute(statement).scalar_one_or_none()
+            pack_data = session.execute(statement).scalar_one_or_none()
+            if pack_data is None:
+                return None
 
-    def get_game_from_code(self, join_code: str):
+            # Resolve back references while the session is still open
+            for round_data in pack_data.rounds:
+                round_data.pack
+                for category in round_data.categories:
+                    category.round
+                    for question in category.questions:
+                        question.category
+
+            if pack_data.theme is not None:
+                for buzzer_sound in pack_data.theme.buzzer_sounds:
+                    buzzer_sound.theme
+
+            return pack_data
+
+    def get_pack_tree(self, pack_id: str, changed_at: datetime) -> PackTreeEntry | None:
+        entry = self.pack_cache.get(pack_id, changed_at)
+        if entry is None:
+            pack_data = self.executor.run(self._load_pack_tree, pack_id)
+            if pack_data is None:
+                return None
+
+            entry = self.pack_cache.put(pack_data)
+
+        return entry
+
+    def get_round_json(self, game_data: Game) -> Dict[str, Any]:
+        """
+        Get the serialized current round of the given game, without game state,
+        from the pack cache. The result is shared and must not be mutated.
+        """
+        entry = self.get_pack_tree(game_data.pack_id, game_data.pack.changed_at)
+        if entry is None:
+            # The pack could not be loaded again, so serialize the round the game already has
+            return build_round_json(game_data.pack.rounds[game_data.round - 1])
+
+        return self.pack_cache.get_round_json(entry, game_data.round)
+
+    def _attach_pack_tree(self, game_data: Game, changed_at: datetime):
+        entry = self.get_pack_tree(game_data.pack_id, changed_at)
+        if entry is None:
+            return
+
+        set_committed_value(game_data, "pack", entry.pack)
+        for game_question in game_data.game_questions:
+            question = entry.questions.get(game_question.question_id)
+            if question is not None:
+                set_committed_value(game_question, "question", question)
+
+    def _get_game_statement(self):
+        # Only the rows that change during a game are loaded here,
+        # the content of the question pack is attached from the pack cache
+        return select(Game, QuestionPack.changed_at).join(
+            QuestionPack, Game.pack_id == QuestionPack.id
+        ).options(
+            selectinload(Game.game_questions)
+        ).options(
+            selectinload(Game.game_contestants).joinedload(GameContestant.power_ups)
+        )
+
+    def _get_game(self, statement) -> Game | None:
+        row = self._run_in_session(self._fetch_one, statement)
+        if row is None:
+            return None
+
+        game_data, changed_at = row
         with self as session:
-            statement = select(Game).options(
-                selectinload(Game.pack).options(
-                    selectinload(QuestionPack.rounds).selectinload(QuestionRound.categories).selectinload(QuestionCategory.questions),
-                    selectinload(QuestionPack.theme).selectinload(Theme.buzzer_sounds)
-                )
-            ).options(
-                selectinload(Game.game_questions).selectinload(GameQuestion.question)
-            ).options(
-                selectinload(Game.game_contestants).selectinload(GameContestant.power_ups)
-            ).filter(Game.join_code == join_code)
+            # Attach the game to the shared session without querying it again,
+            # so callers can still refresh it and lazy load other relations
+            game_data = session.merge(game_data, load=False)
+
+        self._attach_pack_tree(game_data, changed_at)
+
+        return game_data
+
+    def get_game_from_id(self, game_id: str):
+        statement = self._get_game_statement().filter(Game.id == game_id)
+
+        return self._get_game(statement)
+
+    def get_game_from_code(self, join_code: str):
+        statement = self._get_game_statement().filter(Game.join_code == join_code)
+
+        return self._get_game(statement)
+
+    def get_game_lobby_view(self, join_code: str, use_cache: bool = True) -> GameLobbyView | None:
+        """
+        Get the columns of a game needed by the contestant lobby pages with a single
+        narrow query, without loading the game or its question pack. Views are cached
+        for a few seconds per join code unless `use_cache` is False, so they should not
+        be relied on for anything that has to be exact, like the number of contestants.
+        """
+        if use_cache:
+            lobby_view = self.lobby_cache.get(join_code)
+            if lobby_view is not None:
+                return lobby_view
+
+        contestants = select(func.count()).where(
+            GameContestant.game_id == Game.id
+        ).scalar_subquery()
+
+        statement = select(
+            Game.id,
+            Game.join_code,
+            Game.stage,
+            Game.password,
+            Game.max_contestants,
+            Game.use_powerups,
+            Game.created_by,
+            contestants,
+            QuestionPack.language,
+            QuestionPack.theme_id,
+            Theme.name,
+        ).join(
+            QuestionPack, QuestionPack.id == Game.pack_id
+        ).outerjoin(
+            Theme, Theme.id == QuestionPack.theme_id
+        ).where(
+            Game.join_code == join_code
+        )
+
+        row = self._run_in_session(self._fetch_one, statement)
+
+        if row is None:
+            return None
+
+        lobby_view = GameLobbyView(*row)
+        self.lobby_cache.put(lobby_view)
+
+        return lobby_view
+
+    def get_game_state(self, game_id: str) -> Game | None:
+        """
+        Load a game, including every relation used while the game is running,
+        into a private session that is closed before returning. The returned
+        model is detached, so it can be kept in memory and mutated freely
+        without being expired by commits made elsewhere.
+        """
+        row = self.executor.run(self._load_game_state, game_id)
+        if row is None:
+            return None
+
+        game_data, changed_at = row
+        self._attach_pack_tree(game_data, changed_at)
+
+        return game_data
+
+    def _load_game_state(self, game_id: str) -> Tuple[Game, datetime] | None:
+        with Session(self.engine) as session:
+            statement = self._get_game_statement().options(
+                selectinload(Game.game_contestants).selectinload(GameContestant.contestant)
+            ).filter(Game.id == game_id)
+
+            row = session.execute(statement).one_or_none()
+            if row is None:
+                return None
+
+            game_data = row[0]
+
+            # Resolve back references while the session is still open. These are
+            # all found in the identity map, so no extra queries are emitted
+            for game_question in game_data.game_questions:
+                game_question.game
+
+            for game_contestant in game_data.game_contestants:
+                game_contestant.game
+                for power_up in game_contestant.power_ups:
+                    power_up.contestant
 
-            return session.execute(statement).scalar_one_or_none()
+            return tuple(row)
 
     def get_unique_join_code(self, join_code: str):
-        with self as session:
-            statement = select(func.count()).select_from(Game).where(Game.join_code == join_code, Game.ended_at == None)
-            count = session.execute(statement).scalar()
-            if not count:
-                return join_code
+        statement = select(func.count()).select_from(Game).where(Game.join_code == join_code, Game.ended_at == None)
+        count = self._run_in_session(self._fetch_scalar, statement)
+        if not count:
+            return join_code
 
-            return f"{join_code}_{count}"
+        return f"{join_code}_{count}"
 
     def get_games_for_user(self, user_id: str, game_id: str | None = None):
         with self as session:
@@ -117,7 +726,7 @@ class Database(SQLAlchemyDatabase):
             ).options(
                 selectinload(Game.game_questions).selectinload(GameQuestion.question)
             ).options(
-                selectinload(Game.game_contestants).selectinload(GameContestant.power_ups)
+                selectinload(Game.game_contestants).joinedload(GameContestant.power_ups)
             ).filter(Game.created_by == user_id)
 
             if game_id is not None:
@@ -132,18 +741,21 @@ class Database(SQLAlchemyDatabase):
     def get_contestants_for_game(self, game_id: str) -> List[GameContestant]:
         with self as session:
             statement = select(GameContestant).options(
-                selectinload(GameContestant.power_ups)
+                joinedload(GameContestant.power_ups)
             ).filter(GameContestant.game_id == game_id)
 
-            return session.execute(statement).scalars().all()
+            return session.execute(statement).unique().scalars().all()
 
     def get_contestant_from_id(self, user_id: str) -> Contestant | None:
-        with self as session:
-            statement = select(Contestant).options(
-                selectinload(Contestant.game_contestants)
-            ).filter(Contestant.id == user_id)
+        """
+        Get the contestant with the given ID along with the games they have joined.
+        The returned model is detached.
+        """
+        statement = select(Contestant).options(
+            selectinload(Contestant.game_contestants)
+        ).filter(Contestant.id == user_id)
 
-            return session.execute(statement).scalar_one_or_none()
+        return self._run_in_session(self._fetch_scalar, statement)
 
     def get_all_contestants(self) -> List[Contestant]:
         with self as session:
@@ -151,54 +763,104 @@ class Database(SQLAlchemyDatabase):
 
             return session.execute(statement).scalars().all()
 
-    def create_question_pack(self, pack_model: QuestionPack):
-        with self as session:
-            session.add(pack_model)
-            session.flush()
+    def _run_in_session(self, func, *args):
+        """
+        Call `func` with a private session and the given arguments on the database executor.
+        Models loaded or written by the session are detached, but not expired, afterwards.
+        """
+        return self.executor.run(self._call_with_session, func, *args)
 
-            rounds_to_create = []
-            if pack_model.rounds == []:
-                rounds_to_create = [(1, Config.ROUND_NAMES[0])]
-                if pack_model.include_finale:
-                    rounds_to_create.append((2, Config.FINALE_NAME))
+    def _call_with_session(self, func, *args):
+        with Session(self.engine, expire_on_commit=False) as session:
+            return func(session, *args)
 
-            for (round_num, name) in rounds_to_create:
-                session.add(QuestionRound(pack_id=pack_model.id, name=name, round=round_num))
+    def _fetch_one(self, session: Session, statement):
+        return session.execute(statement).one_or_none()
 
-            session.commit()
-            session.refresh(pack_model)
+    def _fetch_all(self, session: Session, statement):
+        return session.execute(statement).all()
 
-            return pack_model
+    def _fetch_scalar(self, session: Session, statement):
+        return session.execute(statement).scalar_one_or_none()
+
+    def create_question_pack(self, pack_model: QuestionPack):
+        if pack_model.rounds == []:
+            pack_model.rounds.append(QuestionRound(name=Config.ROUND_NAMES[0], round=1))
+            # The finale is included by default, which is only filled in when the pack is inserted
+            if pack_model.include_finale is not False:
+                pack_model.rounds.append(QuestionRound(name=Config.FINALE_NAME, round=2))
 
-    def create_game(self, game_model: Game):
+        # The rounds are inserted along with the pack
+        self.save_models(pack_model)
+
+        return pack_model
+
+    def create_game(self, game_model: Game, seed: int | None = None) -> GamePlan:
+        """
+        Create a game and its game questions, with the daily doubles of every round
+        placed up front. The placement is random unless a `seed` is given.
+        """
+        game_plan = self._run_in_session(self._create_game, game_model, seed)
+
+        # The game was written by the private session, so add it to the shared one
         with self as session:
             session.add(game_model)
-            session.flush()
 
-            # Add a fresh batch of game questions
-            game_questions = [
-                GameQuestion(
-                    game_id=game_model.id,
-                    question_id=question.id,
-                ) 
-                for question in self.get_question_packs_for_user(game_model.created_by, game_model.pack_id, True).get_all_questions()
-            ]
-            session.add_all(game_questions)
-
-            session.commit()
-            session.refresh(game_model)
+        return game_plan
+
+    def _create_game(self, session: Session, game_model: Game, seed: int | None) -> GamePlan:
+        session.add(game_model)
+        session.flush()
+
+        # Plan the regular rounds and the finale round (if the pack has one)
+        # and add a fresh batch of game questions in a single executemany INSERT
+        questions = session.execute(self._get_game_questions_statement(game_model)).all()
+        game_plan = generate_game_plan(questions, game_model.regular_rounds, game_model.use_daily_doubles, seed)
+
+        rows = game_plan.get_game_question_rows(game_model.id)
+        if rows != []:
+            session.execute(insert(GameQuestion), rows)
+
+        session.commit()
+
+        return game_plan
+
+    def _get_game_questions_statement(self, game_model: Game):
+        finale_round = (
+            select(func.max(QuestionRound.round))
+            .where(QuestionRound.pack_id == game_model.pack_id)
+            .scalar_subquery()
+        )
+
+        return select(Question.id, QuestionRound.round).join(
+            QuestionCategory, Question.category_id == QuestionCategory.id
+        ).join(
+            QuestionRound, QuestionCategory.round_id == QuestionRound.id
+        ).join(
+            QuestionPack, QuestionRound.pack_id == QuestionPack.id
+        ).where(
+            QuestionPack.id == game_model.pack_id,
+            or_(
+                QuestionRound.round <= game_model.regular_rounds,
+                and_(QuestionPack.include_finale == True, QuestionRound.round == finale_round)
+            )
+        )
 
     def delete_game(self, game_id: str):
-        with self as session:
-            game_stmt = delete(Game).where(Game.id == game_id)
-            game_contestant_stmt = delete(GameContestant).where(GameContestant.game_id == game_id)
-            game_questions_stmt = delete(GameQuestion).where(GameQuestion.game_id == game_id)
+        self._run_in_session(self._delete_game, game_id)
 
-            session.execute(game_stmt)
-            session.execute(game_contestant_stmt)
-            session.execute(game_questions_stmt)
+        self.lobby_cache.invalidate(game_id)
 
-            session.commit()
+    def _delete_game(self, session: Session, game_id: str):
+        game_stmt = delete(Game).where(Game.id == game_id)
+        game_contestant_stmt = delete(GameContestant).where(GameContestant.game_id == game_id)
+        game_questions_stmt = delete(GameQuestion).where(GameQuestion.game_id == game_id)
+
+        session.execute(game_stmt)
+        session.execute(game_contestant_stmt)
+        session.execute(game_questions_stmt)
+
+        session.commit()
 
     def _get_update_statement(self, old_model: Base, new_model: Base, id_key: str = "id"):
         changed_columns = {}
@@ -220,81 +882,199 @@ class Database(SQLAlchemyDatabase):
         return update(_class).where(getattr(_class, id_key) == getattr(old_model, id_key)).values(**changed_columns)
 
     def save_or_update(self, model: Base, old_model: Base | None = None, id_key: str = "id"):
-        with self as session:
-            model_to_return = None
-            if old_model is not None:
-                update_stmt = self._get_update_statement(old_model, model, id_key)
-                if update_stmt is not None:
-                    session.execute(update_stmt)
-                    model_to_return = old_model
-            else:
-                session.add(model)
-                model_to_return = model
-
-            if model_to_return is not None:
-                session.commit()
-                if old_model is not None:
-                    session.refresh(model_to_return)
-            else:
-                model_to_return = old_model
-
-            return model_to_return
-
-    def save_models(self, *models: Base | List[Base]):
-        with self as session:
-            session.add_all(models)
-            session.commit()
-
-            for model in models:
-                session.refresh(model)
+        if old_model is None:
+            self.save_models(model)
+            return model
+
+        update_stmt = self._get_update_statement(old_model, model, id_key)
+        if update_stmt is not None:
+            self._run_in_session(self._execute_statements, update_stmt)
+
+            # The old model now has the values of the new one in the database
+            for column in old_model.__table__.columns:
+                if column.name != id_key:
+                    set_committed_value(old_model, column.name, getattr(model, column.name))
+
+        return old_model
+
+    def _execute_statements(self, session: Session, *statements: Executable):
+        for statement in statements:
+            session.execute(statement)
+
+        session.commit()
+
+    def _invalidate_pack_cache(self, *models: Base):
+        if any(isinstance(model, _PACK_CONTENT_MODELS) for model in models):
+            self.pack_cache.clear()
+
+    def create_backup(self):
+        """
+        Request a backup of the database, which is made in the background.
+        """
+        self.backup_worker.request()
+
+    def get_backup_status(self) -> Dict[str, Any]:
+        return self.backup_worker.get_status()
+
+    def queue_outbox_message(self, game_id: str, event: str, url: str, payload: Dict[str, Any]) -> bool:
+        """
+        Queue a message to Int-Far, which is sent in the background. Returns False
+        if a message for the same game and event has already been queued.
+        """
+        return self.outbox_worker.enqueue(game_id, event, url, payload)
+
+    def get_outbox_status(self) -> Dict[str, Any]:
+        return self.outbox_worker.get_status()
+
+    def unit_of_work(self, refresh: bool = False) -> "UnitOfWork":
+        return UnitOfWork(self, refresh)
+
+    def save_models(self, *models: Base | List[Base], refresh: bool = False):
+        """
+        Save the given models in one transaction. Models are not expired
+        or refreshed afterwards, unless `refresh` is given, in which case
+        only columns with server-side defaults are loaded again.
+        """
+        with self.unit_of_work(refresh) as unit_of_work:
+            unit_of_work.save(*models)
+
+    def update_models(self, *models: Base):
+        """
+        Write the changed columns of the given (possibly detached) models
+        with one executemany UPDATE per model class and set of changed columns.
+        The models are not added to the session and not refreshed afterwards,
+        and the write happens on the database executor.
+        """
+        with UnitOfWork(self, isolated=True) as unit_of_work:
+            unit_of_work.update(*models)
 
     def delete_models(self, *models: Base | List[Base]):
-        with self as session:
-            for model in models:
-                stmt = delete(model.__class__).where(getattr(model.__class__, "id") == getattr(model, "id"))
-                session.execute(stmt)
+        with self.unit_of_work() as unit_of_work:
+            unit_of_work.delete(*models)
 
-            session.commit()
-
-    def save_game(self, game_model: Game):
+    def save_game(self, game_model: Game, unit_of_work: UnitOfWork | None = None):
         if game_model.stage is StageType.ENDED:
             game_model.ended_at = datetime.now()
 
-        with self as session:
-            session.add(game_model)
-
-            session.commit()
-            session.refresh(game_model)
+        if unit_of_work is not None:
+            unit_of_work.save(game_model)
+            return
+
+        self.save_models(game_model)
+
+    def reset_power_ups(self, game_model: Game, unit_of_work: UnitOfWork):
+        """
+        Mark the power-ups of every contestant in the given game as unused with a single
+        UPDATE when the unit of work is committed. Power-ups loaded with the game
+        are marked as unused in place once the statement has run.
+        """
+        contestant_ids = [contestant.id for contestant in game_model.game_contestants]
+        if contestant_ids == []:
+            return
+
+        unit_of_work.execute(
+            update(GamePowerUp).where(
+                GamePowerUp.contestant_id.in_(contestant_ids),
+                GamePowerUp.used.is_(True)
+            ).values(used=False)
+        )
+        unit_of_work.on_commit(self._mark_power_ups_unused, game_model)
+
+    def _mark_power_ups_unused(self, game_model: Game):
+        for contestant in game_model.game_contestants:
+            # Power-ups that aren't loaded are read from the database when they are used
+            for power_up in contestant.__dict__.get("power_ups", []):
+                set_committed_value(power_up, "used", False)
 
     def save_contenstant(self, contestant_model: Contestant):
-        with self as session:
-            session.add(contestant_model)
-
-            session.commit()
-            session.refresh(contestant_model)
+        self.save_models(contestant_model)
 
     def add_contestant_to_game(self, game_contestant_model: GameContestant, use_powerups: bool):
+        if use_powerups:
+            # Add power-ups to contestant, they are inserted along with it
+            game_contestant_model.power_ups.extend(GamePowerUp(type=power_up) for power_up in PowerUpType)
+
+        self.save_models(game_contestant_model)
+
+        self.lobby_cache.invalidate(game_contestant_model.game_id)
+
+    def join_game(self, contestant_model: Contestant, game_id: str, use_powerups: bool) -> bool:
+        """
+        Save the contestant and add them to the given game, along with their power-ups,
+        in a single transaction. The capacity of the game is checked by the same statement
+        that adds the contestant, so concurrent joins can never overfill a game. Rejoining
+        a game the contestant is already in only saves the contestant. Returns False, and
+        saves nothing, if the game is full.
+        """
+        if contestant_model.id is None:
+            contestant_model.id = str(uuid4())
+
+        values = {column.key: getattr(contestant_model, column.key) for column in inspect(Contestant).column_attrs}
+        joined = self.executor.run(self._join_game, values, game_id, use_powerups)
+
+        # The contestant was written by the private session, so drop any
+        # pending changes to it in the shared session instead of writing them twice
         with self as session:
-            session.add(game_contestant_model)
-
+            if contestant_model in session:
+                session.expire(contestant_model)
+
+        if joined:
+            self.lobby_cache.invalidate(game_id)
+
+        return joined
+
+    def _join_game(self, contestant_values: Dict[str, Any], game_id: str, use_powerups: bool) -> bool:
+        contestant_id = contestant_values["id"]
+        game_contestant_id = str(uuid4())
+
+        already_joined = select(GameContestant.id).where(
+            GameContestant.game_id == game_id,
+            GameContestant.contestant_id == contestant_id,
+        ).exists()
+
+        contestant_count = select(func.count()).where(
+            GameContestant.game_id == game_id
+        ).scalar_subquery()
+
+        game_contestant_statement = insert(GameContestant).from_select(
+            ["id", "game_id", "contestant_id", "has_turn", "score", "buzzes", "hits", "misses", "joined_at", "disconnected"],
+            select(
+                literal(game_contestant_id),
+                Game.id,
+                literal(contestant_id),
+                literal(False),
+                literal(0),
+                literal(0),
+                literal(0),
+                literal(0),
+                literal(datetime.now()),
+                literal(False),
+            ).where(
+                Game.id == game_id,
+                contestant_count < Game.max_contestants,
+                ~already_joined,
+            ),
+        )
+
+        with Session(self.engine) as session:
+            session.merge(Contestant(**contestant_values))
             session.flush()
-            session.refresh(game_contestant_model)
-
-            if use_powerups:
-                # Add power-ups to contestant
-                power_ups = [
-                    GamePowerUp(
-                        contestant_id=game_contestant_model.id,
-                        type=power_up
-                    )
-                    for power_up in PowerUpType
-                ]
 
-                session.add_all(power_ups)
+            if session.execute(game_contestant_statement).rowcount == 0:
+                # Either the contestant is already in the game, or the game is full
+                if not session.execute(select(already_joined)).scalar():
+                    session.rollback()
+                    return False
+
+            elif use_powerups:
+                session.execute(
+                    insert(GamePowerUp),
+                    [{"contestant_id": game_contestant_id, "type": power_up} for power_up in PowerUpType],
+                )
 
             session.commit()
 
-            session.refresh(game_contestant_model)
+        return True
 
     def get_model_from_id(self, model: type[Base], data: Dict[str, Any], key_name: str = "id"):
         with self as session:
@@ -324,143 +1104,183 @@ class Database(SQLAlchemyDatabase):
 
         return model_instance
 
-    def update_question_pack(self, data: Dict[str, Any]):
-        data_to_delete = []
-        new_ids = []
+    def _diff_model(
+        self,
+        model_cls: type[Base],
+        data: Dict[str, Any],
+        existing: Dict[str, Base],
+        inserts: Dict[type[Base], List[Dict[str, Any]]],
+        updates: Dict[type[Base], List[Dict[str, Any]]],
+    ) -> Base:
+        """
+        Validate the given data by creating a model from it and diff it against
+        the existing row with the same ID. The row is queued as an insert with
+        a new UUID if no such row exists, or as an update if any column changed.
+        """
+        if data.get("id") not in existing:
+            data["id"] = str(uuid4())
+
+        columns = [key for key in data if key in model_cls.__table__.columns]
+        new_model = model_cls(**data)
+        old_model = existing.get(data["id"])
+
+        if old_model is None:
+            inserts.setdefault(model_cls, []).append({key: getattr(new_model, key) for key in columns})
+        else:
+            changed_columns = {
+                key: getattr(new_model, key) for key in columns
+                if getattr(old_model, key) != getattr(new_model, key)
+            }
+            if changed_columns != {}:
+                changed_columns["id"] = old_model.id
+                updates.setdefault(model_cls, []).append(changed_columns)
+
+        return new_model
 
+    def update_question_pack(self, data: Dict[str, Any]):
+        """
+        Save the rounds, categories, and questions of a question pack. The existing
+        rows are loaded with one query per table and diffed against the given data,
+        after which all inserts, updates, and deletes are written in batches.
+        """
+        new_ids = self._run_in_session(self._update_question_pack, data)
+
+        # Rows of the pack already loaded in the shared session are loaded again when they are used
         with self as session:
-            pack_model = session.execute(select(QuestionPack).where(QuestionPack.id == data["id"])).scalar_one()
-            pack_data = {
-                k: v for k, v in data.items() if not isinstance(v, list) and k != "id"
-            }
-            pack_data["created_at"] = pack_model.created_at
+            for model in list(session.identity_map.values()):
+                if isinstance(model, _PACK_CONTENT_MODELS):
+                    session.expire(model)
 
-            update_stmt = update(QuestionPack).where(QuestionPack.id == pack_model.id).values(**pack_data)
+        self.pack_cache.invalidate(data["id"])
 
-            session.execute(update_stmt)
+        return new_ids
 
-            # Unpack rounds, categories, and questions into separate models
-            for round_index, round_data in enumerate(data["rounds"]):
-                round_data["pack_id"] = pack_model.id
+    def _update_question_pack(self, session: Session, data: Dict[str, Any]):
+        data_to_delete: Dict[type[Base], List[str]] = {}
+        inserts: Dict[type[Base], List[Dict[str, Any]]] = {}
+        updates: Dict[type[Base], List[Dict[str, Any]]] = {}
+        new_ids = []
 
-                if round_data.get("deleted", False):
-                    if (round_id := round_data.get("id")):
-                        data_to_delete.append((QuestionRound, round_id))
-                    continue
+        pack_model = session.execute(select(QuestionPack).where(QuestionPack.id == data["id"])).scalar_one()
+        pack_data = {
+            k: v for k, v in data.items() if not isinstance(v, list) and k != "id"
+        }
+        pack_data["created_at"] = pack_model.created_at
+
+        update_stmt = update(QuestionPack).where(QuestionPack.id == pack_model.id).values(**pack_data)
+
+        session.execute(update_stmt)
+
+        # Load all existing rows of the pack
+        existing_rounds = {
+            model.id: model for model in session.execute(
+                select(QuestionRound).where(QuestionRound.pack_id == pack_model.id)
+            ).scalars()
+        }
+        existing_categories = {
+            model.id: model for model in session.execute(
+                select(QuestionCategory).join(QuestionRound).where(QuestionRound.pack_id == pack_model.id)
+            ).scalars()
+        }
+        existing_questions = {
+            model.id: model for model in session.execute(
+                select(Question).join(QuestionCategory).join(QuestionRound).where(QuestionRound.pack_id == pack_model.id)
+            ).scalars()
+        }
+
+        # Unpack rounds, categories, and questions and diff them against the existing rows
+        for round_index, round_data in enumerate(data["rounds"]):
+            round_data["pack_id"] = pack_model.id
+
+            if round_data.get("deleted", False):
+                if (round_id := round_data.get("id")):
+                    data_to_delete.setdefault(QuestionRound, []).append(round_id)
+                continue
 
-                category_models = []
-                for category_data in round_data["categories"]:
-                    if category_data.get("deleted", False):
-                        if (category_id := category_data.get("id")):
-                            data_to_delete.append((QuestionCategory, category_id))
-                    else:
-                        category_models.append(category_data)
+            category_models = []
+            for category_data in round_data["categories"]:
+                if category_data.get("deleted", False):
+                    if (category_id := category_data.get("id")):
+                        data_to_delete.setdefault(QuestionCategory, []).append(category_id)
+                else:
+                    category_models.append(category_data)
 
-                del round_data["categories"]
-                new_round_model = QuestionRound(**round_data)
+            del round_data["categories"]
+            round_model = self._diff_model(QuestionRound, round_data, existing_rounds, inserts, updates)
 
-                if "id" in round_data:
-                    round_model = self.get_model_from_id(QuestionRound, round_data)
-                    update_stmt = self._get_update_statement(round_model, new_round_model)
+            if round_model.id not in existing_rounds:
+                new_ids.append({"round": round_index, "id": round_model.id})
 
-                    if update_stmt is not None:
-                        session.execute(update_stmt)
-                else:
-                    round_model = new_round_model
-                    session.add(round_model)
-                    session.flush()
-
-                    new_ids.append({"round": round_index, "id": round_model.id})
-
-                category_index = 0
-                for category_index, category_data in enumerate(category_models):
-                    category_data["round_id"] = round_model.id
-
-                    question_models = []
-                    for question_data in category_data["questions"]:
-                        if question_data.get("deleted", False):
-                            if (question_id := question_data.get("id")):
-                                data_to_delete.append((Question, question_id))
-                        else:
-                            question_models.append(question_data)
-
-                    category_data["order"] = category_index
-                    del category_data["questions"]
-                    new_category_model = QuestionCategory(**category_data)
-
-                    if "id" in category_data:
-                        category_model = self.get_model_from_id(QuestionCategory, category_data)
-                        update_stmt = self._get_update_statement(category_model, new_category_model)
-
-                        if update_stmt is not None:
-                            session.execute(update_stmt)
+            for category_index, category_data in enumerate(category_models):
+                category_data["round_id"] = round_model.id
+
+                question_models = []
+                for question_data in category_data["questions"]:
+                    if question_data.get("deleted", False):
+                        if (question_id := question_data.get("id")):
+                            data_to_delete.setdefault(Question, []).append(question_id)
                     else:
-                        category_model = new_category_model
-                        session.add(category_model)
-                        session.flush()
+                        question_models.append(question_data)
+
+                category_data["order"] = category_index
+                del category_data["questions"]
+                category_model = self._diff_model(QuestionCategory, category_data, existing_categories, inserts, updates)
+
+                if category_model.id not in existing_categories:
+                    new_ids.append(
+                        {
+                            "round": round_index,
+                            "category": category_index,
+                            "id": category_model.id,
+                            "round_id": round_model.id
+                        }
+                    )
+
+                for question_index, question_data in enumerate(question_models):
+                    question_data["category_id"] = category_model.id
+                    if question_data["extra"] == {}:
+                        question_data["extra"] = None
+
+                    question_model = self._diff_model(Question, question_data, existing_questions, inserts, updates)
 
+                    if question_model.id not in existing_questions:
                         new_ids.append(
                             {
                                 "round": round_index,
                                 "category": category_index,
-                                "id": category_model.id,
-                                "round_id": round_model.id
+                                "question": question_index,
+                                "id": question_model.id,
+                                "round_id": round_model.id,
+                                "category_id": category_model.id
                             }
                         )
 
-                    for question_index, question_data in enumerate(question_models):
-                        question_data["category_id"] = category_model.id
-                        if question_data["extra"] == {}:
-                            question_data["extra"] = None
-
-                        new_question_model = Question(**question_data)
-
-                        if "id" in question_data:
-                            question_model = self.get_model_from_id(Question, question_data)
-                            update_stmt = self._get_update_statement(question_model, new_question_model)
-                            if update_stmt is not None:
-                                session.execute(update_stmt)
-                        else:
-                            question_model = new_question_model
-                            session.add(question_model)
-                            session.flush()
-
-                            new_ids.append(
-                                {
-                                    "round": round_index,
-                                    "category": category_index,
-                                    "question": question_index,
-                                    "id": question_model.id,
-                                    "round_id": round_model.id,
-                                    "category_id": category_model.id
-                                }
-                            )
-
-                    category_index += 1
-
-            # Perform deletes if there are any
-            for model, model_id in data_to_delete:
-                session.execute(delete(model).where(model.id == model_id))
+        # Write the changes in batches, parents before children
+        for model in (QuestionRound, QuestionCategory, Question):
+            if inserts.get(model):
+                session.execute(insert(model), inserts[model])
+            if updates.get(model):
+                session.execute(update(model), updates[model])
 
-            session.commit()
+        # Perform deletes if there are any, children before parents
+        for model in (Question, QuestionCategory, QuestionRound):
+            if data_to_delete.get(model):
+                session.execute(delete(model).where(model.id.in_(data_to_delete[model])))
+
+        session.commit()
 
-            return new_ids
+        return new_ids
 
     def delete_question_pack(self, pack_id: str):
-        with self as session:
-            stmt = delete(QuestionPack).where(QuestionPack.id == pack_id)
-            session.execute(stmt)
+        stmt = delete(QuestionPack).where(QuestionPack.id == pack_id)
+        self._run_in_session(self._execute_statements, stmt)
 
-            session.commit()
+        self.pack_cache.invalidate(pack_id)
 
     def clear_tables(self, *tables_filter: List[Base]):
-        with self as session:
-            if tables_filter == []:
-                tables = [Base.metadata.tables[table_name] for table_name in Base.metadata.tables]
-            else:
-                tables = tables_filter
+        if tables_filter == []:
+            tables = [Base.metadata.tables[table_name] for table_name in Base.metadata.tables]
+        else:
+            tables = tables_filter
 
-            for table in tables:
-                session.execute(delete(table))
-
-            session.commit()
+        self._run_in_session(self._execute_statements, *[delete(table) for table in tables])
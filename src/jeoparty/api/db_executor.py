@@ -0,0 +1,46 @@
+from typing import Any, Callable
+
+import gevent
+from gevent.threadpool import ThreadPool
+
+from jeoparty.api.config import Config
+
+class DatabaseExecutor:
+    """
+    Runs blocking database work on a bounded pool of native threads, so that
+    SQLite calls don't block the gevent hub (and with it every other game on
+    the server). The calling greenlet waits for the result, while other
+    greenlets keep running. With no threads, work runs directly on the caller.
+
+    Work dispatched here must not use the shared session of the database,
+    only private sessions created from its engine.
+    """
+    def __init__(self, max_threads: int = Config.DATABASE_THREADS):
+        self.max_threads = max_threads
+        self._pool: ThreadPool | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_threads > 0
+
+    def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        if not self.enabled or gevent.getcurrent() is gevent.get_hub():
+            return func(*args, **kwargs)
+
+        if self._pool is None:
+            self._pool = ThreadPool(self.max_threads)
+
+        # Runs the function directly if called from one of the worker threads
+        return self._pool.apply(func, args, kwargs)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.kill()
+            self._pool = None
+
+    def shutdown(self):
+        """
+        Stop the native threads. Work dispatched afterwards runs directly on the caller.
+        """
+        self.close()
+        self.max_threads = 0
@@ -0,0 +1,32 @@
+from contextlib import contextmanager
+from typing import Dict, List
+
+from gevent.lock import RLock
+
+class GameLocks:
+    """
+    Locks that serialize work on a single game, like contestants joining it,
+    without blocking the same work on other games. A lock is created when it
+    is first needed and dropped again once no greenlet holds or waits for it.
+    """
+    def __init__(self):
+        # Lock and number of greenlets holding or waiting for it, by game ID
+        self._locks: Dict[str, List] = {}
+
+    def __len__(self):
+        return len(self._locks)
+
+    @contextmanager
+    def lock(self, game_id: str):
+        entry = self._locks.get(game_id)
+        if entry is None:
+            entry = self._locks[game_id] = [RLock(), 0]
+
+        entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[game_id]
@@ -0,0 +1,60 @@
+from dataclasses import dataclass, field
+import random
+from typing import Any, Dict, Iterable, List, Set, Tuple
+
+@dataclass(frozen=True)
+class GamePlan:
+    """
+    Placement of the daily doubles of a game, decided once when the game is created,
+    along with the questions of each round that the game questions are written from.
+    """
+    rounds: Dict[int, List[str]] = field(default_factory=dict)
+    daily_doubles: Set[str] = field(default_factory=set)
+
+    def get_daily_doubles(self, round_num: int) -> List[str]:
+        return [question_id for question_id in self.rounds.get(round_num, []) if question_id in self.daily_doubles]
+
+    def get_game_question_rows(self, game_id: str) -> List[Dict[str, Any]]:
+        return [
+            {
+                "game_id": game_id,
+                "question_id": question_id,
+                "active": False,
+                "used": False,
+                "daily_double": question_id in self.daily_doubles,
+            }
+            for round_num in sorted(self.rounds)
+            for question_id in self.rounds[round_num]
+        ]
+
+def generate_game_plan(
+    questions: Iterable[Tuple[str, int]],
+    regular_rounds: int,
+    use_daily_doubles: bool,
+    seed: int | None = None
+) -> GamePlan:
+    """
+    Create the plan of a game from (question id, round number) pairs. Each regular round
+    gets as many daily doubles as its round number, capped by its number of questions.
+    Questions from a round after the regular rounds belong to the finale, which never
+    has daily doubles. The same questions and seed always give the same plan.
+    """
+    rounds: Dict[int, List[str]] = {}
+    for question_id, round_num in questions:
+        rounds.setdefault(round_num, []).append(question_id)
+
+    # Questions are sorted so the plan only depends on the seed, not on the order of the rows
+    for question_ids in rounds.values():
+        question_ids.sort()
+
+    daily_doubles = set()
+    if use_daily_doubles:
+        rng = random.Random(seed)
+        for round_num in sorted(rounds):
+            if round_num > regular_rounds:
+                continue
+
+            question_ids = rounds[round_num]
+            daily_doubles.update(rng.sample(question_ids, k=min(round_num, len(question_ids))))
+
+    return GamePlan(rounds, daily_doubles)
@@ -0,0 +1,45 @@
+from time import monotonic
+from typing import Dict, Tuple
+
+from jeoparty.api.config import Config
+from jeoparty.api.summaries import GameLobbyView
+
+class LobbyViewCache:
+    """
+    Short-lived cache of game lobby views, keyed by join code, so contestants
+    opening the lobby of the same game at once share a single query.
+    """
+    def __init__(self, ttl: float = Config.LOBBY_VIEW_TTL):
+        self.ttl = ttl
+        self._entries: Dict[str, Tuple[float, GameLobbyView]] = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, join_code: str) -> GameLobbyView | None:
+        entry = self._entries.get(join_code)
+        if entry is None:
+            return None
+
+        expires_at, view = entry
+        if expires_at <= monotonic():
+            self._entries.pop(join_code, None)
+            return None
+
+        return view
+
+    def put(self, view: GameLobbyView):
+        now = monotonic()
+
+        # Drop expired entries so codes of old games don't pile up
+        for join_code in [join_code for join_code, (expires_at, _) in self._entries.items() if expires_at <= now]:
+            del self._entries[join_code]
+
+        self._entries[view.join_code] = (now + self.ttl, view)
+
+    def invalidate(self, game_id: str):
+        for join_code in [join_code for join_code, (_, view) in self._entries.items() if view.id == game_id]:
+            del self._entries[join_code]
+
+    def clear(self):
+        self._entries.clear()
@@ -0,0 +1,308 @@
+from dataclasses import dataclass
+from hashlib import sha256
+import json
+import os
+from time import time
+from typing import Dict, Iterable, Iterator, List, Tuple
+from uuid import uuid4
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from jeoparty.api.config import Config
+from jeoparty.api.db_executor import DatabaseExecutor
+
+# Magic bytes at the start of the supported media files and the offset they are found at
+_SIGNATURES: List[Tuple[int, bytes, str]] = [
+    (0, b"\x89PNG\r\n\x1a\n", "image/png"),
+    (0, b"\xff\xd8\xff", "image/jpeg"),
+    (0, b"GIF87a", "image/gif"),
+    (0, b"GIF89a", "image/gif"),
+    (8, b"WEBP", "image/webp"),
+    (0, b"\x1a\x45\xdf\xa3", "video/webm"),
+    (4, b"ftyp", "video/mp4"),
+]
+
+# Number of bytes needed to recognize any of the signatures
+SNIFF_SIZE = 16
+
+def sniff_content_type(data: bytes) -> str | None:
+    """
+    Get the content type of a media file from its first bytes, or None if it isn't recognized.
+    """
+    for offset, signature, content_type in _SIGNATURES:
+        if data[offset:offset + len(signature)] == signature:
+            # WebP files are RIFF containers
+            if content_type == "image/webp" and not data.startswith(b"RIFF"):
+                continue
+
+            return content_type
+
+    return None
+
+class MediaFetchError(Exception):
+    def __init__(self, message: str, status: int):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+@dataclass(frozen=True)
+class MediaCacheEntry:
+    url: str
+    digest: str
+    content_type: str
+    size: int
+    fetched_at: float
+
+class MediaCache:
+    """
+    Disk cache of media fetched by URL. The content of each file is stored once under
+    its SHA-256 digest, so URLs with the same content share a file, and each URL has a
+    small metadata file pointing to it. Entries expire after the TTL, and the least
+    recently used entries are evicted when the content takes up more than the budget.
+    """
+    def __init__(
+        self,
+        folder: str = Config.MEDIA_CACHE_FOLDER,
+        ttl: float = Config.MEDIA_CACHE_TTL,
+        budget: int = Config.MEDIA_CACHE_BUDGET,
+    ):
+        self.folder = folder
+        self.ttl = ttl
+        self.budget = budget
+
+    def _get_meta_path(self, url: str) -> str:
+        return f"{self.folder}/urls/{sha256(url.encode('utf-8')).hexdigest()}.json"
+
+    def get_content_path(self, digest: str) -> str:
+        return f"{self.folder}/content/{digest}"
+
+    def _read_meta(self, meta_path: str) -> MediaCacheEntry | None:
+        try:
+            with open(meta_path, "r", encoding="utf-8") as fp:
+                return MediaCacheEntry(**json.load(fp))
+        except (FileNotFoundError, ValueError, TypeError):
+            return None
+
+    def get(self, url: str) -> MediaCacheEntry | None:
+        meta_path = self._get_meta_path(url)
+        entry = self._read_meta(meta_path)
+        if entry is None:
+            return None
+
+        if time() - entry.fetched_at > self.ttl or not os.path.exists(self.get_content_path(entry.digest)):
+            os.remove(meta_path)
+            return None
+
+        # The modification time of the metadata file is the last time the entry was used
+        os.utime(meta_path)
+
+        return entry
+
+    def download(self, url: str, content_type: str, chunks: Iterator[bytes]) -> MediaCacheEntry:
+        """
+        Write all the given chunks to the cache and return the new entry.
+        """
+        for _ in self.store(url, content_type, chunks):
+            pass
+
+        return self._read_meta(self._get_meta_path(url))
+
+    def store(self, url: str, content_type: str, chunks: Iterator[bytes]) -> Iterator[bytes]:
+        """
+        Pass the given chunks through while writing them to the cache. The content
+        is only added if all the chunks are consumed without errors.
+        """
+        os.makedirs(f"{self.folder}/urls", exist_ok=True)
+        os.makedirs(f"{self.folder}/content", exist_ok=True)
+
+        temp_path = f"{self.folder}/content/{uuid4()}.tmp"
+        digest = sha256()
+        size = 0
+        completed = False
+        try:
+            with open(temp_path, "wb") as fp:
+                for chunk in chunks:
+                    fp.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+                    yield chunk
+
+            completed = True
+        finally:
+            if not completed:
+                os.remove(temp_path)
+                if hasattr(chunks, "close"):
+                    chunks.close()
+
+        entry = MediaCacheEntry(url, digest.hexdigest(), content_type, size, time())
+        os.replace(temp_path, self.get_content_path(entry.digest))
+
+        meta_path = self._get_meta_path(url)
+        with open(f"{meta_path}.tmp", "w", encoding="utf-8") as fp:
+            json.dump(entry.__dict__, fp)
+
+        os.replace(f"{meta_path}.tmp", meta_path)
+
+        self.evict(entry.digest)
+
+    def evict(self, keep_digest: str | None = None):
+        """
+        Remove expired entries, then the least recently used entries until the content
+        fits in the budget, and finally any content no entry points to. Content with
+        the given digest is always kept, so a file that was just stored can be read.
+        """
+        now = time()
+        entries: List[Tuple[float, str, MediaCacheEntry]] = []
+        with os.scandir(f"{self.folder}/urls") as meta_files:
+            for meta_file in meta_files:
+                if not meta_file.name.endswith(".json"):
+                    continue
+
+                entry = self._read_meta(meta_file.path)
+                if entry is None or now - entry.fetched_at > self.ttl:
+                    os.remove(meta_file.path)
+                else:
+                    entries.append((meta_file.stat().st_mtime, meta_file.path, entry))
+
+        # Content shared by several URLs is only counted once
+        references: Dict[str, int] = {}
+        total_size = 0
+        for _, _, entry in entries:
+            if entry.digest not in references:
+                total_size += entry.size
+
+            references[entry.digest] = references.get(entry.digest, 0) + 1
+
+        entries.sort(key=lambda x: x[0])
+        for _, meta_path, entry in entries:
+            if total_size <= self.budget:
+                break
+
+            if entry.digest == keep_digest:
+                continue
+
+            os.remove(meta_path)
+            references[entry.digest] -= 1
+            if references[entry.digest] == 0:
+                total_size -= entry.size
+
+        with os.scandir(f"{self.folder}/content") as content_files:
+            for content_file in content_files:
+                if references.get(content_file.name, 0) == 0 and not content_file.name.endswith(".tmp"):
+                    os.remove(content_file.path)
+
+    def clear(self):
+        for subfolder in ("urls", "content"):
+            if not os.path.exists(f"{self.folder}/{subfolder}"):
+                continue
+
+            with os.scandir(f"{self.folder}/{subfolder}") as files:
+                for file in files:
+                    os.remove(file.path)
+
+class MediaProxy:
+    """
+    Fetches media files by URL for the question pack editor. Files are streamed
+    through in chunks with a pooled HTTP session and are never read fully into memory.
+    The content type is sniffed from the first bytes of the file, files larger than
+    the max size are rejected, and fetched files are kept in a disk cache.
+
+    Files of unknown size are downloaded to the cache before anything is returned,
+    so a file over the max size is rejected before a response has been started.
+    Network reads run on the executor, since nothing patches the sockets for gevent.
+    """
+    def __init__(
+        self,
+        cache: MediaCache,
+        max_size: int = Config.MEDIA_FETCH_MAX_SIZE,
+        timeout: float = Config.MEDIA_FETCH_TIMEOUT,
+        chunk_size: int = Config.MEDIA_FETCH_CHUNK_SIZE,
+        executor: DatabaseExecutor | None = None,
+    ):
+        self.cache = cache
+        self.max_size = max_size
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.executor = DatabaseExecutor() if executor is None else executor
+
+        self._http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+        self._http.mount("http://", adapter)
+        self._http.mount("https://", adapter)
+
+    def _read_file(self, path: str) -> Iterator[bytes]:
+        with open(path, "rb") as fp:
+            while chunk := fp.read(self.chunk_size):
+                yield chunk
+
+    def _read_chunk(self, chunks: Iterator[bytes]) -> bytes | None:
+        try:
+            return next(chunks, None)
+        except requests.RequestException as exc:
+            raise MediaFetchError("Could not fetch resources", 502) from exc
+
+    def _stream_response(self, response: requests.Response, first_chunk: bytes, chunks: Iterator[bytes]) -> Iterator[bytes]:
+        try:
+            size = 0
+            chunk = first_chunk
+            while chunk is not None:
+                size += len(chunk)
+                if size > self.max_size:
+                    # Stop the download, the truncated file is not cached
+                    raise MediaFetchError("File is too large to fetch", 413)
+
+                yield chunk
+                chunk = self.executor.run(self._read_chunk, chunks)
+        finally:
+            response.close()
+
+    def fetch(self, url: str, valid_types: Iterable[str]) -> Tuple[str, Iterator[bytes]]:
+        """
+        Fetch the media file at the given URL. Returns its content type and
+        an iterator over its content. Raises MediaFetchError if the file could
+        not be fetched, is too large, or is not one of the valid types.
+        """
+        entry = self.cache.get(url)
+        if entry is not None:
+            return entry.content_type, self._read_file(self.cache.get_content_path(entry.digest))
+
+        try:
+            response = self.executor.run(self._http.get, url, stream=True, timeout=self.timeout)
+        except requests.RequestException as exc:
+            raise MediaFetchError("Could not fetch resources", 502) from exc
+
+        if response.status_code != 200:
+            response.close()
+            raise MediaFetchError("Could not fetch resources", response.status_code)
+
+        content_length = response.headers.get("Content-Length")
+        has_length = content_length is not None and content_length.isdigit()
+        if has_length and int(content_length) > self.max_size:
+            response.close()
+            raise MediaFetchError("File is too large to fetch", 413)
+
+        # Read until there are enough bytes to recognize the file
+        chunks = response.iter_content(self.chunk_size)
+        first_chunk = b""
+        try:
+            while len(first_chunk) < SNIFF_SIZE and (chunk := self.executor.run(self._read_chunk, chunks)) is not None:
+                first_chunk += chunk
+        except MediaFetchError:
+            response.close()
+            raise
+
+        content_type = sniff_content_type(first_chunk)
+        if content_type is None or content_type not in valid_types:
+            response.close()
+            raise MediaFetchError("Invalid file type to fetch", 400)
+
+        content = self._stream_response(response, first_chunk, chunks)
+        if has_length:
+            return content_type, self.cache.store(url, content_type, content)
+
+        # Without a known size, the file is only sent once it is known to fit within the max size
+        entry = self.executor.run(self.cache.download, url, content_type, content)
+        return content_type, self._read_file(self.cache.get_content_path(entry.digest))
+
+media_proxy = MediaProxy(MediaCache())
@@ -1,10 +1,10 @@
 from datetime import datetime
-import os
 from typing import Any, Dict, List, Optional
 from uuid import uuid4
 
-from sqlalchemy import String, Integer, Float, Boolean, DateTime, Enum, JSON, ForeignKey, case
+from sqlalchemy import String, Integer, Float, Boolean, DateTime, Enum, JSON, ForeignKey, Index, case, event, text, inspect
 from sqlalchemy.orm import mapped_column, Mapped, relationship
+from sqlalchemy.orm.attributes import set_committed_value
 
 from mhooge_flask.database import Base
 
@@ -14,8 +14,8 @@ from jeoparty.api.config import (
     get_theme_path,
     get_question_pack_data_path,
     get_buzz_sound_path,
-    file_or_fallback,
 )
+from jeoparty.api.asset_manifest import asset_manifest
 
 power_up_order_case = {power_up.name: index for index, power_up in enumerate(PowerUpType)}
 
@@ -24,9 +24,9 @@ class Theme(Base):
 
     id: Mapped[str] = mapped_column(String(64), primary_key=True, default=lambda: str(uuid4()))
     name: Mapped[str] = mapped_column(String(64))
-    public: Mapped[bool] = mapped_column(Boolean, default=False)
+    public: Mapped[bool] = mapped_column(Boolean, default=False, index=True)
     language: Mapped[Language] = mapped_column(Enum(Language), default=Language.ENGLISH)
-    created_by: Mapped[str] = mapped_column(String(64), ForeignKey("users.id"))
+    created_by: Mapped[str] = mapped_column(String(64), ForeignKey("users.id"), index=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=lambda: datetime.now())
     changed_at: Mapped[datetime] = mapped_column(DateTime, default=lambda: datetime.now())
 
@@ -61,6 +61,12 @@ class QuestionPack(Base):
 
     __serialize_relationships__ = [creator, rounds, theme]
 
+    __table_args__ = (
+        # Keyset pagination of packs listed by owner or visibility, newest changed first
+        Index("ix_question_packs_created_by_changed_at", "created_by", "changed_at", "id"),
+        Index("ix_question_packs_public_changed_at", "public", "changed_at", "id"),
+    )
+
     @property
     def extra_fields(self):
         return {
@@ -87,7 +93,7 @@ class QuestionRound(Base):
     }
 
     id: Mapped[str] = mapped_column(String(64), primary_key=True, default=lambda: str(uuid4()))
-    pack_id: Mapped[str] = mapped_column(String(64), ForeignKey("question_packs.id", ondelete="CASCADE"))
+    pack_id: Mapped[str] = mapped_column(String(64), ForeignKey("question_packs.id", ondelete="CASCADE"), index=True)
     name: Mapped[str] = mapped_column(String(64))
     round: Mapped[int] = mapped_column(Integer)
 
@@ -104,7 +110,7 @@ class QuestionCategory(Base):
     }
 
     id: Mapped[str] = mapped_column(String(64), primary_key=True, default=lambda: str(uuid4()))
-    round_id: Mapped[str] = mapped_column(String(64), ForeignKey("question_rounds.id", ondelete="CASCADE"))
+    round_id: Mapped[str] = mapped_column(String(64), ForeignKey("question_rounds.id", ondelete="CASCADE"), index=True)
     name: Mapped[str] = mapped_column(String(64))
     order: Mapped[int] = mapped_column(Integer)
     buzz_time: Mapped[Optional[int]] = mapped_column(Integer, default=10)
@@ -130,7 +136,7 @@ class Question(Base):
     }
 
     id: Mapped[str] = mapped_column(String(64), primary_key=True, default=lambda: str(uuid4()))
-    category_id: Mapped[str] = mapped_column(String(64), ForeignKey("question_categories.id", ondelete="CASCADE"))
+    category_id: Mapped[str] = mapped_column(String(64), ForeignKey("question_categories.id", ondelete="CASCADE"), index=True)
     question: Mapped[str] = mapped_column(String(128))
     answer: Mapped[str] = mapped_column(String(128))
     value: Mapped[int] = mapped_column(Integer)
@@ -156,7 +162,7 @@ class BuzzerSound(Base):
     __tablename__ = "buzzer_sounds"
 
     id: Mapped[str] = mapped_column(String(64), primary_key=True, default=lambda: str(uuid4()))
-    theme_id: Mapped[str] = mapped_column(String(64), ForeignKey("themes.id", ondelete="CASCADE"))
+    theme_id: Mapped[str] = mapped_column(String(64), ForeignKey("themes.id", ondelete="CASCADE"), index=True)
     filename: Mapped[str] = mapped_column(String(128))
     correct: Mapped[bool] = mapped_column(Boolean)
 
@@ -185,7 +191,7 @@ class GamePowerUp(Base):
     __tablename__ = "game_power_ups"
 
     id: Mapped[str] = mapped_column(String(64), primary_key=True, default=lambda: str(uuid4()))
-    contestant_id: Mapped[str] = mapped_column(String(64), ForeignKey("game_contestants.id", ondelete="CASCADE"))
+    contestant_id: Mapped[str] = mapped_column(String(64), ForeignKey("game_contestants.id", ondelete="CASCADE"), index=True)
     type: Mapped[PowerUpType] = mapped_column(Enum(PowerUpType))
     enabled: Mapped[bool] = mapped_column(Boolean, default=False)
     used: Mapped[bool] = mapped_column(Boolean, default=False)
@@ -198,7 +204,7 @@ class GamePowerUp(Base):
         icon = f"{self.type.value}_power.png"
 
         return {
-            "icon": file_or_fallback(
+            "icon": asset_manifest.file_or_fallback(
                 f"{get_theme_path(theme_id, False)}/{icon}",
                 f"img/{icon}",
                 theme_id is not None
@@ -216,8 +222,8 @@ class GameContestant(Base):
     }
 
     id: Mapped[str] = mapped_column(String(64), primary_key=True, default=lambda: str(uuid4()))
-    game_id: Mapped[str] = mapped_column(String(64), ForeignKey("games.id", ondelete="CASCADE"), primary_key=True)
-    contestant_id: Mapped[str] = mapped_column(String(64), ForeignKey("contestants.id", ondelete="CASCADE"), primary_key=True)
+    game_id: Mapped[str] = mapped_column(String(64), ForeignKey("games.id", ondelete="CASCADE"), primary_key=True, index=True)
+    contestant_id: Mapped[str] = mapped_column(String(64), ForeignKey("contestants.id", ondelete="CASCADE"), primary_key=True, index=True)
     has_turn: Mapped[bool] = mapped_column(Boolean, default=False)
     score: Mapped[int] = mapped_column(Integer, default=0)
     buzzes: Mapped[int] = mapped_column(Integer, default=0)
@@ -257,13 +263,13 @@ class GameQuestion(Base):
     __tablename__ = "game_questions"
 
     game_id: Mapped[str] = mapped_column(String(64), ForeignKey("games.id", ondelete="CASCADE"), primary_key=True)
-    question_id: Mapped[str] = mapped_column(String(64), ForeignKey("questions.id"), primary_key=True)
+    question_id: Mapped[str] = mapped_column(String(64), ForeignKey("questions.id"), primary_key=True, index=True)
     active: Mapped[bool] = mapped_column(Boolean, default=False)
     used: Mapped[bool] = mapped_column(Boolean, default=False)
     daily_double: Mapped[bool] = mapped_column(Boolean, default=False)
 
     game = relationship("Game", back_populates="game_questions")
-    question = relationship("Question", back_populates="game_questions")
+    question = relationship("Question", back_populates="game_questions", cascade="merge")
 
     __serialize_relationships__ = [question]
 
@@ -277,9 +283,9 @@ class Game(Base):
     }
 
     id: Mapped[str] = mapped_column(String(64), primary_key=True, default=lambda: str(uuid4()))
-    pack_id: Mapped[str] = mapped_column(String(64), ForeignKey("question_packs.id"))
+    pack_id: Mapped[str] = mapped_column(String(64), ForeignKey("question_packs.id"), index=True)
     title: Mapped[str] = mapped_column(String(32))
-    join_code: Mapped[str] = mapped_column(String(64))
+    join_code: Mapped[str] = mapped_column(String(64), index=True)
     regular_rounds: Mapped[int] = mapped_column(Integer, default=Config.REGULAR_ROUNDS)
     max_contestants: Mapped[int] = mapped_column(Integer)
     answer_time: Mapped[int] = mapped_column(Integer, default=Config.DEFAULT_ANSWER_TIME)
@@ -293,12 +299,18 @@ class Game(Base):
     ended_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
 
     creator = relationship("User")
-    pack = relationship("QuestionPack", back_populates="games")
+    # Packs attached from the pack cache are shared between sessions, so they must not be cascaded into them
+    pack = relationship("QuestionPack", back_populates="games", cascade="merge")
     game_questions = relationship("GameQuestion", back_populates="game", cascade="all, delete", order_by="GameQuestion.question_id.asc()")
     game_contestants = relationship("GameContestant", back_populates="game", cascade="all, delete", order_by="GameContestant.joined_at.asc()")
 
     __serialize_relationships__ = [pack, game_questions, game_contestants]
 
+    __table_args__ = (
+        # Keyset pagination of games listed by owner, newest started first
+        Index("ix_games_created_by_started_at", "created_by", "started_at", "id"),
+    )
+
     @property
     def extra_fields(self):
         player_with_turn = self.get_contestant_with_turn()
@@ -314,8 +326,8 @@ class Game(Base):
             theme_dict = {
                 "data_path": data_path,
                 "template_path": f"themes/{theme_id}",
-                "bg_image": bg_image if os.path.exists(f"{Config.STATIC_FOLDER}/{bg_image}") else None,
-                "logo": logo if os.path.exists(f"{Config.STATIC_FOLDER}/{logo}") else None,
+                "bg_image": bg_image if asset_manifest.exists(bg_image) else None,
+                "logo": logo if asset_manifest.exists(logo) else None,
             }
 
         # Power-up videos
@@ -324,7 +336,7 @@ class Game(Base):
         power_videos = {}
         for power_up in PowerUpType:
             video = f"{power_up.value}_power_used"
-            power_videos[power_up.value] = file_or_fallback(
+            power_videos[power_up.value] = asset_manifest.file_or_fallback(
                 f"{get_theme_path(theme_id, False)}/{video}.webm",
                 f"img/{video}_{language}.webm",
                 theme_id is not None
@@ -342,45 +354,46 @@ class Game(Base):
             "theme": theme_dict,
         }
 
+    def _get_index(self) -> "_GameIndex":
+        # The index is rebuilt if it has been invalidated by an event or if
+        # either relationship collection has been reloaded since it was built
+        index: _GameIndex | None = self.__dict__.get("_lookup_index")
+        contestants = self.game_contestants
+        questions = self.game_questions
+
+        if index is None or index.contestants is not contestants or index.questions is not questions:
+            index = _GameIndex(self, contestants, questions)
+            self.__dict__["_lookup_index"] = index
+
+        return index
+
+    def invalidate_index(self):
+        self.__dict__.pop("_lookup_index", None)
+
     def get_contestant(self, *, contestant_id: str | None = None, game_contestant_id: str | None = None) -> GameContestant | None:
         if contestant_id is None and game_contestant_id is None:
             return None
 
-        for contestant in self.game_contestants:
-            if contestant_id is not None and contestant.contestant_id == contestant_id:
-                return contestant
+        index = self._get_index()
+        if contestant_id is not None and (contestant := index.contestants_by_contestant_id.get(contestant_id)):
+            return contestant
 
-            elif game_contestant_id is not None and contestant.id == game_contestant_id:
-                return contestant
+        if game_contestant_id is not None:
+            return index.contestants_by_id.get(game_contestant_id)
 
         return None
 
     def get_question(self, question_id: str) -> GameQuestion | None:
-        for question in self.game_questions:
-            if question.question_id == question_id:
-                return question
-            
-        return None
+        return self._get_index().questions_by_id.get(question_id)
 
     def get_contestant_with_turn(self) -> GameContestant | None:
-        for contestant in self.game_contestants:
-            if contestant.has_turn:
-                return contestant
-
-        return None
+        return self._get_index().contestant_with_turn
 
     def get_questions_for_round(self) -> List[GameQuestion]:
-        return [
-            game_question for game_question in self.game_questions
-            if game_question.question.category.round.round == self.round
-        ]
+        return list(self._get_index().questions_by_round.get(self.round, []))
 
     def get_active_question(self) -> GameQuestion | None:
-        for question in self.game_questions:
-            if question.active:
-                return question
-
-        return None
+        return self._get_index().active_question
 
     def get_game_winners(self) -> List[GameContestant]:
         sorted_contestants = sorted(
@@ -400,3 +413,101 @@ class Game(Base):
     def set_contestant_turn(self, contestant_id: str):
         for contestant in self.game_contestants:
             contestant.has_turn = contestant.contestant_id == contestant_id
+
+class OutboxMessage(Base):
+    __tablename__ = "outbox_messages"
+
+    id: Mapped[str] = mapped_column(String(64), primary_key=True, default=lambda: str(uuid4()))
+    game_id: Mapped[str] = mapped_column(String(64), ForeignKey("games.id", ondelete="CASCADE"))
+    event: Mapped[str] = mapped_column(String(64))
+    url: Mapped[str] = mapped_column(String(256))
+    payload: Mapped[Dict[str, Any]] = mapped_column(JSON)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=lambda: datetime.now())
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime, default=lambda: datetime.now())
+    delivered_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    last_error: Mapped[Optional[str]] = mapped_column(String(256))
+
+    __table_args__ = (
+        # Only one message is sent per game and event, no matter how often it is queued
+        Index("ix_outbox_messages_game_id_event", "game_id", "event", unique=True),
+        # Undelivered messages are polled by when they are due
+        Index("ix_outbox_messages_pending", "next_attempt_at", sqlite_where=text("delivered_at IS NULL")),
+    )
+
+class _GameIndex:
+    """
+    Lookup tables for the contestants and questions of a game, built in a single pass.
+    """
+    def __init__(self, game: Game, contestants: List[GameContestant], questions: List[GameQuestion]):
+        self.contestants = contestants
+        self.questions = questions
+        self.contestants_by_id: Dict[str, GameContestant] = {}
+        self.contestants_by_contestant_id: Dict[str, GameContestant] = {}
+        self.questions_by_id: Dict[str, GameQuestion] = {}
+        self.questions_by_round: Dict[int, List[GameQuestion]] = {}
+        self.contestant_with_turn: GameContestant | None = None
+        self.active_question: GameQuestion | None = None
+
+        for contestant in contestants:
+            # Make sure the back reference is set, so changes to the contestant can invalidate the index
+            if "game" not in contestant.__dict__:
+                set_committed_value(contestant, "game", game)
+
+            contestant.__dict__["_index_game_id"] = game.id
+
+            self.contestants_by_id.setdefault(contestant.id, contestant)
+            self.contestants_by_contestant_id.setdefault(contestant.contestant_id, contestant)
+            if contestant.has_turn and self.contestant_with_turn is None:
+                self.contestant_with_turn = contestant
+
+        for question in questions:
+            if "game" not in question.__dict__:
+                set_committed_value(question, "game", game)
+
+            question.__dict__["_index_game_id"] = game.id
+
+            self.questions_by_id.setdefault(question.question_id, question)
+            self.questions_by_round.setdefault(question.question.category.round.round, []).append(question)
+            if question.active and self.active_question is None:
+                self.active_question = question
+
+def _get_parent_game(target: GameContestant | GameQuestion) -> Game | None:
+    game = target.__dict__.get("game")
+    if game is not None:
+        return game
+
+    # The relationship is expired or was never loaded, so look up the game in the session
+    # by its id. The id is remembered by the index, since it is also gone if the row is expired
+    game_id = target.__dict__.get("game_id", target.__dict__.get("_index_game_id"))
+    session = inspect(target).session
+    if game_id is None or session is None:
+        return None
+
+    return session.identity_map.get(session.identity_key(Game, game_id))
+
+def _invalidate_parent_index(target: GameContestant | GameQuestion | None, *args):
+    # Target can be None if the instance has been garbage collected when it expires
+    game = None if target is None else _get_parent_game(target)
+    if game is not None:
+        game.invalidate_index()
+
+def _invalidate_own_index(target: Game | None, *args):
+    if target is not None:
+        target.invalidate_index()
+
+# Keep the lookup indexes of games up to date when contestants get the turn,
+# questions are activated, or the rows they are built from are changed or reloaded
+event.listen(GameContestant.has_turn, "set", _invalidate_parent_index)
+event.listen(GameQuestion.active, "set", _invalidate_parent_index)
+
+for _model in (GameContestant, GameQuestion):
+    event.listen(_model, "refresh", _invalidate_parent_index)
+    event.listen(_model, "expire", _invalidate_parent_index)
+
+for _collection in (Game.game_contestants, Game.game_questions):
+    for _event in ("append", "remove", "bulk_replace"):
+        event.listen(_collection, _event, _invalidate_own_index)
+
+event.listen(Game, "refresh", _invalidate_own_index)
+event.listen(Game, "expire", _invalidate_own_index)
@@ -0,0 +1,242 @@
+from datetime import datetime, timedelta
+from time import perf_counter
+from typing import Any, Dict, List
+
+import gevent
+from gevent.event import Event
+import requests
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from mhooge_flask.logging import logger
+
+from jeoparty.api.config import Config
+from jeoparty.api.orm.models import OutboxMessage
+
+def get_intfar_credentials() -> Dict[str, Any]:
+    return {"disc_id": Config.secrets["intfar_disc_id"], "token": Config.secrets["intfar_user_id"]}
+
+class OutboxWorker:
+    """
+    Sends messages to Int-Far in the background from a persistent outbox table,
+    so the pages that queue them don't wait for Int-Far to answer. Only one message
+    is kept per game and event, and failed messages are retried with exponential
+    backoff until they are delivered or run out of attempts. Messages still in the
+    outbox when the server stops are sent once the worker is started again.
+
+    The Int-Far credentials are added to the payload when a message is sent,
+    so they are never stored in the database.
+    """
+    def __init__(
+        self,
+        database: "Database",
+        poll_interval: float = Config.OUTBOX_POLL_INTERVAL,
+        request_timeout: float = Config.OUTBOX_REQUEST_TIMEOUT,
+        backoff_base: float = Config.OUTBOX_BACKOFF_BASE,
+        backoff_max: float = Config.OUTBOX_BACKOFF_MAX,
+        max_attempts: int = Config.OUTBOX_MAX_ATTEMPTS,
+        credentials: Dict[str, Any] | None = None,
+    ):
+        self.database = database
+        self.poll_interval = poll_interval
+        self.request_timeout = request_timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_attempts = max_attempts
+        self.credentials = credentials
+
+        self._http = requests.Session()
+        self._greenlet: gevent.Greenlet | None = None
+        self._wakeup = Event()
+        self._stopping = False
+
+        self._queued = 0
+        self._duplicates = 0
+        self._delivered = 0
+        self._failed_attempts = 0
+        self._abandoned = 0
+        self._last_latency: float | None = None
+        self._last_delivered_at: datetime | None = None
+        self._last_error: str | None = None
+
+    def _get_backoff(self, attempts: int) -> float:
+        return min(self.backoff_base * 2 ** (attempts - 1), self.backoff_max)
+
+    def _insert(self, game_id: str, event: str, url: str, payload: Dict[str, Any]) -> bool:
+        statement = insert(OutboxMessage).values(
+            game_id=game_id,
+            event=event,
+            url=url,
+            payload=payload,
+        ).on_conflict_do_nothing(index_elements=["game_id", "event"])
+
+        with Session(self.database.engine) as session:
+            result = session.execute(statement)
+            session.commit()
+
+        return result.rowcount > 0
+
+    def enqueue(self, game_id: str, event: str, url: str, payload: Dict[str, Any]) -> bool:
+        """
+        Queue a message to be posted to the given URL and wake up the worker.
+        Returns False if a message for the same game and event was already queued.
+        """
+        if not self.database.executor.run(self._insert, game_id, event, url, payload):
+            self._duplicates += 1
+            return False
+
+        self._queued += 1
+        self.start()
+        self._wakeup.set()
+
+        return True
+
+    def _get_due_messages(self, now: datetime) -> List[OutboxMessage]:
+        with Session(self.database.engine) as session:
+            statement = select(OutboxMessage).where(
+                OutboxMessage.delivered_at.is_(None),
+                OutboxMessage.next_attempt_at <= now,
+                OutboxMessage.attempts < self.max_attempts,
+            ).order_by(OutboxMessage.next_attempt_at)
+
+            return session.execute(statement).scalars().all()
+
+    def _get_next_attempt_at(self) -> datetime | None:
+        with Session(self.database.engine) as session:
+            statement = select(func.min(OutboxMessage.next_attempt_at)).where(
+                OutboxMessage.delivered_at.is_(None),
+                OutboxMessage.attempts < self.max_attempts,
+            )
+
+            return session.execute(statement).scalar()
+
+    def _count_pending(self) -> int:
+        with Session(self.database.engine) as session:
+            statement = select(func.count()).select_from(OutboxMessage).where(
+                OutboxMessage.delivered_at.is_(None),
+                OutboxMessage.attempts < self.max_attempts,
+            )
+
+            return session.execute(statement).scalar()
+
+    def _save_attempt(self, message_id: str, **values):
+        with Session(self.database.engine) as session:
+            session.execute(update(OutboxMessage).where(OutboxMessage.id == message_id).values(**values))
+            session.commit()
+
+    def _send(self, message: OutboxMessage) -> str | None:
+        credentials = get_intfar_credentials() if self.credentials is None else self.credentials
+        payload = {**message.payload, **credentials}
+
+        try:
+            response = self._http.post(message.url, json=payload, timeout=self.request_timeout)
+        except requests.RequestException as exc:
+            return f"{type(exc).__name__}: {exc}"
+
+        if response.status_code != 200:
+            return f"Status {response.status_code}: {response.text}"
+
+        return None
+
+    def _deliver(self, message: OutboxMessage, now: datetime) -> bool:
+        # Nothing patches the sockets for gevent, so the request is sent from a native thread
+        time_start = perf_counter()
+        error = self.database.executor.run(self._send, message)
+        self._last_latency = perf_counter() - time_start
+
+        attempts = message.attempts + 1
+        if error is None:
+            self.database.executor.run(self._save_attempt, message.id, attempts=attempts, delivered_at=now, last_error=None)
+            self._delivered += 1
+            self._last_delivered_at = now
+            return True
+
+        self.database.executor.run(
+            self._save_attempt,
+            message.id,
+            attempts=attempts,
+            next_attempt_at=now + timedelta(seconds=self._get_backoff(attempts)),
+            last_error=error[:256],
+        )
+        self._failed_attempts += 1
+        self._last_error = error
+
+        if attempts >= self.max_attempts:
+            self._abandoned += 1
+            logger.bind(event=message.event, game_id=message.game_id, error=error).error(
+                f"Giving up on sending '{message.event}' to Int-Far after {attempts} attempts"
+            )
+        else:
+            logger.bind(event=message.event, game_id=message.game_id, error=error).warning(
+                f"Sending '{message.event}' to Int-Far failed, retrying in {self._get_backoff(attempts)} seconds"
+            )
+
+        return False
+
+    def deliver_due(self, now: datetime | None = None) -> int:
+        """
+        Try to send every message that is due. Returns the number of messages delivered.
+        """
+        if now is None:
+            now = datetime.now()
+
+        delivered = 0
+        for message in self.database.executor.run(self._get_due_messages, now):
+            if self._stopping:
+                break
+
+            if self._deliver(message, now):
+                delivered += 1
+
+        return delivered
+
+    def _get_wait_time(self) -> float:
+        next_attempt_at = self.database.executor.run(self._get_next_attempt_at)
+        if next_attempt_at is None:
+            return self.poll_interval
+
+        wait_time = (next_attempt_at - datetime.now()).total_seconds()
+        return min(max(wait_time, 0), self.poll_interval)
+
+    def _run(self):
+        while not self._stopping:
+            self._wakeup.clear()
+            wait_time = self.poll_interval
+            try:
+                self.deliver_due()
+                wait_time = self._get_wait_time()
+            except Exception:
+                logger.exception("Error when sending messages from the outbox")
+
+            self._wakeup.wait(wait_time)
+
+    def start(self):
+        if self._greenlet is None or self._greenlet.dead:
+            self._greenlet = gevent.spawn(self._run)
+
+    def stop(self):
+        """
+        Stop the worker. A message that is being sent is finished first, since killing
+        the worker would not stop the request and the message would be sent again.
+        """
+        if self._greenlet is not None:
+            self._stopping = True
+            self._wakeup.set()
+            self._greenlet.join()
+            self._greenlet = None
+            self._stopping = False
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "running": self._greenlet is not None and not self._greenlet.dead,
+            "pending": self.database.executor.run(self._count_pending),
+            "queued": self._queued,
+            "duplicates": self._duplicates,
+            "delivered": self._delivered,
+            "failed_attempts": self._failed_attempts,
+            "abandoned": self._abandoned,
+            "last_latency": self._last_latency,
+            "last_delivered_at": None if self._last_delivered_at is None else self._last_delivered_at.isoformat(),
+            "last_error": self._last_error,
+        }
@@ -0,0 +1,148 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+import sys
+from typing import Any, Dict, Iterable, Tuple
+
+from sqlalchemy import inspect
+
+from mhooge_flask.database import Base
+
+from jeoparty.api.config import Config
+from jeoparty.api.orm.models import QuestionPack, QuestionRound, Question
+from jeoparty.api.serializers import dump_round
+
+def _estimate_size(models: Iterable[Base]) -> int:
+    size = 0
+    for model in models:
+        size += sys.getsizeof(model) + sys.getsizeof(model.__dict__)
+        for attr in inspect(model).mapper.column_attrs:
+            size += sys.getsizeof(model.__dict__.get(attr.key))
+
+    return size
+
+def _estimate_json_size(value: Any) -> int:
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for key, item in value.items():
+            size += sys.getsizeof(key) + _estimate_json_size(item)
+    elif isinstance(value, list):
+        for item in value:
+            size += _estimate_json_size(item)
+
+    return size
+
+def build_round_json(round_data: QuestionRound) -> Dict[str, Any]:
+    """
+    Serialize a round of a question pack without any game state.
+    """
+    round_json = dump_round(round_data)
+    del round_json["round"]
+
+    return round_json
+
+@dataclass
+class PackTreeEntry:
+    pack: QuestionPack
+    questions: Dict[str, Question] = field(default_factory=dict)
+    size: int = 0
+    round_json: Dict[int, Dict[str, Any]] = field(default_factory=dict)
+
+    def __post_init__(self):
+        models = [self.pack]
+        if self.pack.theme is not None:
+            models.append(self.pack.theme)
+            models.extend(self.pack.theme.buzzer_sounds)
+
+        for round_data in self.pack.rounds:
+            models.append(round_data)
+            for category in round_data.categories:
+                models.append(category)
+                for question in category.questions:
+                    models.append(question)
+                    self.questions[question.id] = question
+
+        self.size = _estimate_size(models)
+
+    def get_round_json(self, round_num: int) -> Dict[str, Any]:
+        """
+        Get the serialized round with the given number (starting from 1) without
+        any game state. It is built once per version of the pack and shared between
+        games, so it must not be mutated. Its size is added to the size of the entry.
+        """
+        round_json = self.round_json.get(round_num)
+        if round_json is None:
+            round_json = build_round_json(self.pack.rounds[round_num - 1])
+            self.round_json[round_num] = round_json
+            self.size += _estimate_json_size(round_json)
+
+        return round_json
+
+class PackTreeCache:
+    """
+    LRU cache of fully loaded, detached question pack trees (rounds, categories,
+    questions, theme and buzzer sounds), keyed by pack id and the time the pack
+    was last changed. Cached trees are shared between games and must not be mutated.
+    """
+    def __init__(
+        self,
+        max_entries: int = Config.PACK_CACHE_MAX_ENTRIES,
+        memory_budget: int = Config.PACK_CACHE_MEMORY_BUDGET
+    ):
+        self.max_entries = max_entries
+        self.memory_budget = memory_budget
+        self._entries: OrderedDict[Tuple[str, datetime], PackTreeEntry] = OrderedDict()
+        self._size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def get(self, pack_id: str, changed_at: datetime) -> PackTreeEntry | None:
+        key = (pack_id, changed_at)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+
+        return entry
+
+    def put(self, pack: QuestionPack) -> PackTreeEntry:
+        # Older versions of the pack will never be requested again
+        self.invalidate(pack.id)
+
+        entry = PackTreeEntry(pack)
+        self._entries[(pack.id, pack.changed_at)] = entry
+        self._size += entry.size
+        self._evict()
+
+        return entry
+
+    def get_round_json(self, entry: PackTreeEntry, round_num: int) -> Dict[str, Any]:
+        """
+        Get a serialized round from the given entry, counting it towards
+        the memory budget if it had to be built.
+        """
+        size = entry.size
+        round_json = entry.get_round_json(round_num)
+        if entry.size != size and self._entries.get((entry.pack.id, entry.pack.changed_at)) is entry:
+            self._size += entry.size - size
+            self._evict()
+
+        return round_json
+
+    def _evict(self):
+        # Evict least recently used packs, but always keep the newest one
+        while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self._size > self.memory_budget):
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= evicted.size
+
+    def invalidate(self, pack_id: str):
+        for key in [key for key in self._entries if key[0] == pack_id]:
+            self._size -= self._entries.pop(key).size
+
+    def clear(self):
+        self._entries.clear()
+        self._size = 0
@@ -0,0 +1,89 @@
+from enum import Enum
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, Tuple
+
+from sqlalchemy import Enum as EnumType, inspect
+
+from mhooge_flask.database import Base
+
+from jeoparty.api.config import Config
+from jeoparty.api.orm.models import Game, GameContestant, Question, QuestionCategory, QuestionRound
+
+Serializer = Callable[[Base], Dict[str, Any]]
+
+def _enum_value(value: Enum | None):
+    return None if value is None else value.value
+
+def _get_relation_keys(model: type[Base], included_relations: Iterable | None) -> Tuple[str, ...]:
+    if included_relations is None:
+        included_relations = getattr(model, "__serialize_relationships__", [])
+
+    return tuple(relation.key for relation in included_relations)
+
+@lru_cache(maxsize=None)
+def _compile(model: type[Base], relation_keys: Tuple[str, ...], renames: Tuple[Tuple[str, str], ...]) -> Serializer:
+    mapper = inspect(model)
+    renamed = dict(renames)
+    namespace = {"_enum_value": _enum_value}
+    lines = ["def serialize(model):", "    data = {"]
+
+    for attr in mapper.column_attrs:
+        key = renamed.get(attr.key, attr.key)
+        column_type = attr.columns[0].type
+        if isinstance(column_type, EnumType) and column_type.enum_class is not None:
+            lines.append(f"        {key!r}: _enum_value(model.{attr.key}),")
+        else:
+            lines.append(f"        {key!r}: model.{attr.key},")
+
+    lines.append("    }")
+
+    # Related models are serialized with their own default relations, like dump() does
+    for index, key in enumerate(relation_keys):
+        relationship = mapper.relationships[key]
+        related_model = relationship.mapper.class_
+        namespace[f"_serialize_{index}"] = _compile(related_model, _get_relation_keys(related_model, None), ())
+
+        if relationship.uselist:
+            lines.append(f"    data[{key!r}] = [_serialize_{index}(related) for related in model.{key}]")
+        else:
+            lines.append(f"    related = model.{key}")
+            lines.append(f"    data[{key!r}] = None if related is None else _serialize_{index}(related)")
+
+    if hasattr(model, "extra_fields"):
+        lines.append("    data.update(model.extra_fields)")
+
+    lines.append("    return data")
+
+    exec("\n".join(lines), namespace)
+    serializer = namespace["serialize"]
+    serializer.__name__ = f"serialize_{model.__name__}"
+
+    return serializer
+
+def compile_serializer(model: type[Base], included_relations: Iterable | None = None, **renames: str) -> Serializer:
+    """
+    Generate a function that serializes instances of the given model like
+    `model.dump(included_relations, **renames)` does, but with the columns,
+    relationships and value conversions worked out once, instead of on every call.
+    If compiled serializers are disabled in the config, `dump()` is used as-is.
+    """
+    if not Config.COMPILED_SERIALIZERS:
+        if included_relations is not None:
+            included_relations = list(included_relations)
+
+        return lambda model_instance: model_instance.dump(included_relations=included_relations, **renames)
+
+    relation_keys = _get_relation_keys(model, included_relations)
+    return _compile(model, relation_keys, tuple(sorted(renames.items())))
+
+# Serializers for the models and relations dumped on every page load and socket event
+dump_game = compile_serializer(Game, [], id="game_id")
+dump_game_with_contestants = compile_serializer(Game, [Game.game_contestants], id="game_id")
+dump_game_with_pack_and_contestants = compile_serializer(Game, [Game.pack, Game.game_contestants], id="game_id")
+dump_game_contestant = compile_serializer(GameContestant)
+dump_game_contestant_as_user = compile_serializer(GameContestant, id="user_id")
+dump_game_contestant_only = compile_serializer(GameContestant, [])
+dump_round = compile_serializer(QuestionRound, id="round_id")
+dump_question = compile_serializer(Question)
+dump_question_with_id = compile_serializer(Question, id="question_id")
+dump_category_only = compile_serializer(QuestionCategory, [])
@@ -0,0 +1,113 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from dataclasses import dataclass, asdict, field
+from datetime import datetime
+import json
+from typing import Any, Dict, Generic, List, Tuple, TypeVar
+
+from jeoparty.api.enums import StageType, Language
+
+_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+T = TypeVar("T")
+
+def encode_cursor(timestamp: datetime, row_id: str) -> str:
+    """
+    Encode the sort key of the last row of a page as an opaque cursor.
+    """
+    data = json.dumps([timestamp.isoformat(), row_id]).encode("utf-8")
+    return urlsafe_b64encode(data).decode("ascii")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """
+    Decode a cursor created by `encode_cursor`. Raises ValueError if it is invalid.
+    """
+    try:
+        timestamp, row_id = json.loads(urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(timestamp), str(row_id)
+    except Exception as exc:
+        raise ValueError(f"Invalid cursor: {cursor}") from exc
+
+@dataclass(frozen=True)
+class SummaryPage(Generic[T]):
+    """
+    A page of summaries and the cursor for the next page, if there is one.
+    """
+    items: List[T] = field(default_factory=list)
+    next_cursor: str | None = None
+
+@dataclass(frozen=True)
+class PackSummary:
+    """
+    Lightweight row describing a question pack in listings.
+    """
+    id: str
+    name: str
+    public: bool
+    created_at: datetime
+    changed_at: datetime
+    total_questions: int
+
+    def dump(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["created_at"] = self.created_at.strftime(_DATE_FORMAT)
+        data["changed_at"] = self.changed_at.strftime(_DATE_FORMAT)
+
+        return data
+
+@dataclass(frozen=True)
+class GameSummary:
+    """
+    Lightweight row describing a game and its progress in listings.
+    `total_questions` and `used_questions` refer to the current round.
+    """
+    id: str
+    title: str
+    pack_name: str
+    stage: StageType
+    round: int
+    regular_rounds: int
+    use_powerups: bool
+    max_contestants: int
+    contestants: int
+    total_questions: int
+    used_questions: int
+    started_at: datetime
+    ended_at: datetime | None
+
+    @property
+    def question_num(self) -> int:
+        return self.used_questions + 1 if self.total_questions else 1
+
+    def dump(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["stage"] = self.stage.value
+        data["question_num"] = self.question_num
+        data["started_at"] = self.started_at.strftime(_DATE_FORMAT)
+        data["ended_at"] = None if not self.ended_at else self.ended_at.strftime(_DATE_FORMAT)
+
+        return data
+
+@dataclass(frozen=True)
+class GameLobbyView:
+    """
+    The few columns of a game needed by the contestant lobby and join pages.
+    """
+    id: str
+    join_code: str
+    stage: StageType
+    password: str | None
+    max_contestants: int
+    use_powerups: bool
+    created_by: str
+    contestants: int
+    language: Language
+    theme_id: str | None
+    theme_name: str | None
+
+    @property
+    def has_password(self) -> bool:
+        return self.password is not None
+
+    @property
+    def is_full(self) -> bool:
+        return self.contestants >= self.max_contestants
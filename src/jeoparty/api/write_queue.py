@@ -0,0 +1,83 @@
+from typing import Any, Dict, Tuple
+from weakref import WeakSet
+
+import gevent
+from gevent.lock import RLock
+from sqlalchemy import inspect
+
+from mhooge_flask.database import Base
+from mhooge_flask.logging import logger
+
+from jeoparty.api.config import Config
+from jeoparty.api.database import Database
+
+_ACTIVE_QUEUES: WeakSet["WriteBehindQueue"] = WeakSet()
+
+class WriteBehindQueue:
+    """
+    Write-behind queue for the rows of a running game. Models that are added
+    are coalesced by their primary key and their changed columns are written
+    in a single transaction, either when the flush interval has passed or
+    when the queue is flushed explicitly (e.g. at stage transitions).
+    """
+    def __init__(self, database: Database, flush_interval: float = Config.WRITE_BEHIND_INTERVAL):
+        self.database = database
+        self.flush_interval = flush_interval
+        self._pending: Dict[Tuple[type[Base], Tuple[Any, ...]], Base] = {}
+        self._flush_timer: gevent.Greenlet | None = None
+        # Writes happen off the hub, so make sure an older batch is never written after a newer one
+        self._flush_lock = RLock()
+
+        _ACTIVE_QUEUES.add(self)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, *models: Base):
+        for model in models:
+            key = (type(model), inspect(model).identity)
+            self._pending[key] = model
+
+        if self._pending and self._flush_timer is None:
+            self._flush_timer = gevent.spawn_later(self.flush_interval, self._flush_from_timer)
+
+    def flush(self):
+        if self._flush_timer is not None:
+            self._flush_timer.kill(block=False)
+            self._flush_timer = None
+
+        with self._flush_lock:
+            if not self._pending:
+                return
+
+            models = list(self._pending.values())
+            self._pending.clear()
+
+            try:
+                self.database.update_models(*models)
+            except Exception:
+                # Put the models back in the queue, unless newer versions were added
+                for model in models:
+                    self._pending.setdefault((type(model), inspect(model).identity), model)
+
+                raise
+
+    def _flush_from_timer(self):
+        self._flush_timer = None
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Error when flushing write-behind queue, retrying later")
+            if self._pending and self._flush_timer is None:
+                self._flush_timer = gevent.spawn_later(self.flush_interval, self._flush_from_timer)
+
+def flush_all_queues():
+    """
+    Write the pending changes of every queue. Used when the server shuts down,
+    so no game changes are lost.
+    """
+    for queue in list(_ACTIVE_QUEUES):
+        try:
+            queue.flush()
+        except Exception:
+            logger.exception("Error when flushing write-behind queue during shutdown")
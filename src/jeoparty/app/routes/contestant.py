@@ -1,17 +1,20 @@
-from glob import glob
 import os
 import random
 from typing import Any, Dict, Tuple
+from uuid import uuid4
 
 import flask
 from werkzeug.datastructures import FileStorage
 
 from mhooge_flask.routing import make_template_context, make_json_response
 
+from jeoparty.api.asset_manifest import asset_manifest
 from jeoparty.api.database import Database
 from jeoparty.api.enums import StageType
-from jeoparty.api.orm.models import Contestant, GameContestant
+from jeoparty.api.orm.models import Contestant
+from jeoparty.api.serializers import dump_category_only, dump_game, dump_game_contestant_as_user, dump_question
 from jeoparty.app.routes.shared import create_and_validate_model, render_locale_template, get_locale_data, is_lan_active
+from jeoparty.app.routes.socket import get_namespace_handler
 from jeoparty.api.config import get_avatar_path, get_theme_path, get_bg_image_path, get_buzz_sound_path
 
 contestant_page = flask.Blueprint("contestant", __name__, template_folder="templates")
@@ -48,35 +51,31 @@ def _get_bg_image(index: int, image: str | None = None, theme_id: str | None = N
 
         return f"{get_bg_image_path(False)}/{image}"
 
-    files = []
+    files = ()
     if theme_id:
-        files = glob(f"{get_theme_path(theme_id)}/contestant_backgrounds/*")
+        files = asset_manifest.list_files(f"{get_theme_path(theme_id, False)}/contestant_backgrounds")
 
-    if files == []:
-        files = glob(f"{get_bg_image_path()}/default/*")
+    if files == ():
+        files = asset_manifest.list_files(f"{get_bg_image_path(False)}/default")
 
-    if files == []:
+    if files == ():
         return None
 
-    files.sort()
     if index < len(files):
-        file = files[index]
-    else:
-        file = files[random.randint(0, len(files) - 1)]
+        return files[index]
 
-    return file.split("static/")[-1]
+    return files[random.randint(0, len(files) - 1)]
 
 def _get_default_avatar(index: int, theme_id: str | None):
-    files = []
+    files = ()
     if theme_id:
-        files = glob(f"{get_theme_path(theme_id)}/avatars/*")
+        files = asset_manifest.list_files(f"{get_theme_path(theme_id, False)}/avatars")
 
-    if files == []:
-        files = glob(f"{get_avatar_path()}/default/*")
+    if files == ():
+        files = asset_manifest.list_files(f"{get_avatar_path(False)}/default")
 
     if index < len(files):
-        files.sort()
-        return files[index].split("static/")[-1]
+        return files[index]
 
     return None
 
@@ -114,15 +113,15 @@ def join_lobby():
 
     contestant_model: Contestant = contestant_model_or_error
 
-    with database as session:
-        game_data = database.get_game_from_code(join_code)
+    with database:
+        game_data = database.get_game_lobby_view(join_code)
         if game_data is None:
             return flask.redirect(
                 flask.url_for(".lobby", join_code=join_code, error="Failed to join: Game does not exist", _external=True)
             )
 
-        locale = get_locale_data(game_data.pack.language, "contestant/lobby")
-        if game_data.password is not None and flask.request.form.get("password") != game_data.password:
+        locale = get_locale_data(game_data.language, "contestant/lobby")
+        if game_data.has_password and flask.request.form.get("password") != game_data.password:
             return flask.redirect(
                 flask.url_for(".lobby", join_code=join_code, error=locale["wrong_password"], _external=True)
             )
@@ -132,16 +131,17 @@ def join_lobby():
                 flask.url_for(".lobby", join_code=join_code, error=locale["game_over"], _external=True)
             )
 
-        # Ensure no race conditions can occur when contestants join
-        with flask.current_app.config["JOIN_LOCK"]:
-            session.refresh(game_data)
-
-            index = len(game_data.game_contestants)
-            if index == game_data.max_contestants:
+        # Joins to the same game are serialized, so contestants get distinct default avatars
+        with flask.current_app.config["JOIN_LOCKS"].lock(game_data.id):
+            # The cached view may be a few seconds old, so count the contestants again
+            game_data = database.get_game_lobby_view(join_code, use_cache=False)
+            if game_data is None:
                 return flask.redirect(
-                    flask.url_for(".lobby", join_code=join_code, error=locale["lobby_full"], _external=True)
+                    flask.url_for(".lobby", join_code=join_code, error="Failed to join: Game does not exist", _external=True)
                 )
 
+            index = game_data.contestants
+
             # Try to get existitng user
             existing_model = None if user_id is None else database.get_contestant_from_id(user_id)
 
@@ -154,48 +154,45 @@ def join_lobby():
 
                 contestant_model = existing_model
 
-                for contestant in game_data.game_contestants:
-                    if contestant.contestant_id == user_id:
+                for game_contestant in existing_model.game_contestants:
+                    if game_contestant.game_id == game_data.id:
                         user_already_joined = True
                         break
 
+            if not user_already_joined and game_data.is_full:
+                return flask.redirect(
+                    flask.url_for(".lobby", join_code=join_code, error=locale["lobby_full"], _external=True)
+                )
+
             # Get or set background image
-            bg_image = _get_bg_image(index, flask.request.form.get("bg_image"), game_data.pack.theme_id)
+            bg_image = _get_bg_image(index, flask.request.form.get("bg_image"), game_data.theme_id)
             contestant_model.bg_image = bg_image
 
             # Set buzz sound, if given
             buzz_sound = flask.request.form.get("buzz_sound")
             if buzz_sound is not None:
-                contestant_model.buzz_sound = f"{get_buzz_sound_path(game_data.pack.theme_id, False)}/{buzz_sound}"
+                contestant_model.buzz_sound = f"{get_buzz_sound_path(game_data.theme_id, False)}/{buzz_sound}"
 
-            # We need the ID of the user to use in the filename of their avatar,
-            # so we have to save the contestant twice
-            session.add(contestant_model)
-            session.flush()
-            session.refresh(contestant_model)
+            # The ID of the user is used in the filename of their avatar, so create it up front
+            if contestant_model.id is None:
+                contestant_model.id = str(uuid4())
 
             # Update or save contestant avatar
             new_avatar = None
             if "default_avatar" not in flask.request.form and "avatar" in flask.request.files and flask.request.files["avatar"].filename:
-                print("Yep")
                 new_avatar = _save_contestant_avatar(flask.request.files["avatar"], contestant_model.id)
             elif existing_model is None or existing_model.avatar is None:
-                print("Yep 2")
-                new_avatar = _get_default_avatar(index, game_data.pack.theme_id)
-
-            print(new_avatar)
+                new_avatar = _get_default_avatar(index, game_data.theme_id)
 
             if new_avatar is not None:
                 contestant_model.avatar = new_avatar
-                database.save_models(contestant_model)
 
-            if not user_already_joined:
-                # If user isn't already in the game, add them
-                game_contestant_model = GameContestant(
-                    game_id=game_data.id,
-                    contestant_id=contestant_model.id
+            # Save the contestant and add them to the game in one transaction,
+            # the capacity of the game is checked again when they are added
+            if not database.join_game(contestant_model, game_data.id, game_data.use_powerups):
+                return flask.redirect(
+                    flask.url_for(".lobby", join_code=join_code, error=locale["lobby_full"], _external=True)
                 )
-                database.add_contestant_to_game(game_contestant_model, game_data.use_powerups)
 
         # Save user ID to cookie and redirect to game view
         cookie_id, data, max_age = _save_user_id_to_cookie(contestant_model.id)
@@ -211,8 +208,13 @@ def game_view(game_id: str):
 
     database: Database = flask.current_app.config["DATABASE"]
 
+    # Write pending changes from socket events before loading the game
+    namespace_handler = get_namespace_handler(game_id)
+    if namespace_handler is not None:
+        namespace_handler.flush()
+
     with database:
-        game_data = database.get_game_from_id(game_id)
+        game_data = database.get_game_state(game_id)
         if game_data is None:
             return make_template_context("contestant/nogame.html", status=404)
 
@@ -229,8 +231,8 @@ def game_view(game_id: str):
         # Get question data
         game_question = game_data.get_active_question()
         if game_question is not None:
-            question = game_question.question.dump() 
-            question["category"] = game_question.question.category.dump(included_relations=[])
+            question = dump_question(game_question.question)
+            question["category"] = dump_category_only(game_question.question.category)
             question["daily_double"] = game_question.daily_double
         else:
             question = None
@@ -241,9 +243,9 @@ def game_view(game_id: str):
         start_of_round = questions != [] and not game_data.get_active_question() and not any(question.used for question in questions)
         start_of_game = start_of_round and game_data.round == 1 and game_data.get_contestant_with_turn() is None
 
-        game_json = game_data.dump(included_relations=[], id="game_id")
+        game_json = dump_game(game_data)
 
-        game_contestant_json = contestant_data.dump(id="user_id")
+        game_contestant_json = dump_game_contestant_as_user(contestant_data)
 
         # If game is ended, save whether this contestant won
         if game_data.stage == StageType.ENDED:
@@ -276,7 +278,7 @@ def lobby(join_code: str):
     user_data = {}
 
     with database:
-        game_data = database.get_game_from_code(join_code)
+        game_data = database.get_game_lobby_view(join_code)
         if game_data is None:
             return make_template_context("contestant/nogame.html", status=404)
         
@@ -301,10 +303,10 @@ def lobby(join_code: str):
 
     return render_locale_template(
         "contestant/lobby.html",
-        game_data.pack.language,
+        game_data.language,
         **user_data,
         join_code=join_code,
-        has_password=game_data.password is not None,
+        has_password=game_data.has_password,
         error=error,
     )
 
@@ -342,8 +344,8 @@ def lobby_lan(join_code: str):
         347489125877809155: "buzz_no.mp3",
     }
 
-    with database as session:
-        game_data = database.get_game_from_code(join_code)
+    with database:
+        game_data = database.get_game_lobby_view(join_code)
         if game_data is None:
             return make_template_context("contestant/nogame.html", status=404)
 
@@ -361,21 +363,20 @@ def lobby_lan(join_code: str):
                 avatar=avatars[user_id],
             )
 
-            session.add(contestant)
-            session.commit()
+            database.save_models(contestant)
 
         if not user_id in names:
             return flask.abort(404)
 
         template = render_locale_template(
             "contestant/lobby.html",
-            game_data.pack.language,
+            game_data.language,
             name=names[user_id],
             avatar=avatars[user_id],
             buzz_sound=buzz_in_sounds[user_id],
             bg_image=backgrounds[user_id],
             join_code=join_code,
-            has_password=game_data.password is not None,
+            has_password=game_data.has_password,
         )
 
     response = flask.make_response(template)
@@ -1,9 +1,7 @@
 import json
 import os
-from time import sleep
 from typing import Any, Dict
 from pydantic import ValidationError
-import requests
 
 import flask
 from werkzeug.datastructures import FileStorage
@@ -12,10 +10,12 @@ from mhooge_flask.auth import get_user_details
 from mhooge_flask.routing import make_template_context, make_text_response, make_json_response
 from mhooge_flask.logging import logger
 
+from jeoparty.api.asset_manifest import asset_manifest
 from jeoparty.api.database import Database
-from jeoparty.api.config import Config, get_question_pack_data_path
+from jeoparty.api.media_proxy import MediaFetchError, media_proxy
+from jeoparty.api.config import Config, get_question_pack_data_path, get_theme_path
 from jeoparty.api.orm.models import *
-from jeoparty.api.enums import StageType
+from jeoparty.api.enums import StageType, Language
 from jeoparty.app.routes.shared import (
     redirect_to_login,
     validate_file,
@@ -41,6 +41,69 @@ _VALID_VIDEO_FILETYPES = [
 
 dashboard_page = flask.Blueprint("dashboard", __name__, template_folder="templates")
 
+def _get_listing_filters(args) -> Dict[str, Any]:
+    """
+    Parse the filters for the pack and game listings from the query string.
+    Raises ValueError if any of them are invalid.
+    """
+    public = args.get("public") or None
+    if public is not None:
+        public = public == "1"
+
+    language = args.get("language") or None
+    stage = args.get("stage") or None
+
+    return {
+        "stage": None if stage is None else StageType(stage),
+        "language": None if language is None else Language(language),
+        "theme_id": args.get("theme_id") or None,
+        "public": public,
+    }
+
+def _get_pack_summaries_page(database: Database, user_id: str, args, include_public: bool = False):
+    filters = _get_listing_filters(args)
+
+    return database.get_pack_summaries_for_user(
+        user_id,
+        include_public=include_public,
+        public=filters["public"],
+        language=filters["language"],
+        theme_id=filters["theme_id"],
+        cursor=args.get("cursor") or None,
+    )
+
+def _get_game_summaries_page(database: Database, user_id: str, args):
+    filters = _get_listing_filters(args)
+
+    return database.get_game_summaries_for_user(
+        user_id,
+        stage=filters["stage"],
+        public=filters["public"],
+        language=filters["language"],
+        theme_id=filters["theme_id"],
+        cursor=args.get("cursor") or None,
+    )
+
+def _get_games_json(game_summaries):
+    games_json = []
+    for game_summary in game_summaries:
+        json_data = game_summary.dump()
+        if game_summary.stage is not StageType.ENDED:
+            if game_summary.stage is StageType.FINALE_WAGER:
+                url_suffix = "selection"
+            elif game_summary.stage is StageType.FINALE_QUESTION:
+                url_suffix = "question"
+            elif game_summary.stage is StageType.FINALE_RESULT:
+                url_suffix = "finale"
+            else:
+                url_suffix = game_summary.stage.value
+
+            json_data["url"] = flask.url_for(f"presenter.{url_suffix}", game_id=game_summary.id)
+
+        games_json.append(json_data)
+
+    return games_json
+
 @dashboard_page.route("/")
 def home():
     user_details = get_user_details()
@@ -50,47 +113,73 @@ def home():
     database: Database = flask.current_app.config["DATABASE"]
     user_id, user_name = user_details
 
-    with database:
-        question_data = database.get_question_packs_for_user(user_id)
-        questions_json = []
-        for question_pack in question_data:
-            total_questions = 0
-            for round in question_pack.rounds:
-                for category in round.categories:
-                    total_questions += len(category.questions)
-
-            json_data = question_pack.dump()
-            json_data["total_questions"] = total_questions
-            questions_json.append(json_data)
-
-        games = database.get_games_for_user(user_id)
-
-        games_json = []
-        for game_data in games:
-            json_data = game_data.dump()
-            json_data["total_questions"] = len(game_data.get_questions_for_round())
-            if game_data.stage is not StageType.ENDED:
-                if game_data.stage is StageType.FINALE_WAGER:
-                    url_suffix = "selection"
-                elif game_data.stage is StageType.FINALE_QUESTION:
-                    url_suffix = "question"
-                elif game_data.stage is StageType.FINALE_RESULT:
-                    url_suffix = "finale"
-                else:
-                    url_suffix = game_data.stage.value
-
-                json_data["url"] = flask.url_for(f"presenter.{url_suffix}", game_id=game_data.id)
-
-            games_json.append(json_data)
+    try:
+        pack_page = _get_pack_summaries_page(database, user_id, flask.request.args)
+        game_page = _get_game_summaries_page(database, user_id, flask.request.args)
+    except ValueError:
+        return flask.redirect(flask.url_for(".home", _external=True))
 
     return make_template_context(
         "dashboard/home.html",
         user_id=user_id,
         user_name=user_name,
-        questions=questions_json,
-        games=games_json,
+        questions=[pack_summary.dump() for pack_summary in pack_page.items],
+        questions_cursor=pack_page.next_cursor,
+        games=_get_games_json(game_page.items),
+        games_cursor=game_page.next_cursor,
+        filters={key: flask.request.args.get(key) for key in ("stage", "language", "theme_id", "public")},
+        stages=[stage.value for stage in StageType],
+        languages=[language.value for language in Language],
+        themes=[
+            {"id": theme.id, "name": theme.name}
+            for theme in database.get_themes_for_user(user_id, include_public=True)
+        ],
+    )
+
+@dashboard_page.route("/games/page")
+def games_page():
+    user_details = get_user_details()
+    if user_details is None:
+        return make_json_response("You are not logged in!", 401)
+
+    database: Database = flask.current_app.config["DATABASE"]
+    user_id = user_details[0]
+
+    try:
+        game_page = _get_game_summaries_page(database, user_id, flask.request.args)
+    except ValueError:
+        return make_json_response("Invalid filters or cursor", 400)
+
+    html = flask.render_template("dashboard/game_entries.html", games=_get_games_json(game_page.items))
+
+    return make_json_response({"html": html, "cursor": game_page.next_cursor}, 200)
+
+@dashboard_page.route("/packs/page")
+def packs_page():
+    user_details = get_user_details()
+    if user_details is None:
+        return make_json_response("You are not logged in!", 401)
+
+    database: Database = flask.current_app.config["DATABASE"]
+    user_id = user_details[0]
+
+    include_public = flask.request.args.get("include_public") == "1"
+    view = flask.request.args.get("view", "entries")
+    if view not in ("entries", "options"):
+        return make_json_response(f"Invalid view: {view}", 400)
+
+    try:
+        pack_page = _get_pack_summaries_page(database, user_id, flask.request.args, include_public)
+    except ValueError:
+        return make_json_response("Invalid filters or cursor", 400)
+
+    html = flask.render_template(
+        f"dashboard/pack_{view}.html",
+        questions=[pack_summary.dump() for pack_summary in pack_page.items],
     )
 
+    return make_json_response({"html": html, "cursor": pack_page.next_cursor}, 200)
+
 @dashboard_page.route("/create_pack", methods=["GET", "POST"])
 def create_pack():
     user_details = get_user_details()
@@ -189,9 +278,7 @@ def create_game():
 
         return flask.redirect(flask.url_for("presenter.lobby", game_id=game_model_or_error.id, _external=True))
 
-    with database:
-        questions = database.get_question_packs_for_user(user_id, include_public=True)
-        questions_json = [question_pack.dump(included_relations=[]) for question_pack in questions]
+    pack_page = database.get_pack_summaries_for_user(user_id, include_public=True)
 
     error = flask.request.args.get("error")
 
@@ -199,7 +286,8 @@ def create_game():
         "dashboard/create_game.html",
         user_name=user_name,
         user_id=user_id,
-        questions=questions_json,
+        questions=[pack_summary.dump() for pack_summary in pack_page.items],
+        questions_cursor=pack_page.next_cursor,
         error=error,
     )
 
@@ -223,6 +311,38 @@ def delete_game(game_id: str):
 
     return make_json_response("Game was successfully deleted", 200)
 
+@dashboard_page.route("/backup/status")
+def backup_status():
+    user_details = get_user_details()
+    if user_details is None or user_details[0] != Config.ADMIN_ID:
+        return make_json_response("You are not authorized to view backup status", 401)
+
+    database: Database = flask.current_app.config["DATABASE"]
+
+    return make_json_response(database.get_backup_status(), 200)
+
+@dashboard_page.route("/outbox/status")
+def outbox_status():
+    user_details = get_user_details()
+    if user_details is None or user_details[0] != Config.ADMIN_ID:
+        return make_json_response("You are not authorized to view outbox status", 401)
+
+    database: Database = flask.current_app.config["DATABASE"]
+
+    return make_json_response(database.get_outbox_status(), 200)
+
+@dashboard_page.route("/assets/reload", methods=["POST"])
+def reload_assets():
+    user_details = get_user_details()
+    if user_details is None or user_details[0] != Config.ADMIN_ID:
+        return make_json_response("You are not authorized to reload assets", 401)
+
+    # Reload the assets of a single theme, if given, otherwise everything
+    theme_id = flask.request.form.get("theme_id")
+    asset_manifest.reload(None if theme_id is None else get_theme_path(theme_id, False))
+
+    return make_json_response("Assets were reloaded", 200)
+
 @dashboard_page.route("/pack/fetch")
 def fetch_resource():
     user_details = get_user_details()
@@ -233,34 +353,13 @@ def fetch_resource():
     if url is None:
         return make_text_response("URL not specified, nothing to fetch", 404)
 
-    # First try to do an 'options' request to just get content-type header
-    content_type = None
+    # Stream the file through (or from the cache) with its type sniffed from the first bytes
     try:
-        response = requests.options(url)
-        status = response.status_code
-    except requests.exceptions.RequestException:
-        status = 500
-
-    all_valid_types = _VALID_IMAGE_FILETYPES + _VALID_VIDEO_FILETYPES
-
-    if 200 <= status < 300:
-        content_type = response.headers.get("Content-Type")
-
-    if content_type is None or content_type not in all_valid_types:
-        # If content-type was valid or 'options' request failed, get the full file
-        sleep(0.5)
-
-        response = requests.get(url)
-
-        if response.status_code != 200:
-            # If response is invalid, return error
-            return make_text_response("Could not fetch resources", response.status_code)
-
-        content_type = response.headers.get("Content-Type")
-        if content_type not in all_valid_types:
-            return make_text_response("Invalid file type to fetch", 400)
+        content_type, chunks = media_proxy.fetch(url, _VALID_IMAGE_FILETYPES + _VALID_VIDEO_FILETYPES)
+    except MediaFetchError as exc:
+        return make_text_response(exc.message, exc.status)
 
-    return flask.Response(response.content, 200, headers={"Content-Type": content_type}, mimetype=content_type)
+    return flask.Response(chunks, 200, mimetype=content_type)
 
 def _save_pack_media_file(pack_id: str, data: Dict[str, Any], file_key: str, files: Dict[str, FileStorage]) -> str | None:
     file_name = data.get(file_key)
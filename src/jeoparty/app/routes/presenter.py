@@ -1,17 +1,24 @@
 import random
 
 import flask
-from flask import json
 from mhooge_flask.auth import get_user_details
 from mhooge_flask.logging import logger
-from mhooge_flask.routing import socket_io
 import requests
 
-from jeoparty.api.database import Database
+from jeoparty.api.database import Database, UnitOfWork
 from jeoparty.api.config import Config, Environment
 from jeoparty.api.enums import StageType
+from jeoparty.api.game_plan import generate_game_plan
+from jeoparty.api.outbox import get_intfar_credentials
 from jeoparty.api.orm.models import Game, GameQuestion
-from jeoparty.app.routes.socket import GameSocketHandler, get_namespace_handler
+from jeoparty.api.serializers import (
+    dump_category_only,
+    dump_game_contestant,
+    dump_game_with_contestants,
+    dump_game_with_pack_and_contestants,
+    dump_question_with_id,
+)
+from jeoparty.app.routes.socket import GameSocketHandler, get_namespace_handler, register_namespace_handler
 from jeoparty.app.routes.shared import (
     redirect_to_login,
     render_locale_template,
@@ -34,6 +41,9 @@ def _request_decorator(func):
 
         # Setup socket namespace for the given game
         namespace_handler = get_namespace_handler(game_id)
+        if namespace_handler is not None:
+            # Write pending changes from socket events before loading the game
+            namespace_handler.flush()
 
         database: Database = flask.current_app.config["DATABASE"]
         with database:
@@ -41,8 +51,9 @@ def _request_decorator(func):
             if (user_details := get_user_details()) is None:
                 return redirect_to_login(f"presenter.{func.__name__}", game_id=game_id)
 
-            # Retrieve the game data for the given game ID or abort if it is missing
-            game_data = database.get_game_from_id(game_id)
+            # Retrieve the game data for the given game ID or abort if it is missing.
+            # The game is loaded off the hub and detached, routes write it back with save_game
+            game_data = database.get_game_state(game_id)
             if game_data is None:
                 return flask.abort(404)
 
@@ -50,12 +61,18 @@ def _request_decorator(func):
             if user_details[0] != game_data.created_by:
                 return flask.abort(401)
 
+            # Inject game data to the route handler
+            response = func(game_data=game_data, *args, **kwargs)
+
+            # The route might have changed the game, so the socket handler
+            # is (re)loaded from the database after the route is done
             if namespace_handler is None:
                 namespace_handler = GameSocketHandler(game_data.id, database)
-                socket_io.on_namespace(namespace_handler)
+                register_namespace_handler(namespace_handler)
+            else:
+                namespace_handler.resync()
 
-            # Inject game data to the route handler
-            return func(game_data=game_data, *args, **kwargs)
+            return response
 
     wrapper.__setattr__("__name__", func.__name__)
 
@@ -68,14 +85,51 @@ def _get_intfar_request_params():
         else "https://mhooge.com:5000"
     )
 
-    with open(f"{Config.STATIC_FOLDER}/secret.json", "r", encoding="utf-8") as fp:
-        data = json.load(fp)
-        admin_id = data["intfar_disc_id"]
-        token = data["intfar_user_id"]
+    return base_url, get_intfar_credentials()
+
+def _get_round_board(game_data: Game, round_json: dict):
+    """
+    Overlay the state of the game questions on the shared round JSON,
+    copying only the category and question dicts that are changed.
+    """
+    categories = []
+    for category_json in round_json["categories"]:
+        questions = []
+        for question_json in category_json["questions"]:
+            game_question = game_data.get_question(question_json["id"])
+            if game_question is not None:
+                question_json = {
+                    **question_json,
+                    "active": game_question.active,
+                    "used": game_question.used,
+                    "daily_double": game_question.daily_double,
+                }
+
+            questions.append(question_json)
 
-    request_json = {"disc_id": admin_id, "token": token}
+        categories.append({**category_json, "questions": questions})
 
-    return base_url, request_json
+    return {**round_json, "categories": categories}
+
+def _place_missing_daily_doubles(game_data: Game, questions: list[GameQuestion], unit_of_work: UnitOfWork):
+    """
+    Place the daily doubles of the current round if it has none. Games created
+    before daily doubles were placed up front only have them in the rounds
+    that were already played.
+    """
+    if not game_data.use_daily_doubles or any(question.daily_double for question in questions):
+        return
+
+    game_plan = generate_game_plan(
+        [(question.question_id, game_data.round) for question in questions],
+        game_data.regular_rounds,
+        game_data.use_daily_doubles,
+    )
+
+    for question in questions:
+        if question.question_id in game_plan.daily_doubles:
+            question.daily_double = True
+            unit_of_work.save(question)
 
 @presenter_page.route("/<game_id>")
 @_request_decorator
@@ -105,7 +159,7 @@ def lobby(game_data: Game):
         except (requests.RequestException, requests.Timeout):
             logger.exception("Failed sending start of game request to Int-Far!")
 
-    game_json = game_data.dump(included_relations=[Game.pack, Game.game_contestants], id="game_id")
+    game_json = dump_game_with_pack_and_contestants(game_data)
 
     return render_locale_template(
         "presenter/lobby.html",
@@ -125,8 +179,8 @@ def question(game_data: Game):
         # If question does not exist or has already been answered, redirect back to selection
         return flask.redirect(flask.url_for(".selection", game_id=game_data.id))
 
-    question_json = game_question.question.dump(id="question_id")
-    question_json["category"] = game_question.question.category.dump(included_relations=[])
+    question_json = dump_question_with_id(game_question.question)
+    question_json["category"] = dump_category_only(game_question.question.category)
     question_json["daily_double"] = game_question.daily_double
 
     # Data used as variables in JS for controlling presenter UI flow
@@ -140,7 +194,8 @@ def question(game_data: Game):
 
     # If question is multiple-choice, randomize order of choices
     if "choices" in question_json["extra"]:
-        random.shuffle(question_json["extra"]["choices"])
+        choices = question_json["extra"]["choices"]
+        question_json["extra"]["choices"] = random.sample(choices, k=len(choices))
 
     # Set stage to 'question' or 'finale_question'
     game_data.stage = StageType.FINALE_QUESTION if game_data.stage == StageType.FINALE_WAGER else StageType.QUESTION
@@ -159,7 +214,7 @@ def question(game_data: Game):
     correct_sound, wrong_sounds = get_question_answer_sounds(game_data.pack.theme, game_data.max_contestants)
 
     round_name = game_data.pack.rounds[game_data.round - 1].name
-    game_json = game_data.dump(included_relations=[Game.pack, Game.game_contestants], id="game_id")
+    game_json = dump_game_with_pack_and_contestants(game_data)
 
     return render_locale_template(
         "presenter/question.html",
@@ -180,12 +235,15 @@ def question(game_data: Game):
 def selection(game_data: Game):
     database: Database = flask.current_app.config["DATABASE"]
 
+    # All changes to the game are written in one transaction when the page is rendered
+    unit_of_work = database.unit_of_work()
+
     # Get currently active question (if any) and mark it as inactive and used
     previous_question = game_data.get_active_question()
     if previous_question:
         previous_question.used = True
         previous_question.active = False
-        database.save_models(previous_question)
+        unit_of_work.save(previous_question)
 
     # Set game stage to 'selection'
     game_data.stage = StageType.SELECTION
@@ -203,6 +261,7 @@ def selection(game_data: Game):
         if game_data.round > game_data.regular_rounds:
             if not game_data.pack.include_finale:
                 # No finale, so game is over. Redirect directly to endscreen
+                unit_of_work.commit()
                 return flask.redirect(flask.url_for(".endscreen", game_id=game_data.id))
 
             is_finale = True
@@ -234,43 +293,18 @@ def selection(game_data: Game):
 
     start_of_game = start_of_round and game_data.round == 1 and game_data.get_contestant_with_turn() is None
     if (start_of_round or end_of_round) and not is_finale:
-        # If it's the first question of a new round, select random questions to be daily doubles
-        if game_data.use_daily_doubles:
-            questions_copy = list(questions)
-            random.shuffle(questions_copy)
-
-            round_zero = game_data.round - 1
-            dailies_in_round = (game_data.regular_rounds + 1) - (game_data.regular_rounds - round_zero)
-
-            for index, game_question in enumerate(questions_copy):
-                game_question.daily_double = index < dailies_in_round
+        # Daily doubles are placed when the game is created, so only used power-ups are reset for a new round
+        database.reset_power_ups(game_data, unit_of_work)
+        _place_missing_daily_doubles(game_data, questions, unit_of_work)
 
-            database.save_models(*questions_copy)
-
-        # Reset used power-ups
-        for contestant in game_data.game_contestants:
-            if contestant.power_ups:
-                for power_up in contestant.power_ups:
-                    power_up.used = False
-
-                database.save_models(*contestant.power_ups)
-
-    round_data = game_data.pack.rounds[game_data.round - 1]
-    round_json = round_data.dump(id="round_id")
-    del round_json["round"]
+    database.save_game(game_data, unit_of_work)
+    unit_of_work.commit()
 
     # Merge data about game questions and actual questions
-    for category_json in round_json["categories"]:
-        for question_json in category_json["questions"]:
-            for game_question in questions:
-                if game_question.question_id == question_json["id"]:
-                    question_json["active"] = game_question.active
-                    question_json["used"] = game_question.used
-                    question_json["daily_double"] = game_question.daily_double
-
-    game_json = game_data.dump(included_relations=[Game.game_contestants], id="game_id")
+    round_data = game_data.pack.rounds[game_data.round - 1]
+    round_json = _get_round_board(game_data, database.get_round_json(game_data))
 
-    database.save_game(game_data)
+    game_json = dump_game_with_contestants(game_data)
 
     return render_locale_template(
         "presenter/selection.html",
@@ -287,14 +321,15 @@ def finale(game_data: Game):
     database: Database = flask.current_app.config["DATABASE"]
 
     active_question = game_data.get_active_question().question
-    question_json = active_question.dump(id="question_id")
-    question_json["category"] = active_question.category.dump(included_relations=[])
+    question_json = dump_question_with_id(active_question)
+    question_json["category"] = dump_category_only(active_question.category)
     game_data.stage = StageType.FINALE_RESULT
 
-    database.save_game(game_data)
+    with database.unit_of_work() as unit_of_work:
+        database.save_game(game_data, unit_of_work)
 
     # Get game JSON data with nested contestant data
-    game_json = game_data.dump(included_relations=[Game.game_contestants], id="game_id")
+    game_json = dump_game_with_contestants(game_data)
     locale_data = flask.current_app.config["LOCALES"].get(game_data.pack.language.value)
     page_locale = locale_data["pages"]["presenter/finale"]
 
@@ -318,7 +353,8 @@ def endscreen(game_data: Game):
     database: Database = flask.current_app.config["DATABASE"]
     game_data.stage = StageType.ENDED
 
-    database.save_game(game_data)
+    with database.unit_of_work() as unit_of_work:
+        database.save_game(game_data, unit_of_work)
 
     locale_data = flask.current_app.config["LOCALES"].get(game_data.pack.language.value)
     page_locale = locale_data["pages"]["presenter/endscreen"]
@@ -348,25 +384,21 @@ def endscreen(game_data: Game):
             f"{players_tied} {page_locale['winner_flavor_3']}"
         )
 
-    winners_json = [winner.dump() for winner in winners]
+    winners_json = [dump_game_contestant(winner) for winner in winners]
     logger.bind(event="jeopardy_player_data", player_data=winners_json).info(f"Jeopardy player data at endscreen: {winners_json}")
 
-    game_json = game_data.dump(included_relations=[Game.game_contestants], id="game_id")
+    game_json = dump_game_with_contestants(game_data)
     game_json["game_contestants"].sort(key=lambda c: (-c["score"], c["contestant"]["name"]))
 
-    # Send post request to Int-Far if LAN is active
+    # Queue an update to Int-Far if LAN is active, which is sent in the background
     if is_lan_active(game_data):
-        print("Sending update to Int-Far")
-        base_url, request_json = _get_intfar_request_params()
-
-        request_json["player_data"] = game_json["game_contestants"]
-
-        try:
-            response = requests.post(f"{base_url}/intfar/lan/jeopardy_winner", json=request_json, timeout=8)
-            if response.status_code != 200:
-                logger.bind(response=response.text, status=response.status_code).error(f"End of game request to Int-Far failed with status {response.status_code}")
-        except (requests.RequestException, requests.Timeout):
-            logger.exception("Failed sending end of game request to Int-Far!")
+        base_url, _ = _get_intfar_request_params()
+        database.queue_outbox_message(
+            game_data.id,
+            "jeopardy_winner",
+            f"{base_url}/intfar/lan/jeopardy_winner",
+            {"player_data": game_json["game_contestants"]},
+        )
 
     return render_locale_template(
         "presenter/endscreen.html",
@@ -1,4 +1,3 @@
-from glob import glob
 import os
 import random
 import traceback
@@ -16,16 +15,19 @@ import flask
 from mhooge_flask.routing import make_template_context
 from mhooge_flask.database import Base
 
+from jeoparty.api.asset_manifest import asset_manifest
 from jeoparty.api.config import Config, get_theme_path
 from jeoparty.api.enums import Language
 from jeoparty.api.orm.models import Game, Theme
+from jeoparty.api.summaries import GameLobbyView
 
-def is_lan_active(game_data: Game):
-    return (
-        game_data.pack.theme is not None
-        and game_data.pack.theme.name == "LAN"
-        and game_data.created_by == Config.ADMIN_ID
-    )
+def is_lan_active(game_data: Game | GameLobbyView):
+    if isinstance(game_data, GameLobbyView):
+        theme_name = game_data.theme_name
+    else:
+        theme_name = None if game_data.pack.theme is None else game_data.pack.theme.name
+
+    return theme_name == "LAN" and game_data.created_by == Config.ADMIN_ID
 
 def redirect_to_login(endpoint: str, **params):
     return flask.redirect(flask.url_for("login.login", redirect_page=endpoint, **params, _external=True))
@@ -106,17 +108,17 @@ def get_question_answer_images(theme: Theme):
     default_wrong = "img/error.png"
 
     if theme:
-        correct_images = glob(f"{get_theme_path(theme.id)}/correct_icons/*")
-        wrong_images = glob(f"{get_theme_path(theme.id)}/wrong_icons/*")
-        if correct_images == []:
+        correct_images = asset_manifest.list_files(f"{get_theme_path(theme.id, False)}/correct_icons")
+        wrong_images = asset_manifest.list_files(f"{get_theme_path(theme.id, False)}/wrong_icons")
+        if correct_images == ():
             correct_image = default_correct
         else:
-            correct_image = random.choice(correct_images).split("static/")[1]
+            correct_image = random.choice(correct_images)
 
-        if wrong_images == []:
+        if wrong_images == ():
             wrong_image = default_wrong
         else:
-            wrong_image = random.choice(wrong_images).split("static/")[1]
+            wrong_image = random.choice(wrong_images)
     else:
         correct_image = default_correct
         wrong_image = default_wrong
@@ -1,27 +1,41 @@
 import json
+import sys
 from multiprocessing import Lock
-from time import sleep, time
+from time import time
 from typing import Dict, List, Callable
 from dataclasses import dataclass, field
 
 import flask
 from flask_socketio import Namespace
+import gevent
+from gevent.event import Event
 
+from mhooge_flask.database import Base
 from mhooge_flask.routing import socket_io
 from mhooge_flask.logging import logger
 
+from jeoparty.api.config import Config
 from jeoparty.api.database import Database
-from jeoparty.api.enums import PowerUpType
+from jeoparty.api.enums import PowerUpType, StageType
+from jeoparty.api.write_queue import WriteBehindQueue
 from jeoparty.api.orm.models import Game
+from jeoparty.api.serializers import dump_game_contestant_only
 
 _PING_SAMPLES = 10
+_MIN_BUZZ_WINDOW = 0.01
+_MAX_BUZZ_WINDOW = 1
+_SETUP_TIMEOUT = 20
 
 @dataclass
 class GameMetadata:
     question_asked_time: float = field(default=0, init=False)
     buzz_winner_decided: bool = field(default=False, init=False)
     power_use_decided: Dict[str, PowerUpType | str | None] | None = field(default=None, init=False)
-    setup_complete: bool | None = field(default=None, init=False)
+    setup_complete: Event = field(default_factory=Event, init=False)
+
+    def __post_init__(self):
+        # Contestants only have to wait for setup once a presenter has joined
+        self.setup_complete.set()
 
 @dataclass
 class ContestantMetadata:
@@ -48,10 +62,8 @@ def _presenter_event(func):
         if not "presenter" in instance.rooms(flask.request.sid):
             raise RuntimeError(f"User does not have permission to emit event '{func.__name__}'")
 
-        # Fetch fresh copy of game data
-        with instance.database:
-           instance.game_data = instance.database.get_game_from_id(instance.game_id)
-           return func(*args, **kwargs)
+        instance.last_active = time()
+        return func(*args, **kwargs)
 
     return wrapper
 
@@ -61,10 +73,8 @@ def _contestants_event(func):
         if not "contestants" in instance.rooms(flask.request.sid):
             raise RuntimeError(f"User does not have permission to emit event '{func.__name__}'")
 
-        # Fetch fresh copy of game data
-        with instance.database:
-           instance.game_data = instance.database.get_game_from_id(instance.game_id)
-           return func(*args, **kwargs)
+        instance.last_active = time()
+        return func(*args, **kwargs)
 
     return wrapper
 
@@ -73,11 +83,37 @@ class GameSocketHandler(Namespace):
         super().__init__(f"/{game_id}")
         self.game_id = game_id
         self.database = database
-        self.game_data: Game | None = None
         self.game_metadata = GameMetadata()
         self.contestant_metadata: Dict[str, ContestantMetadata] = {}
         self.buzz_lock = Lock()
         self.power_lock = Lock()
+        self._buzz_window: gevent.Greenlet | None = None
+        self.last_active = time()
+
+        # Authoritative in-memory state of the game. Socket events mutate this
+        # directly and queue the changed rows to be written in the background,
+        # it is only reloaded from the database when explicitly resynced
+        self.game_data: Game | None = None
+        self.write_queue = WriteBehindQueue(database)
+        self.resync()
+
+    def resync(self):
+        """
+        Reload the game state from the database. Should be called whenever
+        the game has been changed outside of this handler, e.g. by a route.
+        """
+        self.flush()
+        self.game_data = self.database.get_game_state(self.game_id)
+
+    def save_models(self, *models: Base):
+        self.write_queue.add(*models)
+
+    def flush(self):
+        """
+        Write all pending changes to the database. Should be called before
+        the game is loaded from the database somewhere else, e.g. by a route.
+        """
+        self.write_queue.flush()
 
     def emit(
         self,
@@ -103,78 +139,67 @@ class GameSocketHandler(Namespace):
         )
 
     def on_presenter_join(self, user_id: str):
-        with self.database:
-            game_data = self.database.get_game_from_id(self.game_id)
-
-            if game_data.created_by != user_id:
-                logger.warning(
-                    f"User '{user_id}' tried to join 'presenter' room, "
-                    f"but is not the creator of the game with ID '{self.game_id}'."
-                )
-                return
+        if self.game_data.created_by != user_id:
+            logger.warning(
+                f"User '{user_id}' tried to join 'presenter' room, "
+                f"but is not the creator of the game with ID '{self.game_id}'."
+            )
+            return
 
-            self.enter_room(flask.request.sid, "presenter")
+        self.enter_room(flask.request.sid, "presenter")
 
-            print("Presenter joined")
-            self.game_metadata.setup_complete = False
+        print("Presenter joined")
+        self.game_metadata.setup_complete.clear()
 
-            self.emit("presenter_joined", to=flask.request.sid)
+        self.emit("presenter_joined", to=flask.request.sid)
 
     def on_contestant_join(self, user_id: str):
-        with self.database:
-            game_data = self.database.get_game_from_id(self.game_id)
-
-            game_contestant = game_data.get_contestant(game_contestant_id=user_id)
-            if game_contestant is None:
-                logger.warning(
-                    f"User '{user_id}' tried to join 'contestant' room, "
-                    f"but is not a contestant in game with ID '{self.game_id}'"
-                )
-                return
+        # Wait for presenter to indicate they are ready (or time out). All waiting
+        # contestants are released at once when setup is completed
+        if not self.game_metadata.setup_complete.wait(timeout=_SETUP_TIMEOUT):
+            raise TimeoutError()
+
+        game_contestant = self.game_data.get_contestant(game_contestant_id=user_id)
+        if game_contestant is None:
+            # Contestant might have joined the game after our state was loaded
+            self.resync()
+            game_contestant = self.game_data.get_contestant(game_contestant_id=user_id)
+
+        if game_contestant is None:
+            logger.warning(
+                f"User '{user_id}' tried to join 'contestant' room, "
+                f"but is not a contestant in game with ID '{self.game_id}'"
+            )
+            return
 
-            # Wait for presenter to indicate they are ready (or time out after 20 seconds)
-            timeout = 20
-            sleep_delta = 0.1
-            time_slept = 0
-            while (
-                self.game_metadata.setup_complete is not None
-                and not self.game_metadata.setup_complete
-                and time_slept < timeout
-            ):
-                time_slept += sleep_delta
-                sleep(sleep_delta)
-
-            if time_slept >= timeout:
-                raise TimeoutError()
-
-            sid = flask.request.sid
-
-            if user_id not in self.contestant_metadata:
-                self.contestant_metadata[user_id] = ContestantMetadata(sid)
-            else:
-                self.contestant_metadata[user_id].sid = sid
-                self.contestant_metadata[user_id].joined = True
+        sid = flask.request.sid
+
+        if user_id not in self.contestant_metadata:
+            self.contestant_metadata[user_id] = ContestantMetadata(sid)
+        else:
+            self.contestant_metadata[user_id].sid = sid
+            self.contestant_metadata[user_id].joined = True
 
-            game_contestant.disconnected = False
-            self.database.save_models(game_contestant)
+        game_contestant.disconnected = False
+        self.save_models(game_contestant)
 
-            contestant_data = game_contestant.dump(included_relations=[])
+        contestant_data = dump_game_contestant_only(game_contestant)
 
-            # Add socket_io session ID to contestant and join 'contestants' room
-            print(f"User '{contestant_data['name']}' with ID '{user_id}' and SID '{sid}' joined the lobby")
-            self.enter_room(sid, "contestants")
+        # Add socket_io session ID to contestant and join 'contestants' room
+        print(f"User '{contestant_data['name']}' with ID '{user_id}' and SID '{sid}' joined the lobby")
+        self.enter_room(sid, "contestants")
 
-            self.emit("contestant_joined", json.dumps(contestant_data), to="presenter")
-            self.emit("contestant_joined", to=sid)
+        self.emit("contestant_joined", json.dumps(contestant_data), to="presenter")
+        self.emit("contestant_joined", to=sid)
 
-            if all(
-                (
-                    contestant.disconnected
-                    or (contestant.id in self.contestant_metadata and self.contestant_metadata[contestant.id].joined)
-                )
-                for contestant in game_data.game_contestants
-            ):
-                self.emit("all_contestants_joined", to="presenter")
+        if all(
+            (
+                contestant.disconnected
+                or (contestant.id in self.contestant_metadata and self.contestant_metadata[contestant.id].joined)
+            )
+            for contestant in self.game_data.game_contestants
+        ):
+            self.emit("all_contestants_joined", to="presenter")
 
     @_presenter_event
     def on_setup_complete(self, refresh: bool):
@@ -184,7 +209,7 @@ class GameSocketHandler(Namespace):
         for metadata in self.contestant_metadata.values():
             metadata.joined = False
 
-        self.game_metadata.setup_complete = True
+        self.game_metadata.setup_complete.set()
         if refresh:
             self.emit("state_changed", to="contestants")
 
@@ -196,7 +221,7 @@ class GameSocketHandler(Namespace):
     
                 # if not self.game_metadata.contestants_joining:
                 #     game_contestant.disconnected = True
-                #     self.database.save_models(game_contestant)
+                #     self.save_models(game_contestant)
 
                 disconnected_party = f"Contestant with ID {contestant_id}"
             else:
@@ -239,13 +264,13 @@ class GameSocketHandler(Namespace):
             contestant_metadata = self.contestant_metadata.get(contestant.id)
             if not contestant_metadata or not contestant_metadata.joined:
                 contestant.disconnected = True
-                disconnected_contestants.append(contestant.id)
+                disconnected_contestants.append(contestant)
 
         if disconnected_contestants != []:
-            self.database.save_models(*disconnected_contestants)
+            self.save_models(*disconnected_contestants)
 
-        for contestant_id in disconnected_contestants:
-            self.handle_socket_disconnect("Contestant timed out when trying to join.", contestant_id=contestant_id)
+        for contestant in disconnected_contestants:
+            self.handle_socket_disconnect("Contestant timed out when trying to join.", contestant_id=contestant.id)
 
     def on_presenter_join_timeout(self):
         self.handle_socket_disconnect("Presenter timed out when trying to join.", "Presenter")
@@ -254,7 +279,9 @@ class GameSocketHandler(Namespace):
     def on_remove_contestant(self, user_id: str):
         contestant_data = self.game_data.get_contestant(game_contestant_id=user_id)
 
+        self.flush()
         self.database.delete_models(*contestant_data.power_ups, contestant_data)
+        self.resync()
 
         sid = self.contestant_metadata[user_id].sid
 
@@ -273,12 +300,17 @@ class GameSocketHandler(Namespace):
         question = self.game_data.get_question(question_id)
         question.active = True
 
-        self.database.save_models(question)
+        self.save_models(question)
 
     @_presenter_event
     def on_enable_buzz(self, active_players_string: str):
         active_player_ids = json.loads(active_players_string)
 
+        # Close any arbitration window left over from a previous buzz-in
+        if self._buzz_window is not None:
+            self._buzz_window.kill(block=False)
+            self._buzz_window = None
+
         ids_to_skip = set()
         for contestant_id in self.contestant_metadata:
             contestant_metadata = self.contestant_metadata[contestant_id]
@@ -332,7 +364,7 @@ class GameSocketHandler(Namespace):
         if skip_contestants != [] and user_id is not None:
             return
 
-        self.database.save_models(*power_up_models)
+        self.save_models(*power_up_models)
 
         send_to = self.contestant_metadata[user_id].sid if user_id is not None else "contestants"
         self.emit("power_up_enabled", power_id, to=send_to, skip_sid=skip_contestants)
@@ -360,7 +392,7 @@ class GameSocketHandler(Namespace):
                 "used_by": None,
             }
 
-            self.database.save_models(*power_up_models)
+            self.save_models(*power_up_models)
 
             send_to = self.contestant_metadata[user_id].sid if user_id is not None else "contestants"
             self.emit("power_ups_disabled", [power_up.value for power_up in power_ups], to=send_to)
@@ -381,7 +413,7 @@ class GameSocketHandler(Namespace):
             player_with_turn.has_turn = False
             models_to_save.append(player_with_turn)
 
-        self.database.save_models(*models_to_save)
+        self.save_models(*models_to_save)
 
         contestant_info = {
             "hits": contestant_data.hits,
@@ -397,7 +429,7 @@ class GameSocketHandler(Namespace):
         contestant_data.misses += 1
         contestant_data.score -= value
 
-        self.database.save_models(contestant_data)
+        self.save_models(contestant_data)
 
         contestant_info = {
             "misses": contestant_data.misses,
@@ -424,7 +456,7 @@ class GameSocketHandler(Namespace):
             player_with_turn.has_turn = False
             models_to_save.append(player_with_turn)
 
-        self.database.save_models(*models_to_save)
+        self.save_models(*models_to_save)
 
         self.emit("turn_chosen", user_id, to="contestants")
 
@@ -452,7 +484,7 @@ class GameSocketHandler(Namespace):
 
             power_up.used = True
 
-            self.database.save_models(contestant_data, power_up)
+            self.save_models(contestant_data, power_up)
 
             if power is PowerUpType.HIJACK:
                 self.emit("buzz_disabled", to="contestants", skip_sid=contestant_metadata.sid)
@@ -495,7 +527,19 @@ class GameSocketHandler(Namespace):
             flush=True
         )
 
-        sleep(min(max(max(c.ping / 1000, 0.01) for c in self.contestant_metadata.values()), 1))
+        self.save_models(contestant_data)
+
+        if self._buzz_window is None:
+            # First buzz opens the arbitration window. It is long enough to let buzzes
+            # from contestants with a worse ping arrive, but never longer than a second
+            window = min(
+                max(max(c.ping / 1000, _MIN_BUZZ_WINDOW) for c in self.contestant_metadata.values()),
+                _MAX_BUZZ_WINDOW
+            )
+            self._buzz_window = gevent.spawn_later(window, self._decide_buzz_winner)
+
+    def _decide_buzz_winner(self):
+        self._buzz_window = None
 
         # Make sure no other requests can declare a winner by using a lock
         with self.buzz_lock:
@@ -503,28 +547,33 @@ class GameSocketHandler(Namespace):
                 if self.game_metadata.buzz_winner_decided:
                     return
 
-                # Abort if currently used power is rewind or is hijack and the current buzzer didn't hijack
+                # Abort if currently used power is rewind. If it is hijack, only the
+                # contestant who hijacked the question can win the buzz
                 power_used = self.game_metadata.power_use_decided
-                if (
-                    power_used
-                    and (
-                        power_used["power"] is PowerUpType.REWIND or (
-                            power_used["power"] is PowerUpType.HIJACK and power_used["used_by"] != user_id
-                        )
-                    )
-                ):
+                if power_used and power_used["power"] is PowerUpType.REWIND:
                     return
 
-                self.game_metadata.buzz_winner_decided = True
+                hijacked_by = None
+                if power_used and power_used["power"] is PowerUpType.HIJACK:
+                    hijacked_by = power_used["used_by"]
 
                 earliest_buzz_time = time()
                 earliest_buzz_id = None
                 for cont_id in self.contestant_metadata:
+                    if hijacked_by is not None and cont_id != hijacked_by:
+                        continue
+
                     cont_metadata = self.contestant_metadata[cont_id]
                     if cont_metadata.latest_buzz is not None and cont_metadata.latest_buzz < earliest_buzz_time:
                         earliest_buzz_time = cont_metadata.latest_buzz
                         earliest_buzz_id = cont_id
 
+                if earliest_buzz_id is None:
+                    # The hijacker has not buzzed in yet, their buzz will open a new window
+                    return
+
+                self.game_metadata.buzz_winner_decided = True
+
                 # Reset buzz-in times
                 for c in self.contestant_metadata.values():
                     c.latest_buzz = None
@@ -537,8 +586,6 @@ class GameSocketHandler(Namespace):
                 self.emit("buzz_winner", earliest_buzz_id, to="presenter")
                 self.emit("buzz_loser", to="contestants", skip_sid=earliest_buzz_player.sid)
 
-                self.database.save_models(contestant_data)
-
     @_presenter_event
     def on_undo_answer(self, user_id: str, value: int):
         contestant_data = self.game_data.get_contestant(game_contestant_id=user_id)
@@ -551,7 +598,7 @@ class GameSocketHandler(Namespace):
 
         contestant_data.score += value
 
-        self.database.save_models(contestant_data)
+        self.save_models(contestant_data)
 
         self.emit("buzz_disabled", to="contestants", skip_sid=contestant_metadata.sid)
 
@@ -572,7 +619,7 @@ class GameSocketHandler(Namespace):
                 if used is not None:
                     power.used = used
 
-        self.database.save_models(contestant_data, *contestant_data.power_ups)
+        self.save_models(contestant_data, *contestant_data.power_ups)
 
         self.emit("contestant_info_changed", json_str, to=contestant_metadata.sid)
 
@@ -623,7 +670,7 @@ class GameSocketHandler(Namespace):
             print(f"Made finale wager for {user_id} ({contestant_data.contestant.name}) for {amount} points")
             contestant_data.finale_wager = amount
 
-            self.database.save_models(contestant_data)
+            self.save_models(contestant_data)
 
             self.emit("finale_wager_made")
             self.emit("contestant_ready", user_id, to="presenter")
@@ -638,7 +685,7 @@ class GameSocketHandler(Namespace):
 
         contestant_data.finale_answer = answer
 
-        self.database.save_models(contestant_data)
+        self.save_models(contestant_data)
 
         self.emit("finale_answer_given")
         self.emit("contestant_ready", user_id, to="presenter")
@@ -652,7 +699,7 @@ class GameSocketHandler(Namespace):
         contestant_data.score += amount
         contestant_data.hits += 1
 
-        self.database.save_models(contestant_data)
+        self.save_models(contestant_data)
 
     @_presenter_event
     def on_finale_answer_wrong(self, user_id: str, amount: int):
@@ -663,7 +710,7 @@ class GameSocketHandler(Namespace):
         contestant_data.score -= amount
         contestant_data.misses += 1
 
-        self.database.save_models(contestant_data)
+        self.save_models(contestant_data)
 
     @_presenter_event
     def on_finale_answer_undo(self, user_id: str, amount: int):
@@ -682,18 +729,120 @@ class GameSocketHandler(Namespace):
             contestant_data.hits += 1
             contestant_data.misses -= 1
 
-        self.database.save_models(contestant_data)
+        self.save_models(contestant_data)
 
-def get_namespace_handler(game_id: str) -> GameSocketHandler:
-    if socket_io.server:
-        namespaces = socket_io.server.namespace_handlers.values()
-    else:
-        namespaces = socket_io.namespace_handlers
+def _get_deep_size(obj, seen: set) -> int:
+    if id(obj) in seen:
+        return 0
 
-    namespace_handler = None
-    for namespace in namespaces:
-        if namespace.game_id == game_id:
-            namespace_handler = namespace
-            break
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+
+    if isinstance(obj, dict):
+        size += sum(
+            _get_deep_size(key, seen) + _get_deep_size(value, seen)
+            for key, value in obj.items()
+            # Skip SQLAlchemy instance state, it refers to shared mapper data
+            if not (isinstance(key, str) and key.startswith("_sa_"))
+        )
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(_get_deep_size(item, seen) for item in obj)
+    elif hasattr(obj, "__dict__"):
+        size += _get_deep_size(vars(obj), seen)
+
+    return size
+
+class NamespaceRegistry:
+    """
+    Registry of the socket namespace handlers of all hosted games, keyed by game ID.
+    Handlers are evicted and unregistered from socket_io once their game has ended
+    or they have been idle for longer than the configured TTL.
+    """
+    def __init__(
+        self,
+        idle_ttl: float = Config.NAMESPACE_IDLE_TTL,
+        ended_ttl: float = Config.NAMESPACE_ENDED_TTL,
+        sweep_interval: float = Config.NAMESPACE_SWEEP_INTERVAL,
+    ):
+        self.idle_ttl = idle_ttl
+        self.ended_ttl = ended_ttl
+        self.sweep_interval = sweep_interval
+        self._handlers: Dict[str, GameSocketHandler] = {}
+        self._sweeper: gevent.Greenlet | None = None
 
-    return namespace_handler
+    def __len__(self):
+        return len(self._handlers)
+
+    def get(self, game_id: str) -> GameSocketHandler | None:
+        handler = self._handlers.get(game_id)
+        if handler is not None:
+            handler.last_active = time()
+
+        return handler
+
+    def register(self, handler: GameSocketHandler):
+        socket_io.on_namespace(handler)
+        self._handlers[handler.game_id] = handler
+
+        if self._sweeper is None:
+            self._sweeper = gevent.spawn(self._sweep_loop)
+
+    def evict(self, game_id: str):
+        handler = self._handlers.pop(game_id, None)
+        if handler is None:
+            return
+
+        try:
+            handler.flush()
+        except Exception:
+            logger.exception(f"Error when flushing game state of evicted game '{game_id}'")
+
+        if socket_io.server:
+            socket_io.server.namespace_handlers.pop(handler.namespace, None)
+        elif handler in socket_io.namespace_handlers:
+            socket_io.namespace_handlers.remove(handler)
+
+    def evict_stale(self):
+        now = time()
+        stale_ids = []
+        for game_id, handler in self._handlers.items():
+            idle_time = now - handler.last_active
+            game_ended = handler.game_data is None or handler.game_data.stage is StageType.ENDED
+
+            if idle_time > self.idle_ttl or (game_ended and idle_time > self.ended_ttl):
+                stale_ids.append(game_id)
+
+        for game_id in stale_ids:
+            self.evict(game_id)
+
+        if stale_ids != []:
+            logger.bind(event="namespaces_evicted", evicted=stale_ids, **self.get_stats()).info(
+                f"Evicted {len(stale_ids)} socket namespace(s) of ended or idle games"
+            )
+
+    def get_stats(self) -> Dict[str, int]:
+        seen = set()
+        memory = 0
+        for handler in self._handlers.values():
+            memory += _get_deep_size(
+                (handler.game_data, handler.game_metadata, handler.contestant_metadata),
+                seen
+            )
+
+        return {"namespaces": len(self._handlers), "memory_bytes": memory}
+
+    def _sweep_loop(self):
+        while True:
+            gevent.sleep(self.sweep_interval)
+            try:
+                self.evict_stale()
+            except Exception:
+                logger.exception("Error when evicting stale socket namespaces")
+
+namespace_registry = NamespaceRegistry()
+
+def get_namespace_handler(game_id: str) -> GameSocketHandler | None:
+    return namespace_registry.get(game_id)
+
+def register_namespace_handler(handler: GameSocketHandler):
+    namespace_registry.register(handler)
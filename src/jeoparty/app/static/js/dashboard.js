@@ -37,4 +37,64 @@ function deletePack(event, packId) {
 
 function deleteGame(event, gameId) {
     deleteElement(gameId, "game", "game", event, "dashboard-games-data");
-}
\ No newline at end of file
+}
+
+function applyListFilter(select) {
+    let params = new URLSearchParams(window.location.search);
+    if (select.value) {
+        params.set(select.name, select.value);
+    }
+    else {
+        params.delete(select.name);
+    }
+
+    window.location.search = params.toString();
+}
+
+function loadMoreEntries(name, buttonId, extraParams, onPage) {
+    let button = document.getElementById(buttonId);
+
+    // Keep the filters the current page was loaded with
+    let params = new URLSearchParams(window.location.search);
+    params.set("cursor", button.dataset.cursor);
+    for (let key in extraParams) {
+        params.set(key, extraParams[key]);
+    }
+
+    button.disabled = true;
+
+    $.ajax(`${getBaseURL()}/jeoparty/${name}/page?${params.toString()}`
+    ).done(function(data) {
+        onPage(data["html"]);
+
+        if (data["cursor"]) {
+            button.dataset.cursor = data["cursor"];
+        }
+        else {
+            button.style.display = "none";
+        }
+    }).fail(function(response) {
+        let data = JSON.parse(response["responseText"]);
+        alert(data["response"]);
+    }).always(function() {
+        button.disabled = false;
+    });
+}
+
+function loadMoreGames() {
+    loadMoreEntries("games", "dashboard-games-more", {}, function(html) {
+        $("#dashboard-games-data").append(html);
+    });
+}
+
+function loadMorePacks() {
+    loadMoreEntries("packs", "dashboard-questions-more", {}, function(html) {
+        $("#dashboard-questions-data").append(html);
+    });
+}
+
+function loadMorePackOptions() {
+    loadMoreEntries("packs", "create-game-more-packs", {"view": "options", "include_public": "1"}, function(html) {
+        $(html).insertBefore("#create-game-pack > option[value='missing']");
+    });
+}
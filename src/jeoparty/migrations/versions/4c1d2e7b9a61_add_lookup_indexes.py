@@ -0,0 +1,53 @@
+"""Add lookup indexes
+
+Revision ID: 4c1d2e7b9a61
+Revises: 9e063632a2ba
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+import sys, os
+
+from alembic import op
+import sqlalchemy as sa
+
+# Add your project root to the Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+# revision identifiers, used by Alembic.
+revision: str = '4c1d2e7b9a61'
+down_revision: Union[str, None] = '9e063632a2ba'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# game_questions.game_id is not indexed separately, since it is
+# the first column of the primary key of the table
+INDEXES = [
+    ("ix_themes_created_by", "themes", ["created_by"]),
+    ("ix_themes_public", "themes", ["public"]),
+    ("ix_question_packs_created_by", "question_packs", ["created_by"]),
+    ("ix_question_packs_public", "question_packs", ["public"]),
+    ("ix_question_rounds_pack_id", "question_rounds", ["pack_id"]),
+    ("ix_question_categories_round_id", "question_categories", ["round_id"]),
+    ("ix_questions_category_id", "questions", ["category_id"]),
+    ("ix_buzzer_sounds_theme_id", "buzzer_sounds", ["theme_id"]),
+    ("ix_game_power_ups_contestant_id", "game_power_ups", ["contestant_id"]),
+    ("ix_game_contestants_game_id", "game_contestants", ["game_id"]),
+    ("ix_game_contestants_contestant_id", "game_contestants", ["contestant_id"]),
+    ("ix_game_questions_question_id", "game_questions", ["question_id"]),
+    ("ix_games_pack_id", "games", ["pack_id"]),
+    ("ix_games_join_code", "games", ["join_code"]),
+    ("ix_games_created_by", "games", ["created_by"]),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for index_name, table_name, columns in INDEXES:
+        op.create_index(index_name, table_name, columns, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for index_name, table_name, _ in reversed(INDEXES):
+        op.drop_index(index_name, table_name=table_name, if_exists=True)
@@ -0,0 +1,43 @@
+"""Add listing indexes
+
+Revision ID: 7e5a3c9d2b18
+Revises: 4c1d2e7b9a61
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+import sys, os
+
+from alembic import op
+import sqlalchemy as sa
+
+# Add your project root to the Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+# revision identifiers, used by Alembic.
+revision: str = '7e5a3c9d2b18'
+down_revision: Union[str, None] = '4c1d2e7b9a61'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Composite indexes for keyset pagination, which replace
+# the single column indexes that are prefixes of them
+INDEXES = [
+    ("ix_question_packs_created_by_changed_at", "question_packs", ["created_by", "changed_at", "id"], "ix_question_packs_created_by", ["created_by"]),
+    ("ix_question_packs_public_changed_at", "question_packs", ["public", "changed_at", "id"], "ix_question_packs_public", ["public"]),
+    ("ix_games_created_by_started_at", "games", ["created_by", "started_at", "id"], "ix_games_created_by", ["created_by"]),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for index_name, table_name, columns, old_index_name, _ in INDEXES:
+        op.create_index(index_name, table_name, columns, if_not_exists=True)
+        op.drop_index(old_index_name, table_name=table_name, if_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for index_name, table_name, _, old_index_name, old_columns in reversed(INDEXES):
+        op.create_index(old_index_name, table_name, old_columns, if_not_exists=True)
+        op.drop_index(index_name, table_name=table_name, if_exists=True)
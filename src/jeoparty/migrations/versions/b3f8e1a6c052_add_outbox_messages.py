@@ -0,0 +1,56 @@
+"""Add outbox messages
+
+Revision ID: b3f8e1a6c052
+Revises: 7e5a3c9d2b18
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+import sys, os
+
+from alembic import op
+import sqlalchemy as sa
+
+# Add your project root to the Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3f8e1a6c052'
+down_revision: Union[str, None] = '7e5a3c9d2b18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "outbox_messages",
+        sa.Column("id", sa.String(length=64), nullable=False),
+        sa.Column("game_id", sa.String(length=64), nullable=False),
+        sa.Column("event", sa.String(length=64), nullable=False),
+        sa.Column("url", sa.String(length=256), nullable=False),
+        sa.Column("payload", sa.JSON(), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("next_attempt_at", sa.DateTime(), nullable=False),
+        sa.Column("delivered_at", sa.DateTime(), nullable=True),
+        sa.Column("last_error", sa.String(length=256), nullable=True),
+        sa.ForeignKeyConstraint(["game_id"], ["games.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        if_not_exists=True,
+    )
+    op.create_index("ix_outbox_messages_game_id_event", "outbox_messages", ["game_id", "event"], unique=True, if_not_exists=True)
+    op.create_index(
+        "ix_outbox_messages_pending",
+        "outbox_messages",
+        ["next_attempt_at"],
+        sqlite_where=sa.text("delivered_at IS NULL"),
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_outbox_messages_pending", table_name="outbox_messages", if_exists=True)
+    op.drop_index("ix_outbox_messages_game_id_event", table_name="outbox_messages", if_exists=True)
+    op.drop_table("outbox_messages", if_exists=True)
@@ -1,9 +1,9 @@
 from argparse import ArgumentParser
 import json
+import signal
 import socket
 from os.path import basename
 from glob import glob
-from multiprocessing import Lock
 
 import gevent
 
@@ -14,6 +14,8 @@ from mhooge_flask.restartable import restartable
 
 from jeoparty.api.config import Config, Environment
 from jeoparty.api.database import Database
+from jeoparty.api.game_locks import GameLocks
+from jeoparty.api.write_queue import flush_all_queues
 
 def get_local_ip():
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -24,6 +26,17 @@ def get_local_ip():
 
     return ip
 
+def shutdown(database: Database):
+    logger.info("Shutting down, writing pending game changes to the database.")
+    database.outbox_worker.stop()
+
+    # Write the changes synchronously, without handing them to threads that are being torn down
+    database.executor.shutdown()
+    flush_all_queues()
+
+    # Raised in the main greenlet by the hub, which stops the server
+    raise SystemExit(0)
+
 def run_app(args):
     routes = [
         Route("dashboard", "dashboard_page"),
@@ -32,9 +45,19 @@ def run_app(args):
         Route("login", "login_page")
     ]
 
-    database = Database(args.database)
+    database = Database(args.database, args.sqlite_profile)
     app_name = "jeoparty"
 
+    pragmas = ", ".join(f"{pragma}={value}" for pragma, value in database.get_pragmas().items())
+    logger.info(f"Using SQLite profile '{args.sqlite_profile}' ({pragmas})")
+
+    # Send messages to Int-Far that were still in the outbox when the app was last stopped
+    database.outbox_worker.start()
+
+    # 'podman stop' sends SIGTERM, so write pending game changes on that as well as on Ctrl-C
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        gevent.signal_handler(signum, shutdown, database)
+
     locale_data = {}
     for filename in glob(f"{Config.RESOURCES_FOLDER}/locales/*.json"):
         lang = basename(filename).split(".")[0]
@@ -59,7 +82,7 @@ def run_app(args):
         persistent_variables={"app_name": app_name.capitalize()},
         exit_code=0,
         locales=locale_data,
-        join_lock=Lock(),
+        join_locks=GameLocks(),
         host_url=host_url,
     )
     logger.info("Starting Flask web app.")
@@ -69,6 +92,7 @@ def run_app(args):
 def main():
     parser = ArgumentParser()
     parser.add_argument("-db", "--database", default="database.db")
+    parser.add_argument("-sp", "--sqlite-profile", default=Config.SQLITE_PROFILE, choices=list(Config.SQLITE_PROFILES))
     parser.add_argument("-d", "--dev", action="store_true")
     parser.add_argument("-p", "--port", type=int, default=5006)
     args = parser.parse_args()
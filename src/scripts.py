@@ -4,16 +4,24 @@ from base64 import b64encode
 import os
 from inspect import iscoroutinefunction
 from glob import glob
+from time import perf_counter
 from uuid import uuid4
 
 import cv2
+import gevent
+from gevent.event import Event
+from gevent.lock import RLock
 from flask import json
 import requests
+from sqlalchemy import delete, func, select, update
 
 from jeoparty.api.config import Config, get_buzz_sound_path
 from jeoparty.api.database import Database
+from jeoparty.api.db_executor import DatabaseExecutor
 from jeoparty.api.enums import StageType
-from jeoparty.api.orm.models import BuzzerSound, Game
+from jeoparty.api.game_locks import GameLocks
+from jeoparty.api.orm.models import BuzzerSound, Contestant, Game, GameContestant, GameQuestion, Question
+from jeoparty.api import serializers
 
 class ScriptRunner:
     def fetch_resource(self):
@@ -146,6 +154,269 @@ class ScriptRunner:
             session.add_all(models)
             session.commit()
 
+    def benchmark_create_game(self, pack_id: str, user_id: str, iterations: str = "20"):
+        """
+        Compare creating the game questions of a game by loading the whole
+        question pack into ORM objects against the narrow SELECT of question IDs
+        and single executemany INSERT used by `Database.create_game`.
+        """
+        database = Database()
+        iterations = int(iterations)
+
+        def create_with_orm():
+            with database as session:
+                game_model = Game(pack_id=pack_id, title="Benchmark", join_code=str(uuid4()), max_contestants=4, created_by=user_id)
+                session.add(game_model)
+                session.flush()
+
+                pack_data = database.get_question_packs_for_user(user_id, pack_id, True)
+                session.add_all(
+                    [GameQuestion(game_id=game_model.id, question_id=question.id) for question in pack_data.get_all_questions()]
+                )
+                session.commit()
+
+                return game_model.id
+
+        def create_with_executemany():
+            game_model = Game(pack_id=pack_id, title="Benchmark", join_code=str(uuid4()), max_contestants=4, created_by=user_id)
+            database.create_game(game_model)
+
+            return game_model.id
+
+        for name, func in (("ORM objects", create_with_orm), ("SELECT + executemany INSERT", create_with_executemany)):
+            game_ids = []
+            time_start = perf_counter()
+            for _ in range(iterations):
+                game_ids.append(func())
+
+            time_taken = perf_counter() - time_start
+
+            for game_id in game_ids:
+                database.delete_game(game_id)
+
+            print(f"{name}: {time_taken / iterations * 1000:.2f} ms per game ({iterations} games)")
+
+    def benchmark_buzz_latency(self, game_id: str, saves: str = "200", writers: str = "4", pack_edits: str = "50"):
+        """
+        Measure how long a socket event (e.g. a buzz) has to wait for the gevent hub
+        while game state is written by several greenlets at the same time and a question
+        of the game's pack is edited through the shared session, like the dashboard does,
+        with database work on the hub and on the database executor.
+        """
+        database = Database()
+        saves = int(saves)
+        writers = int(writers)
+        pack_edits = int(pack_edits)
+        original_state = database.get_game_state(game_id)
+        question_id = original_state.game_questions[0].question_id
+        with database as session:
+            original_question = session.execute(select(Question.question).where(Question.id == question_id)).scalar_one()
+
+        def write_game_state(done: Event):
+            game_data = database.get_game_state(game_id)
+            contestant = game_data.game_contestants[0]
+            for _ in range(saves):
+                contestant.score += 1
+                database.update_models(contestant)
+
+            done.set()
+
+        def edit_question_pack(done: Event):
+            with database as session:
+                question = session.get(Question, question_id)
+                for index in range(pack_edits):
+                    question.question = f"{original_question} ({index})"
+                    database.save_models(question)
+
+            done.set()
+
+        def measure_latency(done_events: list[Event], latencies: list[float]):
+            interval = 0.001
+            while not all(done.is_set() for done in done_events):
+                time_start = perf_counter()
+                gevent.sleep(interval)
+                latencies.append(perf_counter() - time_start - interval)
+
+        for threads in (0, Config.DATABASE_THREADS):
+            database.executor.close()
+            database.executor = DatabaseExecutor(threads)
+
+            done_events = [Event() for _ in range(writers + 1)]
+            latencies = []
+
+            time_start = perf_counter()
+            greenlets = [gevent.spawn(measure_latency, done_events, latencies)]
+            greenlets.extend(gevent.spawn(write_game_state, done) for done in done_events[:-1])
+            greenlets.append(gevent.spawn(edit_question_pack, done_events[-1]))
+            gevent.joinall(greenlets, raise_error=True)
+            time_taken = perf_counter() - time_start
+
+            latencies.sort()
+            mean = sum(latencies) / len(latencies) * 1000
+            p99 = latencies[int(len(latencies) * 0.99)] * 1000
+            print(
+                f"Threads: {threads}, writes: {writers * saves}, pack edits: {pack_edits} in {time_taken:.2f}s, "
+                f"latency mean: {mean:.2f} ms, p99: {p99:.2f} ms, max: {latencies[-1] * 1000:.2f} ms"
+            )
+
+        # Restore the score and the question that were changed by the writers
+        original_contestant = original_state.game_contestants[0]
+        with database as session:
+            session.execute(
+                update(GameContestant)
+                .where(GameContestant.id == original_contestant.id)
+                .values(score=original_contestant.score)
+            )
+            session.execute(update(Question).where(Question.id == question_id).values(question=original_question))
+            session.commit()
+
+        database.executor.close()
+
+    def benchmark_commits(self, game_id: str, writes: str = "500"):
+        """
+        Measure commits per second of the write path used for game events
+        with each SQLite profile in the config.
+        """
+        writes = int(writes)
+
+        for profile in Config.SQLITE_PROFILES:
+            database = Database(sqlite_profile=profile)
+            database.executor = DatabaseExecutor(0)
+            game_data = database.get_game_state(game_id)
+            contestant = game_data.game_contestants[0]
+            original_score = contestant.score
+
+            time_start = perf_counter()
+            for _ in range(writes):
+                contestant.score += 1
+                database.update_models(contestant)
+
+            time_taken = perf_counter() - time_start
+
+            contestant.score = original_score
+            database.update_models(contestant)
+            database.engine.dispose()
+
+            print(f"Profile '{profile}': {writes / time_taken:.0f} commits per second ({writes} commits in {time_taken:.2f}s)")
+
+    def benchmark_joins(self, pack_id: str, user_id: str, games: str = "4", joins_per_game: str = "8"):
+        """
+        Measure contestants joining several games at once, with joins serialized by
+        a single global lock and by per-game locks, and check that no game is overfilled.
+        """
+        database = Database()
+        games = int(games)
+        joins_per_game = int(joins_per_game)
+
+        def join(lock, game_id: str, latencies: list[float]):
+            contestant = Contestant(name="Benchmark", color="#000000")
+            time_start = perf_counter()
+            with lock(game_id):
+                joined = database.join_game(contestant, game_id, True)
+
+            latencies.append(perf_counter() - time_start)
+
+            return contestant.id, joined
+
+        global_lock = RLock()
+        game_locks = GameLocks()
+
+        for name, lock in (("Global lock", lambda _: global_lock), ("Per-game locks", game_locks.lock)):
+            game_ids = []
+            for _ in range(games):
+                game_model = Game(pack_id=pack_id, title="Benchmark", join_code=str(uuid4()), max_contestants=joins_per_game, created_by=user_id)
+                database.create_game(game_model)
+                game_ids.append(game_model.id)
+
+            # Two more contestants than there is room for try to join each game
+            latencies = []
+            time_start = perf_counter()
+            greenlets = [
+                gevent.spawn(join, lock, game_id, latencies)
+                for _ in range(joins_per_game + 2)
+                for game_id in game_ids
+            ]
+            gevent.joinall(greenlets, raise_error=True)
+            time_taken = perf_counter() - time_start
+
+            with database as session:
+                contestant_counts = session.execute(
+                    select(GameContestant.game_id, func.count())
+                    .where(GameContestant.game_id.in_(game_ids))
+                    .group_by(GameContestant.game_id)
+                ).all()
+
+            overfilled = [game_id for game_id, count in contestant_counts if count > joins_per_game]
+            joined = sum(1 for greenlet in greenlets if greenlet.value[1])
+
+            for game_id in game_ids:
+                database.delete_game(game_id)
+
+            with database as session:
+                session.execute(delete(Contestant).where(Contestant.id.in_([greenlet.value[0] for greenlet in greenlets])))
+                session.commit()
+
+            latencies.sort()
+            mean = sum(latencies) / len(latencies) * 1000
+            p99 = latencies[int(len(latencies) * 0.99)] * 1000
+            print(
+                f"{name}: {len(greenlets)} joins in {time_taken:.2f}s, {joined} joined, "
+                f"{len(overfilled)} games overfilled, latency mean: {mean:.2f} ms, p99: {p99:.2f} ms"
+            )
+
+        database.executor.close()
+
+    def benchmark_serializers(self, pack_id: str, user_id: str, iterations: str = "200"):
+        """
+        Compare the generic dump() against the compiled serializers used on hot paths,
+        on a game with 10 contestants and 3 rounds (2 regular rounds and the finale).
+        """
+        database = Database()
+        database.executor = DatabaseExecutor(0)
+        iterations = int(iterations)
+
+        game_model = Game(pack_id=pack_id, title="Benchmark", join_code=str(uuid4()), regular_rounds=2, max_contestants=10, created_by=user_id)
+        database.create_game(game_model)
+
+        contestants = [Contestant(name=f"Benchmark {index}", color="#000000") for index in range(10)]
+        for contestant in contestants:
+            database.join_game(contestant, game_model.id, True)
+
+        game_data = database.get_game_state(game_model.id)
+
+        cases = [
+            ("Game with contestants", game_data, serializers.dump_game_with_contestants, {"included_relations": [Game.game_contestants], "id": "game_id"}),
+            ("Game with pack and contestants", game_data, serializers.dump_game_with_pack_and_contestants, {"included_relations": [Game.pack, Game.game_contestants], "id": "game_id"}),
+            ("Round", game_data.pack.rounds[0], serializers.dump_round, {"id": "round_id"}),
+            ("Game contestant", game_data.game_contestants[0], serializers.dump_game_contestant_only, {"included_relations": []}),
+        ]
+
+        for name, model, serializer, dump_args in cases:
+            if serializer(model) != model.dump(**dump_args):
+                print(f"{name}: compiled serializer does not match dump()")
+
+            time_start = perf_counter()
+            for _ in range(iterations):
+                model.dump(**dump_args)
+
+            time_dump = perf_counter() - time_start
+
+            time_start = perf_counter()
+            for _ in range(iterations):
+                serializer(model)
+
+            time_compiled = perf_counter() - time_start
+
+            print(
+                f"{name}: dump() {time_dump / iterations * 1000:.3f} ms, "
+                f"compiled {time_compiled / iterations * 1000:.3f} ms, {time_dump / time_compiled:.1f}x faster"
+            )
+
+        database.delete_game(game_model.id)
+        with database as session:
+            session.execute(delete(Contestant).where(Contestant.id.in_([contestant.id for contestant in contestants])))
+            session.commit()
+
     def copy_game_state(self, game_id: str):
         database = Database()
 
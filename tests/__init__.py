@@ -3,7 +3,8 @@ from typing import List
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
-from jeoparty.api.orm.models import Game
+from jeoparty.api.orm.models import Game, GameContestant, QuestionPack
+from tests.config import PRESENTER_USER_ID
 
 def create_contestant_data(amount=4):
     contestant_names = [
@@ -33,6 +34,38 @@ def create_contestant_data(amount=4):
 
     return contestant_names[:amount], contestant_colors[:amount]
 
+def create_game_in_database(
+    database,
+    title: str,
+    contestants: int = 0,
+    use_powerups: bool = True,
+    max_contestants: int = 5,
+    seed: int | None = None,
+    pack_name: str = "Test Pack",
+) -> Game:
+    """
+    Create a game directly in the database, without going through the browser, and add
+    the first `contestants` of the test contestants to it. The join code of the game is
+    its title in snake case.
+    """
+    with database as session:
+        pack_id = session.execute(select(QuestionPack.id).where(QuestionPack.name == pack_name)).scalar_one()
+
+    game_model = Game(
+        pack_id=pack_id,
+        title=title,
+        join_code=title.lower().replace(" ", "_"),
+        max_contestants=max_contestants,
+        created_by=PRESENTER_USER_ID,
+    )
+    database.create_game(game_model, seed=seed)
+
+    for index in range(contestants):
+        game_contestant_model = GameContestant(game_id=game_model.id, contestant_id=f"contestant_id_{index}")
+        database.add_contestant_to_game(game_contestant_model, use_powerups)
+
+    return game_model
+
 async def create_game(
     context,
     session: Session,
@@ -0,0 +1,59 @@
+import os
+
+from jeoparty.api.asset_manifest import AssetManifest
+
+def _touch(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as fp:
+        fp.write("")
+
+def test_manifest_lists_and_resolves_files(tmp_path):
+    _touch(f"{tmp_path}/data/themes/theme/avatars/b.png")
+    _touch(f"{tmp_path}/data/themes/theme/avatars/a.png")
+    _touch(f"{tmp_path}/data/themes/theme/logo.webp")
+    os.makedirs(f"{tmp_path}/data/themes/theme/avatars/nested")
+
+    manifest = AssetManifest(str(tmp_path), check_interval=60)
+
+    assert manifest.list_files("data/themes/theme/avatars") == (
+        "data/themes/theme/avatars/a.png",
+        "data/themes/theme/avatars/b.png",
+    )
+    assert manifest.exists("data/themes/theme/logo.webp")
+    assert not manifest.exists("data/themes/theme/presenter_background.jpg")
+    assert manifest.list_files("data/themes/missing") == ()
+    assert manifest.file_or_fallback("data/themes/theme/freeze_power.png", "img/freeze_power.png") == "img/freeze_power.png"
+    assert manifest.file_or_fallback("data/themes/theme/logo.webp", "img/logo.webp", False) == "img/logo.webp"
+
+def test_manifest_is_cached_until_checked_or_reloaded(tmp_path):
+    _touch(f"{tmp_path}/data/themes/theme/avatars/a.png")
+
+    manifest = AssetManifest(str(tmp_path), check_interval=60)
+    assert len(manifest.list_files("data/themes/theme/avatars")) == 1
+
+    # New files are not seen before the check interval has passed
+    _touch(f"{tmp_path}/data/themes/theme/avatars/b.png")
+    assert len(manifest.list_files("data/themes/theme/avatars")) == 1
+
+    manifest.reload("data/themes/theme")
+    assert len(manifest.list_files("data/themes/theme/avatars")) == 2
+    assert len(manifest) == 1
+
+def test_manifest_rebuilds_changed_directories(tmp_path):
+    _touch(f"{tmp_path}/data/themes/theme/avatars/a.png")
+
+    manifest = AssetManifest(str(tmp_path), check_interval=0)
+    assert len(manifest.list_files("data/themes/theme/avatars")) == 1
+
+    _touch(f"{tmp_path}/data/themes/theme/avatars/b.png")
+
+    # Make sure the modification time of the directory changes on coarse filesystems
+    stat = os.stat(f"{tmp_path}/data/themes/theme/avatars")
+    os.utime(f"{tmp_path}/data/themes/theme/avatars", (stat.st_atime, stat.st_mtime + 1))
+
+    assert len(manifest.list_files("data/themes/theme/avatars")) == 2
+
+    # Directories that didn't exist are listed once they are created
+    assert manifest.list_files("data/themes/theme/wrong_icons") == ()
+    _touch(f"{tmp_path}/data/themes/theme/wrong_icons/x.png")
+    assert manifest.list_files("data/themes/theme/wrong_icons") == ("data/themes/theme/wrong_icons/x.png",)
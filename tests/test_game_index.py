@@ -0,0 +1,54 @@
+from sqlalchemy import update
+
+from jeoparty.api.orm.models import GameContestant
+from tests import create_game_in_database
+
+def _create_game(database, session):
+    game_model = create_game_in_database(database, "Game Index", contestants=3, use_powerups=False)
+
+    return database.get_game_from_id(game_model.id)
+
+def _give_turn(session, game_contestant_id: str):
+    # Change the turn behind the back of the loaded models
+    session.execute(
+        update(GameContestant).values(has_turn=GameContestant.id == game_contestant_id).execution_options(synchronize_session=False)
+    )
+
+def test_index_updated_when_contestant_refreshed(database):
+    with database as session:
+        game_data = _create_game(database, session)
+        first, second = game_data.game_contestants[:2]
+        assert game_data.get_contestant_with_turn() is None
+
+        _give_turn(session, second.id)
+        session.refresh(second)
+
+        assert game_data.get_contestant_with_turn() is second
+
+        _give_turn(session, first.id)
+        session.refresh(first)
+        session.refresh(second)
+
+        assert game_data.get_contestant_with_turn() is first
+
+def test_index_updated_when_contestant_expired(database):
+    with database as session:
+        game_data = _create_game(database, session)
+        contestant = game_data.game_contestants[1]
+        assert game_data.get_contestant_with_turn() is None
+
+        _give_turn(session, contestant.id)
+        session.expire(contestant, ["has_turn"])
+
+        assert game_data.get_contestant_with_turn() is contestant
+
+def test_index_updated_when_contestant_fully_expired(database):
+    with database as session:
+        game_data = _create_game(database, session)
+        contestant = game_data.game_contestants[2]
+        assert game_data.get_contestant_with_turn() is None
+
+        _give_turn(session, contestant.id)
+        session.expire(contestant)
+
+        assert game_data.get_contestant_with_turn() is contestant
@@ -0,0 +1,107 @@
+import random
+
+from sqlalchemy import update
+
+from jeoparty.api.game_plan import generate_game_plan
+from jeoparty.api.orm.models import GameQuestion
+from jeoparty.app.routes.presenter import _place_missing_daily_doubles
+from tests import create_game_in_database
+
+def _get_questions(regular_rounds: int, questions_per_round: int, include_finale: bool):
+    questions = [
+        (f"question_{round_num}_{index}", round_num)
+        for round_num in range(1, regular_rounds + 1)
+        for index in range(questions_per_round)
+    ]
+    if include_finale:
+        questions.append(("finale_question", regular_rounds + 1))
+
+    return questions
+
+def test_daily_doubles_per_round():
+    game_plan = generate_game_plan(_get_questions(3, 6, True), 3, True, seed=42)
+
+    # Each regular round gets as many daily doubles as its round number
+    for round_num in range(1, 4):
+        assert len(game_plan.get_daily_doubles(round_num)) == round_num
+
+    # The finale never has a daily double
+    assert game_plan.rounds[4] == ["finale_question"]
+    assert game_plan.get_daily_doubles(4) == []
+
+def test_daily_doubles_capped_by_questions():
+    game_plan = generate_game_plan(_get_questions(3, 2, False), 3, True, seed=42)
+
+    assert len(game_plan.get_daily_doubles(3)) == 2
+    assert 4 not in game_plan.rounds
+
+def test_no_daily_doubles_when_disabled():
+    game_plan = generate_game_plan(_get_questions(2, 6, True), 2, False, seed=42)
+
+    assert game_plan.daily_doubles == set()
+    assert all(not row["daily_double"] for row in game_plan.get_game_question_rows("game_id"))
+
+def test_seeded_plan_is_reproducible():
+    questions = _get_questions(2, 6, True)
+    game_plan = generate_game_plan(questions, 2, True, seed=1234)
+
+    # The order of the questions does not matter, only the seed
+    shuffled = list(questions)
+    random.Random(1).shuffle(shuffled)
+
+    assert generate_game_plan(shuffled, 2, True, seed=1234) == game_plan
+
+def test_create_game_writes_plan(database):
+    game_plans = []
+    daily_doubles = []
+    for index in range(2):
+        game_model = create_game_in_database(database, f"Game Plan {index}", seed=7)
+
+        with database:
+            game_data = database.get_game_from_id(game_model.id)
+            daily_doubles.append({game_question.question_id for game_question in game_data.game_questions if game_question.daily_double})
+
+            # Every question of the game is written with the daily double flag of the seeded plan up front
+            questions = [
+                (game_question.question_id, game_question.question.category.round.round)
+                for game_question in game_data.game_questions
+            ]
+            game_plans.append(generate_game_plan(questions, game_data.regular_rounds, True, seed=7))
+
+    # Games created with the same seed get the same daily doubles
+    assert daily_doubles[0] == daily_doubles[1] == game_plans[0].daily_doubles
+    assert len(daily_doubles[0]) > 0
+
+def test_missing_daily_doubles_placed_for_round(database):
+    game_model = create_game_in_database(database, "Game Plan Upgrade", seed=7)
+
+    # Games created before daily doubles were placed up front have none in later rounds
+    with database as session:
+        session.execute(update(GameQuestion).where(GameQuestion.game_id == game_model.id).values(daily_double=False))
+        session.commit()
+
+    game_data = database.get_game_state(game_model.id)
+    game_data.round = 2
+    questions = game_data.get_questions_for_round()
+
+    with database.unit_of_work() as unit_of_work:
+        _place_missing_daily_doubles(game_data, questions, unit_of_work)
+
+    game_data = database.get_game_state(game_model.id)
+    daily_doubles = {
+        game_question.question_id: game_question.question.category.round.round
+        for game_question in game_data.game_questions
+        if game_question.daily_double
+    }
+
+    # Only the round that was started gets daily doubles, as many as its round number allows
+    assert set(daily_doubles.values()) == {2}
+    assert len(daily_doubles) == min(2, len(questions))
+
+    # Rounds that already have daily doubles are left as they are
+    game_data.round = 2
+    with database.unit_of_work() as unit_of_work:
+        _place_missing_daily_doubles(game_data, game_data.get_questions_for_round(), unit_of_work)
+
+    game_data = database.get_game_state(game_model.id)
+    assert {game_question.question_id for game_question in game_data.game_questions if game_question.daily_double} == set(daily_doubles)
@@ -0,0 +1,77 @@
+import gevent
+from gevent.event import Event
+from sqlalchemy import func, select
+
+from jeoparty.api.enums import PowerUpType
+from jeoparty.api.game_locks import GameLocks
+from jeoparty.api.orm.models import Contestant, GameContestant, GamePowerUp
+from tests import create_game_in_database
+
+def test_concurrent_joins_respect_capacity(database):
+    with database as session:
+        game_id = create_game_in_database(database, "Join Game", max_contestants=3).id
+
+        contestants = [Contestant(name=f"Joiner {index}", color="#ffffff") for index in range(6)]
+        greenlets = [gevent.spawn(database.join_game, contestant, game_id, True) for contestant in contestants]
+        gevent.joinall(greenlets, raise_error=True)
+
+        assert sorted(greenlet.value for greenlet in greenlets) == [False] * 3 + [True] * 3
+
+        game_contestants = session.execute(
+            select(GameContestant).where(GameContestant.game_id == game_id)
+        ).scalars().all()
+        assert len(game_contestants) == 3
+
+        # Power-ups were added for the contestants that joined, and only for those
+        power_ups = session.execute(
+            select(func.count()).select_from(GamePowerUp).where(
+                GamePowerUp.contestant_id.in_([game_contestant.id for game_contestant in game_contestants])
+            )
+        ).scalar_one()
+        assert power_ups == 3 * len(PowerUpType)
+
+        # Contestants that didn't get in are not saved either
+        joined_ids = set(game_contestant.contestant_id for game_contestant in game_contestants)
+        for contestant in contestants:
+            assert (database.get_contestant_from_id(contestant.id) is not None) == (contestant.id in joined_ids)
+
+def test_rejoin_full_game(database):
+    with database as session:
+        game_id = create_game_in_database(database, "Join Game", max_contestants=1).id
+
+        assert database.join_game(database.get_contestant_from_id("contestant_id_0"), game_id, False)
+        assert not database.join_game(database.get_contestant_from_id("contestant_id_1"), game_id, False)
+
+        contestant = database.get_contestant_from_id("contestant_id_0")
+        contestant.name = "Renamed"
+        assert database.join_game(contestant, game_id, False)
+
+        contestant_count = session.execute(
+            select(func.count()).select_from(GameContestant).where(GameContestant.game_id == game_id)
+        ).scalar_one()
+        assert contestant_count == 1
+        assert database.get_contestant_from_id("contestant_id_0").name == "Renamed"
+
+def test_game_locks_are_per_game():
+    locks = GameLocks()
+    release = Event()
+    order = []
+
+    def hold(game_id: str, name: str):
+        with locks.lock(game_id):
+            order.append(name)
+            release.wait()
+
+    first = gevent.spawn(hold, "game_1", "first")
+    same_game = gevent.spawn(hold, "game_1", "same_game")
+    other_game = gevent.spawn(hold, "game_2", "other_game")
+    gevent.sleep(0)
+
+    # Only the join to the same game has to wait
+    assert order == ["first", "other_game"]
+
+    release.set()
+    gevent.joinall([first, same_game, other_game], raise_error=True)
+
+    assert order == ["first", "other_game", "same_game"]
+    assert len(locks) == 0
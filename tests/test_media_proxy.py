@@ -0,0 +1,139 @@
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import os
+from threading import Thread
+from time import time
+
+import pytest
+
+from jeoparty.api.media_proxy import MediaCache, MediaFetchError, MediaProxy, sniff_content_type
+
+_PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 8
+_WEBM = b"\x1a\x45\xdf\xa3" + bytes(64)
+_VALID_TYPES = ["image/png", "video/webm"]
+
+class _StubMediaServer(HTTPServer):
+    def __init__(self, files):
+        super().__init__(("localhost", 0), _StubMediaHandler)
+        self.files = files
+        self.hits = []
+
+    def get_url(self, path):
+        return f"http://localhost:{self.server_port}{path}"
+
+class _StubMediaHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.hits.append(self.path)
+        if self.path not in self.server.files:
+            self.send_response(404)
+            self.end_headers()
+            return
+
+        data, send_length = self.server.files[self.path]
+        self.send_response(200)
+        # Files are sent as something generic, the type is found from the content
+        self.send_header("Content-Type", "application/octet-stream")
+        if send_length:
+            self.send_header("Content-Length", str(len(data)))
+
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def media_server():
+    server = _StubMediaServer({
+        "/image.png": (_PNG, True),
+        "/copy.png": (_PNG, True),
+        "/video.webm": (_WEBM, False),
+        "/page.html": (b"<!DOCTYPE html><html></html>", True),
+        "/large.png": (_PNG * 4, True),
+        "/large_unknown_length.png": (_PNG * 4, False),
+    })
+    Thread(target=server.serve_forever, daemon=True).start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+def _fetch(proxy, url):
+    content_type, chunks = proxy.fetch(url, _VALID_TYPES)
+    return content_type, b"".join(chunks)
+
+def _count_files(folder):
+    return len(os.listdir(folder)) if os.path.exists(folder) else 0
+
+def test_sniff_content_type():
+    assert sniff_content_type(_PNG[:16]) == "image/png"
+    assert sniff_content_type(b"\xff\xd8\xff\xe0" + bytes(12)) == "image/jpeg"
+    assert sniff_content_type(b"GIF89a" + bytes(10)) == "image/gif"
+    assert sniff_content_type(b"RIFF\x00\x00\x00\x00WEBPVP8 ") == "image/webp"
+    assert sniff_content_type(b"\x00\x00\x00\x18ftypmp42") == "video/mp4"
+    assert sniff_content_type(_WEBM[:16]) == "video/webm"
+    assert sniff_content_type(b"<!DOCTYPE html>") is None
+
+def test_fetch_streams_and_caches(tmp_path, media_server):
+    proxy = MediaProxy(MediaCache(str(tmp_path)), chunk_size=256)
+
+    assert _fetch(proxy, media_server.get_url("/image.png")) == ("image/png", _PNG)
+
+    # Files of unknown size are in the cache before their content is returned
+    content_type, chunks = proxy.fetch(media_server.get_url("/video.webm"), _VALID_TYPES)
+    assert proxy.cache.get(media_server.get_url("/video.webm")) is not None
+    assert (content_type, b"".join(chunks)) == ("video/webm", _WEBM)
+
+    # Fetching the same URL again is served from the cache
+    assert _fetch(proxy, media_server.get_url("/image.png")) == ("image/png", _PNG)
+    assert media_server.hits == ["/image.png", "/video.webm"]
+
+    # URLs with the same content share the cached file
+    assert _fetch(proxy, media_server.get_url("/copy.png")) == ("image/png", _PNG)
+    assert _count_files(f"{tmp_path}/urls") == 3
+    assert _count_files(f"{tmp_path}/content") == 2
+
+def test_fetch_rejects_invalid_files(tmp_path, media_server):
+    proxy = MediaProxy(MediaCache(str(tmp_path)), max_size=len(_PNG) * 2, chunk_size=256)
+
+    with pytest.raises(MediaFetchError) as exc_info:
+        _fetch(proxy, media_server.get_url("/page.html"))
+    assert exc_info.value.status == 400
+
+    with pytest.raises(MediaFetchError) as exc_info:
+        _fetch(proxy, media_server.get_url("/missing.png"))
+    assert exc_info.value.status == 404
+
+    # Too large files are rejected up front if their size is known...
+    with pytest.raises(MediaFetchError) as exc_info:
+        _fetch(proxy, media_server.get_url("/large.png"))
+    assert exc_info.value.status == 413
+
+    # ...and otherwise when the max size is exceeded while downloading, before any content is returned
+    with pytest.raises(MediaFetchError) as exc_info:
+        proxy.fetch(media_server.get_url("/large_unknown_length.png"), _VALID_TYPES)
+    assert exc_info.value.status == 413
+
+    # Nothing is cached from failed fetches
+    assert _count_files(f"{tmp_path}/urls") == 0
+    assert _count_files(f"{tmp_path}/content") == 0
+
+def test_cache_expires_and_evicts_least_recently_used(tmp_path):
+    cache = MediaCache(str(tmp_path), ttl=60, budget=len(_PNG) * 2 + 8)
+
+    for index in range(2):
+        b"".join(cache.store(f"url_{index}", "image/png", iter([_PNG, bytes([index])])))
+
+    # Mark the first entry as the most recently used, so the second is evicted
+    os.utime(cache._get_meta_path("url_1"), (time() - 10, time() - 10))
+    assert cache.get("url_0") is not None
+
+    b"".join(cache.store("url_2", "video/webm", iter([_WEBM])))
+    assert cache.get("url_1") is None
+    assert cache.get("url_0") is not None
+    assert cache.get("url_2").size == len(_WEBM)
+    assert _count_files(f"{tmp_path}/content") == 2
+
+    # Expired entries are not returned
+    cache.ttl = -1
+    assert cache.get("url_0") is None
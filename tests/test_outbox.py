@@ -0,0 +1,148 @@
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import json
+from threading import Thread
+
+import gevent
+import pytest
+from sqlalchemy import select
+
+from jeoparty.api.orm.models import OutboxMessage
+from jeoparty.api.outbox import OutboxWorker
+from tests import create_game_in_database
+
+_CREDENTIALS = {"disc_id": 1, "token": "intfar_token"}
+
+class _StubIntfarServer(HTTPServer):
+    def __init__(self, statuses):
+        super().__init__(("localhost", 0), _StubIntfarHandler)
+        self.statuses = list(statuses)
+        self.requests = []
+
+    @property
+    def url(self):
+        return f"http://localhost:{self.server_port}/intfar/lan/jeopardy_winner"
+
+class _StubIntfarHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        length = int(self.headers["Content-Length"])
+        self.server.requests.append(json.loads(self.rfile.read(length)))
+
+        status = self.server.statuses.pop(0) if len(self.server.statuses) > 1 else self.server.statuses[0]
+        self.send_response(status)
+        self.end_headers()
+        self.wfile.write(b"OK" if status == 200 else b"Error")
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def stub_server():
+    servers = []
+
+    def create(*statuses):
+        server = _StubIntfarServer(statuses)
+        Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+
+        return server
+
+    yield create
+
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+def _create_game(database):
+    return create_game_in_database(database, "Outbox Game").id
+
+def _get_message(database, game_id):
+    with database as session:
+        return session.execute(select(OutboxMessage).where(OutboxMessage.game_id == game_id)).scalar_one()
+
+def test_message_delivered_in_background(database, stub_server):
+    server = stub_server(200)
+    game_id = _create_game(database)
+    worker = OutboxWorker(database, credentials=_CREDENTIALS)
+
+    try:
+        assert worker.enqueue(game_id, "jeopardy_winner", server.url, {"player_data": [{"name": "Dave"}]})
+
+        with gevent.Timeout(5):
+            while worker.get_status()["delivered"] == 0:
+                gevent.sleep(0.05)
+    finally:
+        worker.stop()
+
+    # Credentials are added when the message is sent, but never stored
+    assert server.requests == [{"player_data": [{"name": "Dave"}], **_CREDENTIALS}]
+    message = _get_message(database, game_id)
+    assert message.delivered_at is not None
+    assert "token" not in message.payload
+
+    status = worker.get_status()
+    assert status["pending"] == 0
+    assert status["failed_attempts"] == 0
+
+def test_messages_deduplicated_by_game(database, stub_server):
+    server = stub_server(200)
+    game_id = _create_game(database)
+    worker = OutboxWorker(database, credentials=_CREDENTIALS)
+
+    assert worker.enqueue(game_id, "jeopardy_winner", server.url, {"player_data": []})
+    assert not worker.enqueue(game_id, "jeopardy_winner", server.url, {"player_data": []})
+    worker.stop()
+
+    # The message is sent once, either by the worker before it was stopped or here
+    assert worker.get_status()["duplicates"] == 1
+    worker.deliver_due()
+    assert worker.deliver_due() == 0
+    assert len(server.requests) == 1
+
+def test_failed_messages_retried_with_backoff(database, stub_server):
+    server = stub_server(500, 503, 200)
+    game_id = _create_game(database)
+    worker = OutboxWorker(database, backoff_base=1, credentials=_CREDENTIALS)
+
+    worker.enqueue(game_id, "jeopardy_winner", server.url, {"player_data": []})
+    worker.stop()
+
+    now = datetime.now() + timedelta(seconds=1)
+    assert worker.deliver_due(now) == 0
+    message = _get_message(database, game_id)
+    assert message.attempts == 1
+    assert message.next_attempt_at == now + timedelta(seconds=1)
+    assert message.last_error.startswith("Status 500")
+
+    # The message is not sent again before it is due, and the delay doubles after each attempt
+    assert worker.deliver_due(now + timedelta(seconds=0.5)) == 0
+    assert len(server.requests) == 1
+
+    assert worker.deliver_due(now + timedelta(seconds=1)) == 0
+    assert _get_message(database, game_id).next_attempt_at == now + timedelta(seconds=3)
+
+    assert worker.deliver_due(now + timedelta(seconds=3)) == 1
+    assert len(server.requests) == 3
+
+    status = worker.get_status()
+    assert status["failed_attempts"] == 2
+    assert status["delivered"] == 1
+    assert status["pending"] == 0
+
+def test_message_abandoned_after_max_attempts(database, stub_server):
+    server = stub_server(500)
+    game_id = _create_game(database)
+    worker = OutboxWorker(database, backoff_base=0, max_attempts=2, credentials=_CREDENTIALS)
+
+    worker.enqueue(game_id, "jeopardy_winner", server.url, {"player_data": []})
+    worker.stop()
+
+    now = datetime.now() + timedelta(seconds=1)
+    assert worker.deliver_due(now) == 0
+    assert worker.deliver_due(now) == 0
+    assert worker.deliver_due(now) == 0
+    assert len(server.requests) == 2
+
+    status = worker.get_status()
+    assert status["abandoned"] == 1
+    assert status["pending"] == 0
@@ -0,0 +1,136 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event, select
+
+from jeoparty.api.enums import StageType
+from jeoparty.api.orm.models import Contestant, GameContestant, GamePowerUp
+from tests import create_game_in_database
+
+@contextmanager
+def _count_statements(database):
+    statements = []
+
+    def on_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(database.engine, "before_cursor_execute", on_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(database.engine, "before_cursor_execute", on_execute)
+
+def _create_game_with_contestants(database, session):
+    game_model = create_game_in_database(database, "Query Count Game", contestants=5)
+
+    return database.get_game_from_id(game_model.id)
+
+def test_save_models_statement_count(database):
+    with database as session:
+        game_data = _create_game_with_contestants(database, session)
+        power_ups = [power_up for contestant in game_data.game_contestants for power_up in contestant.power_ups]
+        assert len(power_ups) > len(game_data.game_contestants)
+
+        for power_up in power_ups:
+            power_up.used = True
+
+        with _count_statements(database) as statements:
+            database.save_models(*power_ups)
+
+        # One batched UPDATE, no SELECT to refresh each saved row
+        assert len(statements) == 1
+        assert not any(statement.lstrip().upper().startswith("SELECT") for statement in statements)
+
+        # Saved models are not expired, so reading them emits no queries
+        with _count_statements(database) as statements:
+            assert all(power_up.used for power_up in power_ups)
+
+        assert statements == []
+
+def test_delete_models_statement_count(database):
+    with database as session:
+        game_data = _create_game_with_contestants(database, session)
+        power_ups = [power_up for contestant in game_data.game_contestants for power_up in contestant.power_ups]
+
+        with _count_statements(database) as statements:
+            database.delete_models(*power_ups, *game_data.game_contestants)
+
+        # One DELETE per model class, regardless of the number of rows
+        assert len(statements) == 2
+
+        remaining = session.execute(
+            select(GamePowerUp).where(GamePowerUp.id.in_([power_up.id for power_up in power_ups]))
+        ).scalars().all()
+        assert remaining == []
+
+def test_update_models_statement_count(database):
+    with database as session:
+        game_id = _create_game_with_contestants(database, session).id
+
+    game_data = database.get_game_state(game_id)
+    game_data.round = 2
+    for game_question in game_data.game_questions:
+        game_question.used = True
+
+    for contestant in game_data.game_contestants:
+        contestant.score = 500
+
+    with _count_statements(database) as statements:
+        database.update_models(game_data, *game_data.game_questions, *game_data.game_contestants)
+
+    # One executemany UPDATE per model class and set of changed columns
+    assert len(statements) == 3
+
+def test_game_lobby_view_statement_count(database):
+    with database as session:
+        game_data = _create_game_with_contestants(database, session)
+        database.lobby_cache.clear()
+
+        with _count_statements(database) as statements:
+            lobby_view = database.get_game_lobby_view(game_data.join_code)
+
+        # A single narrow query, no loading of the game or its question pack
+        assert len(statements) == 1
+        assert lobby_view.id == game_data.id
+        assert lobby_view.contestants == 5
+        assert lobby_view.is_full
+
+        # Repeated lookups within the TTL are served from the cache
+        with _count_statements(database) as statements:
+            assert database.get_game_lobby_view(game_data.join_code) is lobby_view
+
+        assert statements == []
+
+        # Adding a contestant invalidates the cached view
+        database.save_models(Contestant(id="contestant_id_5", name="Contestant 5", color="#ffffff"))
+        database.add_contestant_to_game(GameContestant(game_id=game_data.id, contestant_id="contestant_id_5"), False)
+
+        assert database.get_game_lobby_view(game_data.join_code).contestants == 6
+
+def test_stage_transition_statement_count(database):
+    with database as session:
+        game_data = _create_game_with_contestants(database, session)
+        power_ups = [power_up for contestant in game_data.game_contestants for power_up in contestant.power_ups]
+        for power_up in power_ups:
+            power_up.used = True
+
+        database.save_models(*power_ups)
+
+        game_question = game_data.game_questions[0]
+        game_question.used = True
+        game_data.stage = StageType.SELECTION
+
+        with _count_statements(database) as statements:
+            with database.unit_of_work() as unit_of_work:
+                unit_of_work.save(game_question)
+                database.reset_power_ups(game_data, unit_of_work)
+                database.save_game(game_data, unit_of_work)
+
+        # One UPDATE for the game, one for the question and one for all power-ups
+        assert len(statements) == 3
+        assert sum("game_power_ups" in statement for statement in statements) == 1
+
+        # The loaded power-ups are updated in place without being loaded again
+        with _count_statements(database) as statements:
+            assert not any(power_up.used for power_up in power_ups)
+
+        assert statements == []
@@ -0,0 +1,111 @@
+from contextlib import contextmanager
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import event
+
+from jeoparty.api.enums import Language, StageType
+from jeoparty.api.orm.models import Game
+from jeoparty.api.summaries import encode_cursor
+from tests import create_game_in_database
+from tests.config import PRESENTER_USER_ID
+
+@contextmanager
+def _capture_statements(database):
+    statements = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(database.engine, "before_cursor_execute", on_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(database.engine, "before_cursor_execute", on_execute)
+
+# Indexes that listings walk in order to select a page of rows with LIMIT
+_ORDERED_LISTING_INDEXES = {
+    "ix_question_packs_created_by_changed_at",
+    "ix_question_packs_public_changed_at",
+    "ix_games_created_by_started_at",
+}
+
+def _get_scanned_index(words):
+    # Index scans are reported as 'SCAN <table> USING [COVERING] INDEX <index>'
+    if words[2:3] != ["USING"]:
+        return None
+
+    index_words = words[4:] if words[3:4] == ["COVERING"] else words[3:]
+    if index_words[:1] != ["INDEX"] or len(index_words) < 2:
+        return None
+
+    return index_words[1]
+
+def _get_table_scans(database, statements):
+    tables = set(Game.metadata.tables)
+    scans = []
+    with database.engine.connect() as connection:
+        for statement, parameters in statements:
+            plan = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+            for row in plan:
+                # Rows are (id, parent, notused, detail), a scan is reported as 'SCAN <table or alias> ...'.
+                # Scans of subqueries, such as a page of rows selected with LIMIT, are not table scans.
+                # Scanning a whole table through an index is, unless it is an ordered listing
+                detail = row[3]
+                words = detail.split()
+                if words[0] != "SCAN" or words[1] not in tables:
+                    continue
+
+                if _get_scanned_index(words) not in _ORDERED_LISTING_INDEXES:
+                    scans.append((detail, statement))
+
+    return scans
+
+@pytest.fixture(scope="function")
+def game_data(database):
+    game_model = create_game_in_database(database, "Query Plan Game", contestants=2, max_contestants=4)
+
+    return SimpleNamespace(id=game_model.id, pack_id=game_model.pack_id, join_code=game_model.join_code)
+
+_GETTERS = {
+    "get_question_packs_for_user": lambda database, game: database.get_question_packs_for_user(PRESENTER_USER_ID, include_public=True),
+    "get_question_pack_for_user": lambda database, game: database.get_question_packs_for_user(PRESENTER_USER_ID, game.pack_id),
+    "get_themes_for_user": lambda database, game: database.get_themes_for_user(PRESENTER_USER_ID, include_public=True),
+    "get_game_from_id": lambda database, game: database.get_game_from_id(game.id),
+    "get_game_from_code": lambda database, game: database.get_game_from_code(game.join_code),
+    "get_game_state": lambda database, game: database.get_game_state(game.id),
+    "get_unique_join_code": lambda database, game: database.get_unique_join_code(game.join_code),
+    "get_games_for_user": lambda database, game: database.get_games_for_user(PRESENTER_USER_ID),
+    "get_contestants_for_game": lambda database, game: database.get_contestants_for_game(game.id),
+    "get_contestant_from_id": lambda database, game: database.get_contestant_from_id("contestant_id_0"),
+    "get_pack_summaries_for_user": lambda database, game: database.get_pack_summaries_for_user(PRESENTER_USER_ID),
+    "get_game_summaries_for_user": lambda database, game: database.get_game_summaries_for_user(PRESENTER_USER_ID),
+    "get_pack_summaries_page": lambda database, game: database.get_pack_summaries_for_user(
+        PRESENTER_USER_ID, include_public=True, language=Language.ENGLISH, cursor=encode_cursor(datetime.now(), "")
+    ),
+    "get_public_pack_summaries": lambda database, game: database.get_pack_summaries_for_user(
+        PRESENTER_USER_ID, include_public=True, public=True
+    ),
+    "get_game_lobby_view": lambda database, game: database.get_game_lobby_view(game.join_code, use_cache=False),
+    "get_game_summaries_page": lambda database, game: database.get_game_summaries_for_user(
+        PRESENTER_USER_ID, stage=StageType.LOBBY, cursor=encode_cursor(datetime.now(), "")
+    ),
+    "get_filtered_game_summaries": lambda database, game: database.get_game_summaries_for_user(
+        PRESENTER_USER_ID, public=False, language=Language.ENGLISH, theme_id="theme_id"
+    ),
+}
+
+@pytest.mark.parametrize("getter", list(_GETTERS))
+def test_getters_use_indexes(database, game_data, getter):
+    # Start with an empty pack cache so the pack tree queries are included
+    database.pack_cache.clear()
+    database.executor.max_threads = 0
+
+    with database:
+        with _capture_statements(database) as statements:
+            _GETTERS[getter](database, game_data)
+
+    assert statements != []
+    assert _get_table_scans(database, statements) == []
@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+from jeoparty.api import serializers
+from jeoparty.api.orm.models import Game
+from tests import create_game_in_database
+
+# Serializer, the model it is given and the arguments to dump() it should match
+_SERIALIZERS = {
+    "dump_game": (lambda game: game, {"included_relations": [], "id": "game_id"}),
+    "dump_game_with_contestants": (lambda game: game, {"included_relations": [Game.game_contestants], "id": "game_id"}),
+    "dump_game_with_pack_and_contestants": (lambda game: game, {"included_relations": [Game.pack, Game.game_contestants], "id": "game_id"}),
+    "dump_game_contestant": (lambda game: game.game_contestants[0], {}),
+    "dump_game_contestant_as_user": (lambda game: game.game_contestants[0], {"id": "user_id"}),
+    "dump_game_contestant_only": (lambda game: game.game_contestants[0], {"included_relations": []}),
+    "dump_round": (lambda game: game.pack.rounds[0], {"id": "round_id"}),
+    "dump_question": (lambda game: game.game_questions[0].question, {}),
+    "dump_question_with_id": (lambda game: game.game_questions[0].question, {"id": "question_id"}),
+    "dump_category_only": (lambda game: game.game_questions[0].question.category, {"included_relations": []}),
+}
+
+@pytest.fixture(scope="function")
+def game_data(database):
+    game_model = create_game_in_database(database, "Serializer Game", contestants=5)
+
+    with database:
+        game_data = database.get_game_from_id(game_model.id)
+        game_data.game_contestants[1].has_turn = True
+        game_data.game_questions[0].active = True
+
+        yield game_data
+
+@pytest.mark.parametrize("name", list(_SERIALIZERS))
+def test_serializer_matches_dump(database, game_data, name):
+    get_model, dump_args = _SERIALIZERS[name]
+    model = get_model(game_data)
+
+    with database:
+        expected = json.dumps(model.dump(**dump_args), default=str)
+        actual = json.dumps(getattr(serializers, name)(model), default=str)
+
+    assert actual == expected
+
+def test_round_json_is_cached_per_pack_version(database, game_data):
+    with database:
+        round_json = database.get_round_json(game_data)
+
+        # The round JSON is built once per version of the pack and has no game state
+        assert database.get_round_json(game_data) is round_json
+        assert "round" not in round_json
+        assert all(
+            "used" not in question_json
+            for category_json in round_json["categories"]
+            for question_json in category_json["questions"]
+        )
+
+        expected = serializers.dump_round(game_data.pack.rounds[game_data.round - 1])
+        del expected["round"]
+        assert json.dumps(round_json, default=str) == json.dumps(expected, default=str)
+
+def test_round_json_counts_towards_pack_cache_size(database, game_data):
+    with database:
+        entry = database.get_pack_tree(game_data.pack_id, game_data.pack.changed_at)
+        entry_size = entry.size
+        cache_size = database.pack_cache.size
+
+        database.get_round_json(game_data)
+
+        # Building the round JSON grows both the entry and the cache total by the same amount
+        assert entry.size > entry_size
+        assert database.pack_cache.size - cache_size == entry.size - entry_size